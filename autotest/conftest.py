@@ -0,0 +1,28 @@
+import os
+import shutil
+import pytest
+
+# the user cache directory used by the tests
+cachedir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'temp', 'cache')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def user_cache():
+    """
+    Keep the compiler probes, scan shards, manifests, and compile
+    histories that are written by the tests out of the user cache
+    directory.
+
+    """
+    pth = os.environ.get('PYMAKE_CACHE_DIR')
+    if os.path.isdir(cachedir):
+        shutil.rmtree(cachedir)
+    os.environ['PYMAKE_CACHE_DIR'] = cachedir
+    yield
+    if pth is None:
+        os.environ.pop('PYMAKE_CACHE_DIR')
+    else:
+        os.environ['PYMAKE_CACHE_DIR'] = pth
+    if os.path.isdir(cachedir):
+        shutil.rmtree(cachedir)
@@ -0,0 +1,183 @@
+"""
+Source trees and helper functions that are shared by the autotests.
+
+"""
+from __future__ import print_function
+import os
+import shutil
+import pymake
+
+# a small fortran program with a chain of module dependencies and a
+# few independent source files
+hello_srcs = {
+    'kinds.f90': '''module kinds
+  implicit none
+  integer, parameter :: dp = kind(1.d0)
+end module kinds
+''',
+    'constants.f90': '''module constants
+  use kinds, only: dp
+  implicit none
+  real(dp), parameter :: two = 2.0_dp
+end module constants
+''',
+    'helper.f90': '''module helper
+  use kinds, only: dp
+  use constants
+  implicit none
+contains
+  function twice(x) result(y)
+    real(dp), intent(in) :: x
+    real(dp) :: y
+    y = two * x
+  end function twice
+end module helper
+''',
+    'utils.f': '''      SUBROUTINE UTL(I)
+      INTEGER I
+      I = I + 1
+      RETURN
+      END
+''',
+    'other.f90': '''module other
+  implicit none
+  integer, parameter :: nother = 3
+end module other
+''',
+    'main.f90': '''program hello
+  use kinds, only: dp
+  use helper, only: twice
+  use other
+  implicit none
+  integer :: i
+  i = nother
+  call utl(i)
+  write(*, '(a,f4.1,i3)') 'hello ', twice(1.0_dp), i
+end program hello
+''',
+}
+
+# a module with its implementation in a submodule, a program that uses
+# the module with a continued use statement, and a module used by an
+# include file
+shapes_srcs = {
+    'shapes.f90': '''module shapes
+  implicit none
+  integer, private :: ncalls = 0
+  interface
+    module function area(r) result(a)
+      real, intent(in) :: r
+      real :: a
+    end function area
+  end interface
+end module shapes
+''',
+    'shapes_impl.f90': '''submodule (shapes) shapes_impl
+  implicit none
+contains
+  module function area(r) result(a)
+    real, intent(in) :: r
+    real :: a
+    ncalls = ncalls + 1
+    a = 3.14159 * r * r
+  end function area
+end submodule shapes_impl
+''',
+    'units.f90': '''module units
+  implicit none
+  character(len=*), parameter :: unitname = 'm2'
+end module units
+''',
+    'report.inc': '''  use units
+''',
+    'main.f90': '''program main
+  use shapes, &
+    ! the area function
+    only: area
+  implicit none
+  call report(area(2.))
+contains
+  subroutine report(a)
+include 'report.inc'
+    real, intent(in) :: a
+    print *, a, unitname
+  end subroutine report
+end program main
+''',
+}
+
+
+# a fortran program that calls two c functions.  twice.c includes twice.h,
+# which includes config.h.  config.h is not included directly by any
+# source file.
+chello_srcs = {
+    'main.f90': '''program main
+  use iso_c_binding
+  implicit none
+  interface
+    integer(c_int) function twice(i) bind(c)
+      import :: c_int
+      integer(c_int), value :: i
+    end function twice
+    integer(c_int) function plain(i) bind(c)
+      import :: c_int
+      integer(c_int), value :: i
+    end function plain
+  end interface
+  print *, twice(2), plain(3)
+end program main
+''',
+    'config.h': '''#define FACTOR 2
+''',
+    'twice.h': '''#include "config.h"
+int twice(int i);
+''',
+    'twice.c': '''#include "twice.h"
+int twice(int i) { return FACTOR * i; }
+''',
+    'plain.c': '''int plain(int i) { return i; }
+''',
+}
+
+
+def write_source(srcpth, fname, text):
+    f = open(os.path.join(srcpth, fname), 'w')
+    f.write(text)
+    f.close()
+    return
+
+
+def write_sources(srcpth, srcs, dstpth=None):
+    """
+    Write the source files in srcs to srcpth.  The directory dstpth is
+    removed first if it is given.
+
+    """
+    if dstpth is not None and os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    if not os.path.isdir(srcpth):
+        os.makedirs(srcpth)
+    for fname, text in srcs.items():
+        write_source(srcpth, fname, text)
+    return
+
+
+def get_mtimes(objdir):
+    mtimes = {}
+    for fname in os.listdir(objdir):
+        if fname.endswith('.o'):
+            mtimes[fname] = os.stat(os.path.join(objdir, fname)).st_mtime
+    return mtimes
+
+
+def build(srcpth, target, **kwargs):
+    """
+    Build target from srcpth with gfortran and gcc and check that the
+    build succeeded.  Keyword arguments are passed to pymake.main.
+
+    """
+    kwargs.setdefault('makeclean', False)
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc', **kwargs)
+    assert success == 0, 'build failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    return
@@ -13,6 +13,8 @@ mfnwtpth = os.path.join(dstpth, 'MODFLOW-NWT_1.1.2')
 exe_name = 'mfnwt'
 srcpth = os.path.join(mfnwtpth, 'src')
 target = os.path.join(dstpth, exe_name)
+builddir = os.path.join(dstpth, 'build_mfnwt')
+makefile = os.path.join(builddir, 'makefile')
 
 
 def compile_code():
@@ -26,18 +28,18 @@ def compile_code():
 
     pymake.main(srcpth, target, 'gfortran', 'gcc', makeclean=True,
                 expedite=False, dryrun=False, double=False, debug=False,
-                makefile=True)
+                makefile=True, builddir=builddir)
 
     assert os.path.isfile(target), 'Target does not exist.'
 
 
 def build_with_makefile():
-    if os.path.isfile('makefile'):
+    if os.path.isfile(makefile):
         # remove existing target
         print('Removing ' + target)
         os.remove(target)
         print('build mfnwt with makefile')
-        os.system('make')
+        os.system('make -f {} -j4'.format(makefile))
         assert os.path.isfile(target), \
             'Target created by makefile does not exist.'
     else:
@@ -47,10 +49,9 @@ def build_with_makefile():
 
 def clean_up():
     # clean up
-    if os.path.isfile('makefile'):
-        print('Removing makefile and obj_temp')
-        shutil.rmtree(os.path.join('obj_temp'))
-        os.remove('makefile')
+    if os.path.isfile(makefile):
+        print('Removing makefile and ' + builddir)
+        shutil.rmtree(builddir)
     if os.path.isfile(target):
         print('Removing ' + target)
         os.remove(target)
@@ -0,0 +1,51 @@
+from __future__ import print_function
+import os
+import shutil
+import filecmp
+from pymake.builddb import dbname
+from helpers import build, hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't007')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+
+def test_compile_serial():
+    write_sources(srcpth, hello_srcs, dstpth)
+    build(srcpth, target, jobs=1, builddir=builddir)
+    shutil.move(objdir, os.path.join(dstpth, 'obj_serial'))
+    return
+
+
+def test_compile_parallel():
+    build(srcpth, target, jobs=4, builddir=builddir)
+    return
+
+
+def test_same_objects():
+    objdir_serial = os.path.join(dstpth, 'obj_serial')
+    for fname in os.listdir(objdir_serial):
+        # the build database records when the target was linked
+        if fname == dbname:
+            continue
+        assert filecmp.cmp(os.path.join(objdir_serial, fname),
+                           os.path.join(objdir, fname),
+                           shallow=False), \
+            'serial and parallel {} differ'.format(fname)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_compile_serial()
+    test_compile_parallel()
+    test_same_objects()
+    test_teardown()
@@ -0,0 +1,90 @@
+from __future__ import print_function
+import os
+import shutil
+import helpers
+from pymake.builddb import BuildDatabase
+from helpers import hello_srcs, write_source, write_sources, get_mtimes
+
+# set up paths
+dstpth = os.path.join('temp', 't008')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+
+def build(fflags=None):
+    helpers.build(srcpth, target, expedite=True, fflags=fflags,
+                  builddir=builddir)
+    return get_mtimes(objdir)
+
+
+def test_expedite():
+    write_sources(srcpth, hello_srcs, dstpth)
+
+    # initial build compiles everything
+    mtimes0 = build()
+    assert len(mtimes0) == len(hello_srcs)
+
+    # rewriting the source files with the same contents does not
+    # recompile anything
+    write_sources(srcpth, hello_srcs)
+    mtimes1 = build()
+    assert mtimes1 == mtimes0, 'unchanged files were recompiled'
+
+    # changing a module without changing its interface only recompiles
+    # the file that contains the module
+    text = hello_srcs['constants.f90'] + '\n! changed\n'
+    write_source(srcpth, 'constants.f90', text)
+    mtimes2 = build()
+    changed = set([f for f in mtimes2 if mtimes2[f] != mtimes1[f]])
+    assert changed == set(['constants.o']), changed
+
+    # changing the interface of a module recompiles the files that use it
+    text = hello_srcs['constants.f90'].replace(
+        'end module', '  integer, parameter :: three = 3\nend module')
+    write_source(srcpth, 'constants.f90', text)
+    mtimes2 = build()
+    changed = set([f for f in mtimes2 if mtimes2[f] != mtimes1[f]])
+    assert 'constants.o' in changed and 'helper.o' in changed, changed
+    for fname in ['kinds.o', 'other.o', 'utils.o']:
+        assert fname not in changed, '{} was recompiled'.format(fname)
+
+    # changing the compile flags recompiles everything
+    mtimes3 = build(fflags='g')
+    for fname in mtimes3:
+        assert mtimes3[fname] != mtimes2[fname], \
+            '{} was not recompiled'.format(fname)
+    return
+
+
+def test_include_keys():
+    # include files with the same name in different directories are
+    # fingerprinted separately
+    write_sources(srcpth, {}, dstpth)
+    for name in ('one', 'two'):
+        os.makedirs(os.path.join(srcpth, name))
+        write_source(srcpth, os.path.join(name, 'x.inc'),
+                     '  integer :: {}\n'.format(name))
+    write_source(srcpth, 'a.f90', "subroutine a\ninclude 'one/x.inc'\n" +
+                 "include 'two/x.inc'\nend subroutine a\n")
+    builddb = BuildDatabase(os.path.join(dstpth, 'builddb.json'))
+    entry = builddb.fingerprint(os.path.join(srcpth, 'a.f90'),
+                                ['gfortran'], 'gfortran')
+    keys = sorted(entry['includes'])
+    assert keys == [os.path.join('one', 'x.inc'),
+                    os.path.join('two', 'x.inc')], keys
+    assert len(set(entry['includes'].values())) == 2
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_expedite()
+    test_include_keys()
+    test_teardown()
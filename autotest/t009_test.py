@@ -0,0 +1,67 @@
+from __future__ import print_function
+import os
+import json
+import shutil
+import pymake
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't009')
+cachedir = os.path.join(dstpth, 'cache')
+
+
+def get_stats():
+    f = open(os.path.join(cachedir, 'stats.json'), 'r')
+    stats = json.load(f)
+    f.close()
+    return stats
+
+
+def test_cache():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+
+    # the first target fills the cache
+    srcpth = os.path.join(dstpth, 'src1')
+    target = os.path.join(dstpth, 'hello1')
+    write_sources(srcpth, hello_srcs)
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, cachedir=cachedir)
+    assert success == 0, 'build failed'
+    stats = get_stats()
+    assert stats['hits'] == 0 and stats['misses'] == len(hello_srcs), stats
+
+    # a second target with the same source is built from the cache
+    srcpth = os.path.join(dstpth, 'src2')
+    target = os.path.join(dstpth, 'hello2')
+    write_sources(srcpth, hello_srcs)
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, jobs=2, cachedir=cachedir)
+    assert success == 0, 'build failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    stats = get_stats()
+    assert stats['hits'] == len(hello_srcs), stats
+
+    # different compile flags miss the cache and a cache with a maximum
+    # size of zero is emptied
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, debug=True, cachedir=cachedir,
+                          cachesize=0)
+    assert success == 0, 'build failed'
+    stats = get_stats()
+    assert stats['hits'] == len(hello_srcs), stats
+    assert stats['evictions'] == 2 * len(hello_srcs), stats
+    cache = pymake.ObjectCache(cachedir)
+    assert len(cache.get_entries()) == 0
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_cache()
+    test_teardown()
@@ -0,0 +1,121 @@
+from __future__ import print_function
+import os
+import sys
+import shutil
+import pymake
+import helpers
+from helpers import hello_srcs, write_sources
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# set up paths
+dstpth = os.path.join('temp', 't010')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+srcdir_temp = os.path.join(builddir, 'src_temp')
+
+# openspec.inc is rewritten by pymake
+openspec = '''      CHARACTER*20 ACCESS,FORM,ACTION(2)
+      DATA ACCESS/'SEQUENTIAL'/
+      DATA FORM/'BINARY'/
+      DATA (ACTION(I),I=1,2)/'READ','READWRITE'/
+'''
+openit = '''      SUBROUTINE OPENIT()
+      INCLUDE 'openspec.inc'
+      RETURN
+      END
+'''
+
+
+def write_source():
+    files = dict(hello_srcs)
+    files['openspec.inc'] = openspec
+    files['openit.f'] = openit
+    write_sources(srcpth, files, dstpth)
+    return
+
+
+def read_openspec(pth):
+    f = open(os.path.join(pth, 'openspec.inc'), 'r')
+    text = f.read()
+    f.close()
+    return text
+
+
+def build(staging):
+    helpers.build(srcpth, target, staging=staging, builddir=builddir)
+    return
+
+
+def test_link_staging():
+    write_source()
+    for staging in ['symlink', 'hardlink']:
+        build(staging)
+        # the original openspec.inc is not changed
+        assert read_openspec(srcpth) == openspec
+        # the staged openspec.inc is a rewritten copy
+        fpth = os.path.join(srcdir_temp, 'openspec.inc')
+        assert not os.path.islink(fpth)
+        assert 'STREAM' in read_openspec(srcdir_temp)
+        # other source files are linked
+        fpth = os.path.join(srcdir_temp, 'main.f90')
+        if staging == 'symlink':
+            assert os.path.islink(fpth)
+        else:
+            assert os.stat(fpth).st_nlink > 1
+    return
+
+
+def test_include_directory():
+    # an include directory without source files is searched as well
+    write_source()
+    incpth = os.path.join(srcpth, 'include')
+    os.makedirs(incpth)
+    f = open(os.path.join(incpth, 'openspec.inc'), 'w')
+    f.write(openspec)
+    f.close()
+    build('copy')
+    assert read_openspec(incpth) == openspec
+    assert 'STREAM' in read_openspec(os.path.join(srcdir_temp, 'include'))
+    return
+
+
+def test_no_staging():
+    write_source()
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                              makeclean=True, staging='none',
+                              builddir=builddir)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    print(output)
+    assert success == 0, 'build without staging failed'
+    # openspec.inc is used as it is
+    fpth = os.path.join(srcpth, 'openspec.inc')
+    assert 'Warning: "{}" is not replaced'.format(fpth) in output, output
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    # the source directory is not changed or removed
+    assert read_openspec(srcpth) == openspec
+    assert len(os.listdir(srcpth)) == len(hello_srcs) + 2
+    assert not os.path.isdir(builddir)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_link_staging()
+    test_include_directory()
+    test_no_staging()
+    test_teardown()
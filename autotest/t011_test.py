@@ -0,0 +1,53 @@
+from __future__ import print_function
+import os
+import shutil
+import threading
+import pymake
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't011')
+srcpth = os.path.join(dstpth, 'src')
+targets = [os.path.join(dstpth, 'hello{}'.format(i)) for i in range(4)]
+
+
+def test_concurrent_builds():
+    write_sources(srcpth, hello_srcs, dstpth)
+
+    # each target is built in its own build directory
+    builddirs = set([pymake.get_builddir(target) for target in targets])
+    assert len(builddirs) == len(targets)
+
+    results = {}
+
+    def build(target):
+        results[target] = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                                      makeclean=True, jobs=2)
+        return
+
+    threads = [threading.Thread(target=build, args=(target,))
+               for target in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for target in targets:
+        assert results[target] == 0, '{} build failed'.format(target)
+        assert os.path.isfile(target), \
+            'Target {} does not exist.'.format(target)
+    for builddir in builddirs:
+        assert not os.path.isdir(builddir), \
+            '{} was not removed'.format(builddir)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_concurrent_builds()
+    test_teardown()
@@ -0,0 +1,66 @@
+from __future__ import print_function
+import os
+import json
+import shutil
+import subprocess
+import sys
+import pymake
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't012')
+
+
+def test_build_many():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    specs = []
+    for i in range(3):
+        srcpth = os.path.join(dstpth, 'src{}'.format(i))
+        write_sources(srcpth, hello_srcs)
+        specs.append({'srcdir': srcpth,
+                      'target': os.path.join(dstpth, 'hello{}'.format(i)),
+                      'double': i == 1})
+    # a target that fails does not stop the other targets
+    specs.append({'srcdir': os.path.join(dstpth, 'missing'),
+                  'target': os.path.join(dstpth, 'missing')})
+
+    results = pymake.build_many(specs, jobs=2)
+    assert results == [0, 0, 0, 1], results
+    for spec in specs[:-1]:
+        assert os.path.isfile(spec['target']), \
+            'Target {} does not exist.'.format(spec['target'])
+    return
+
+
+def test_batch_cli():
+    specs = [{'srcdir': os.path.join(dstpth, 'src0'),
+              'target': os.path.join(dstpth, 'cli0')},
+             {'srcdir': os.path.join(dstpth, 'src2'),
+              'target': os.path.join(dstpth, 'cli2')}]
+    specfile = os.path.join(dstpth, 'specs.json')
+    f = open(specfile, 'w')
+    json.dump(specs, f)
+    f.close()
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.abspath('..')] +
+                                        sys.path)
+    returncode = subprocess.call([sys.executable, '-m', 'pymake.batch',
+                                  specfile, '-j', '2'], env=env)
+    assert returncode == 0, 'pymake.batch failed'
+    for spec in specs:
+        assert os.path.isfile(spec['target']), \
+            'Target {} does not exist.'.format(spec['target'])
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_build_many()
+    test_batch_cli()
+    test_teardown()
@@ -0,0 +1,72 @@
+from __future__ import print_function
+import os
+import shutil
+from pymake import compilers
+from pymake.utils import write_json
+
+# set up paths
+dstpth = os.path.join('temp', 't013')
+
+
+def test_probe_cache():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    cachedir = os.environ.get('PYMAKE_CACHE_DIR')
+    os.environ['PYMAKE_CACHE_DIR'] = dstpth
+    try:
+        # the first call probes the compiler
+        compilers._compilers.clear()
+        info = compilers.get_compiler_info('gfortran')
+        assert 'GNU Fortran' in info['version'], info['version']
+        assert info['family'] == 'gfortran'
+        assert info['moddirflag'] == '-J'
+        assert info['modformat'].startswith('gfortran-'), info['modformat']
+        assert '-J' in info['flags']
+        assert len(os.listdir(os.path.join(dstpth, 'compilers'))) == 1
+
+        # later calls, including calls from a new process, use the cached
+        # result without running the compiler
+        def no_probe(cmdlist, cwd=None):
+            raise AssertionError('compiler was probed again')
+        run = compilers._run
+        compilers._run = no_probe
+        try:
+            compilers._compilers.clear()
+            info2 = compilers.get_compiler_info('gfortran')
+            assert info2 == info
+            assert compilers.flag_available('-J', 'gfortran')
+            assert not compilers.flag_available('-fno-such-flag', 'gfortran')
+        finally:
+            compilers._run = run
+
+        # a result stored by another version of the probes is not used
+        fpth = os.path.join(dstpth, 'compilers',
+                            os.listdir(os.path.join(dstpth, 'compilers'))[0])
+        write_json(fpth, dict(info, probeversion=0))
+        compilers._compilers.clear()
+        info3 = compilers.get_compiler_info('gfortran')
+        assert info3['probeversion'] == compilers.probeversion
+    finally:
+        if cachedir is None:
+            del os.environ['PYMAKE_CACHE_DIR']
+        else:
+            os.environ['PYMAKE_CACHE_DIR'] = cachedir
+    return
+
+
+def test_missing_compiler():
+    info = compilers.get_compiler_info('no-such-compiler')
+    assert info['path'] is None and info['version'] is None
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_probe_cache()
+    test_missing_compiler()
+    test_teardown()
@@ -0,0 +1,58 @@
+from __future__ import print_function
+import os
+import csv
+import json
+import shutil
+import pymake
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't014')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+tracefile = os.path.join(dstpth, 'trace.json')
+
+
+def test_trace():
+    write_sources(srcpth, hello_srcs, dstpth)
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, jobs=2,
+                          cachedir=os.path.join(dstpth, 'cache'),
+                          trace=tracefile)
+    assert success == 0, 'build failed'
+
+    # the chrome trace has the phases and a compile for each source file
+    f = open(tracefile, 'r')
+    events = json.load(f)['traceEvents']
+    f.close()
+    phases = [e['name'] for e in events if e.get('cat') == 'phase']
+    for name in ['stage', 'scan', 'compile', 'link', 'cleanup']:
+        assert name in phases, '{} not in {}'.format(name, phases)
+    compiles = [e for e in events if e.get('cat') == 'compile']
+    assert sorted([e['name'] for e in compiles]) == sorted(hello_srcs)
+    for e in compiles:
+        assert e['args']['returncode'] == 0
+        assert e['args']['cache'] == 'miss'
+        assert e['args']['queue_s'] >= 0.
+        assert e['args']['maxrss_kb'] > 0
+
+    # the csv summary lists the longest compiles first
+    f = open(os.path.splitext(tracefile)[0] + '.csv', 'r')
+    rows = list(csv.DictReader(f))
+    f.close()
+    durations = [float(row['duration_s']) for row in rows
+                 if row['category'] == 'compile']
+    assert len(durations) == len(hello_srcs)
+    assert durations == sorted(durations, reverse=True)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_trace()
+    test_teardown()
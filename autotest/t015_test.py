@@ -0,0 +1,84 @@
+from __future__ import print_function
+import os
+import shutil
+import pymake
+from pymake.pymake import compile_sources
+from pymake.schedule import CompileHistory, get_history_file, \
+    get_weights, get_priorities
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't015')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+
+
+def test_priorities():
+    # a chain a -> b -> c and two leaves x and y that come first
+    srcfiles = ['x', 'y', 'a', 'b', 'c']
+    dependents = {'a': ['b'], 'b': ['c']}
+    weights = {'x': 2., 'y': 2., 'a': 1., 'b': 1., 'c': 1.}
+    priority = get_priorities(srcfiles, dependents, weights)
+    assert priority == {'x': 2., 'y': 2., 'a': 3., 'b': 2., 'c': 1.}
+
+    # the head of the chain is started first
+    started = []
+
+    def skip(srcfile):
+        started.append(srcfile)
+        return False
+
+    def runner(srcfile, cmdlist):
+        return 0, None, None
+
+    compilelist = [(srcfile, ['echo', srcfile]) for srcfile in srcfiles]
+    dependencies = {'b': ['a'], 'c': ['b']}
+    returncode = compile_sources(compilelist, dependencies, jobs=2,
+                                 skip=skip, runner=runner,
+                                 priority=priority)
+    assert returncode == 0
+    assert started[0] == 'a', started
+    return
+
+
+def test_history():
+    write_sources(srcpth, hello_srcs, dstpth)
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=False, jobs=2, builddir=builddir)
+    assert success == 0, 'build failed'
+
+    # the compile time of every source file is recorded
+    objdir = os.path.join(builddir, 'obj_temp')
+    history = CompileHistory(get_history_file(objdir))
+    assert len(history.durations) == len(hello_srcs), history.durations
+    for duration in history.durations.values():
+        assert duration > 0.
+
+    # recorded times are used as weights and sizes are scaled by the
+    # recorded compile rate
+    srcfiles = sorted(history.durations)
+    weights = get_weights(srcfiles, history)
+    for srcfile in srcfiles:
+        assert weights[srcfile] == history.get(srcfile)
+    history.durations.pop(srcfiles[0])
+    weights = get_weights(srcfiles, history)
+    assert weights[srcfiles[0]] > 0.
+
+    # a second build uses the history
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, jobs=2, builddir=builddir)
+    assert success == 0, 'build failed'
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_priorities()
+    test_history()
+    test_teardown()
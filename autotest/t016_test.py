@@ -0,0 +1,108 @@
+from __future__ import print_function
+import time
+from pymake.dag import Node, DirectedAcyclicGraph
+
+
+def get_nodelist():
+    a = Node('a')
+    b = Node('b')
+    c = Node('c')
+    d = Node('d')
+    e = Node('e')
+    a.add_dependency(b)
+    a.add_dependency(c)
+    c.add_dependency(d)
+    d.add_dependency(b)
+    return [a, b, c, d, e]
+
+
+def test_toposort():
+    nodelist = get_nodelist()
+    dag = DirectedAcyclicGraph(nodelist)
+    ordered = [n.name for n in dag.toposort()]
+    assert ordered == ['b', 'e', 'd', 'c', 'a'], ordered
+
+    # the graph is not changed and sorting again gives the same order
+    assert [n.name for n in nodelist[0].dependencies] == ['b', 'c']
+    assert [n.name for n in dag.toposort()] == ordered
+    return
+
+
+def test_cycle():
+    nodelist = get_nodelist()
+    nodelist[1].add_dependency(nodelist[0])
+    dag = DirectedAcyclicGraph(nodelist)
+    try:
+        dag.toposort()
+    except Exception as e:
+        assert 'cycle' in str(e), str(e)
+    else:
+        raise AssertionError('cycle was not detected')
+    return
+
+
+def test_levels():
+    nodelist = get_nodelist()
+    dag = DirectedAcyclicGraph(nodelist)
+    levels = [[n.name for n in level] for level in dag.levels()]
+    assert levels == [['b', 'e'], ['d'], ['c'], ['a']], levels
+    assert dag.widths() == [2, 1, 1, 1]
+
+    # critical path without and with weights
+    length, path = dag.critical_path()
+    assert length == 4
+    assert [n.name for n in path] == ['b', 'd', 'c', 'a']
+    length, path = dag.critical_path({'e': 10.})
+    assert length == 10.
+    assert [n.name for n in path] == ['e']
+    summary = dag.summary()
+    assert summary['levels'] == 4 and summary['max_width'] == 2
+    assert summary['critical_path'] == 4
+    return
+
+
+def test_ready_set():
+    nodelist = get_nodelist()
+    ready = DirectedAcyclicGraph(nodelist).ready_set()
+    assert [n.name for n in ready.get_ready()] == ['b', 'e']
+    assert ready.get_ready() == []
+    assert ready.is_active()
+    ready.done(nodelist[4])
+    assert ready.get_ready() == []
+    ready.done(nodelist[1])
+    assert [n.name for n in ready.get_ready()] == ['d']
+
+    # iterating gives every node once when each node is marked done
+    ready = DirectedAcyclicGraph(nodelist).ready_set()
+    names = []
+    for n in ready:
+        names.append(n.name)
+        ready.done(n)
+    assert names == ['b', 'e', 'd', 'c', 'a'], names
+    assert not ready.is_active()
+    return
+
+
+def test_large():
+    # each node depends on the previous ten nodes
+    n = 20000
+    nodelist = [Node('f{}'.format(i)) for i in range(n)]
+    for i in range(n):
+        for j in range(max(0, i - 10), i):
+            nodelist[i].add_dependency(nodelist[j])
+    nodelist.reverse()
+    t0 = time.time()
+    ordered = DirectedAcyclicGraph(nodelist).toposort()
+    elapsed = time.time() - t0
+    assert [node.name for node in ordered] == \
+        ['f{}'.format(i) for i in range(n)]
+    assert elapsed < 5., 'sort took {} seconds'.format(elapsed)
+    return
+
+
+if __name__ == '__main__':
+    test_toposort()
+    test_cycle()
+    test_levels()
+    test_ready_set()
+    test_large()
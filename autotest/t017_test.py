@@ -0,0 +1,88 @@
+from __future__ import print_function
+import os
+import shutil
+from pymake.scanner import scan_data, scan_file, scan_files
+from pymake.pymake import get_iso_c
+
+# set up paths
+dstpth = os.path.join('temp', 't017')
+
+fsrc = b'''      module kinds
+      use, intrinsic :: iso_c_binding
+      use constants, only: pi
+      implicit none
+      interface area
+        module procedure area_r
+      end interface
+      contains
+      pure real function area_r(r)
+        include 'openspec.inc'
+      end function area_r
+      end module kinds
+c     use commented
+      program main
+      use :: kinds
+      call sub()
+      end program main
+      recursive subroutine sub()
+      end subroutine sub
+'''
+
+csrc = b'''#include "helper.h"
+# include <stdio.h>
+'''
+
+
+def test_scan_data():
+    info = scan_data(fsrc)
+    assert info['modules'] == ['KINDS'], info['modules']
+    assert info['uses'] == ['ISO_C_BINDING', 'CONSTANTS', 'KINDS']
+    assert info['includes'] == ['openspec.inc']
+    assert info['iso_c']
+    assert info['programs'] == ['MAIN']
+    assert info['procedures'] == ['AREA_R', 'SUB'], info['procedures']
+    info = scan_data(csrc, cfile=True)
+    assert info['includes'] == ['helper.h']
+    assert info['sysincludes'] == ['stdio.h']
+    return
+
+
+def test_scan_files():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    os.makedirs(dstpth)
+    srcfiles = []
+    for i in range(20):
+        fpth = os.path.join(dstpth, 'f{}.f90'.format(i))
+        f = open(fpth, 'wb')
+        f.write(b'module m' + str(i).encode('ascii') + b'\nend module\n')
+        f.close()
+        srcfiles.append(fpth)
+    fpth = os.path.join(dstpth, 'empty.f90')
+    open(fpth, 'wb').close()
+    srcfiles.append(fpth)
+    index = scan_files(srcfiles, nthreads=4)
+    for i in range(20):
+        assert index[srcfiles[i]]['modules'] == ['M{}'.format(i)]
+    assert index[fpth]['modules'] == []
+    assert not get_iso_c(srcfiles)
+
+    # a changed file is scanned again
+    f = open(srcfiles[0], 'wb')
+    f.write(b'module changed\nuse iso_c_binding\nend module\n')
+    f.close()
+    assert scan_file(srcfiles[0])['modules'] == ['CHANGED']
+    assert get_iso_c(srcfiles)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_scan_data()
+    test_scan_files()
+    test_teardown()
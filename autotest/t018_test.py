@@ -0,0 +1,87 @@
+from __future__ import print_function
+import os
+import time
+import shutil
+from pymake import scanner
+from pymake.dag import order_source_files
+
+# set up paths
+dstpth = os.path.join('temp', 't018')
+srcpth = os.path.join(dstpth, 'src')
+cachepth = os.path.join(dstpth, 'cache')
+nfiles = 5000
+
+
+def write_source():
+    os.makedirs(srcpth)
+    srcfiles = []
+    for i in range(nfiles):
+        fpth = os.path.join(srcpth, 'm{}.f90'.format(i))
+        f = open(fpth, 'w')
+        f.write('module m{}\n'.format(i))
+        if i > 0:
+            f.write('use m{}\n'.format(i - 1))
+        f.write('end module m{}\n'.format(i))
+        f.close()
+        srcfiles.append(fpth)
+    return srcfiles
+
+
+def no_scan(data, cfile=False):
+    raise AssertionError('file was scanned again')
+
+
+def test_scan_cache():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    cachedir = os.environ.get('PYMAKE_CACHE_DIR')
+    os.environ['PYMAKE_CACHE_DIR'] = cachepth
+    scan_data = scanner.scan_data
+    try:
+        srcfiles = write_source()
+        ordered = order_source_files(srcfiles)
+        assert ordered == srcfiles
+        shard = scanner.get_shard_file(os.path.abspath(srcpth))
+        assert os.path.isfile(shard), shard
+
+        # a new process orders the unchanged tree without scanning
+        scanner._shards.clear()
+        scanner.scan_data = no_scan
+        t0 = time.time()
+        ordered = order_source_files(srcfiles)
+        elapsed = time.time() - t0
+        assert ordered == srcfiles
+        print('ordered {} unchanged files in {:.3f} seconds'.format(nfiles,
+                                                                  elapsed))
+        assert elapsed < 2., elapsed
+
+        # a touched file with the same contents is hashed but not scanned
+        st = os.stat(srcfiles[0])
+        os.utime(srcfiles[0], (st.st_atime, st.st_mtime + 10.))
+        scanner._shards.clear()
+        assert scanner.scan_file(srcfiles[0])['modules'] == ['M0']
+
+        # a changed file is scanned again
+        scanner.scan_data = scan_data
+        f = open(srcfiles[1], 'w')
+        f.write('module m1\nuse m0\nuse iso_c_binding\nend module m1\n')
+        f.close()
+        assert scanner.scan_file(srcfiles[1])['iso_c']
+    finally:
+        scanner.scan_data = scan_data
+        if cachedir is None:
+            os.environ.pop('PYMAKE_CACHE_DIR')
+        else:
+            os.environ['PYMAKE_CACHE_DIR'] = cachedir
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_scan_cache()
+    test_teardown()
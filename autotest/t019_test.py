@@ -0,0 +1,66 @@
+from __future__ import print_function
+import os
+import shutil
+from pymake.dag import SourceGraph, DirectedAcyclicGraph, order_source_files
+
+# set up paths
+dstpth = os.path.join('temp', 't019')
+
+
+def write(fname, text):
+    fpth = os.path.join(dstpth, fname)
+    f = open(fpth, 'w')
+    f.write(text)
+    f.close()
+    return fpth
+
+
+def test_source_graph():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    os.makedirs(dstpth)
+    a = write('a.f90', 'module a\nend module a\n')
+    b = write('b.f90', 'module b\nuse a\nend module b\n')
+    c = write('c.f90', 'program c\nuse b\nend program c\n')
+    d = write('d.f90', 'subroutine d\nend subroutine d\n')
+    graph = SourceGraph([a, b, c, d])
+    assert graph.toposort() == order_source_files([a, b, c, d])
+    assert graph.downstream([a]) == set([b, c])
+
+    # updating a invalidates everything that uses it
+    assert graph.update_file(a) == [a, b, c]
+    assert graph.update_file(d) == [d]
+
+    # c stops using b and uses a
+    write('c.f90', 'program c\nuse a\nend program c\n')
+    assert graph.update_file(c) == [c]
+    assert graph.dependencies[c] == set([a])
+    assert graph.downstream([b]) == set()
+
+    # removing a leaves b and c without a provider
+    assert graph.remove_file(a) == [b, c]
+    assert graph.dependencies[b] == set()
+    assert graph.dependencies[c] == set()
+
+    # adding a file that provides a links the files that use it
+    e = write('e.f90', 'module a\nend module a\n')
+    assert graph.add_file(e) == [e, b, c]
+    assert graph.dependencies[b] == set([e])
+
+    # the nodelist can be sorted with the dag
+    nodelist = graph.get_nodelist()
+    ordered = [n.name for n in DirectedAcyclicGraph(nodelist).toposort()]
+    assert ordered.index(e) < ordered.index(b) < ordered.index(c)
+    assert graph.toposort() == [d, e, b, c]
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_source_graph()
+    test_teardown()
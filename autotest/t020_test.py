@@ -0,0 +1,80 @@
+from __future__ import print_function
+import os
+import sys
+import shutil
+import subprocess
+import pymake
+from pymake.dag import Node, DirectedAcyclicGraph
+from pymake.rebuild import get_rebuild_set
+from helpers import hello_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't020')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+
+
+def test_dag_rebuild_set():
+    a = Node('a')
+    b = Node('b')
+    c = Node('c')
+    d = Node('d')
+    b.add_dependency(a)
+    c.add_dependency(b)
+    d.add_dependency(a)
+    dag = DirectedAcyclicGraph([c, d, b, a])
+    assert [n.name for n in dag.get_dependents(a)] == ['d', 'b']
+    assert [n.name for n in dag.get_rebuild_set([a])] == ['a', 'd', 'b', 'c']
+    assert [n.name for n in dag.get_rebuild_set([b])] == ['b', 'c']
+    assert [n.name for n in dag.get_rebuild_set([c, d])] == ['d', 'c']
+    return
+
+
+def test_rebuild_set():
+    write_sources(srcpth, hello_srcs, dstpth)
+
+    # without a build the cost is the size of the source files
+    rebuild, length, timed = get_rebuild_set(srcpth, ['constants.f90'])
+    names = [os.path.basename(f) for f, cost in rebuild]
+    assert names == ['constants.f90', 'helper.f90', 'main.f90'], names
+    assert not timed
+    fpth = os.path.join(srcpth, 'constants.f90')
+    assert rebuild[0][1] == os.path.getsize(fpth)
+    assert length == sum([cost for f, cost in rebuild])
+
+    # after a build the recorded compile times are used
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, builddir=builddir)
+    assert success == 0, 'build failed'
+    rebuild, length, timed = get_rebuild_set(srcpth, [fpth], target,
+                                             builddir=builddir)
+    assert timed
+    assert len(rebuild) == 3
+    for f, cost in rebuild:
+        assert 0. < cost < 60., cost
+
+    # command line
+    cmdlist = [sys.executable, '-m', 'pymake.rebuild', srcpth,
+               'kinds.f90', '-t', target, '-bd', builddir]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.abspath('..')
+    proc = subprocess.Popen(cmdlist, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, env=env)
+    stdout_data, stderr_data = proc.communicate()
+    stdout_data = stdout_data.decode()
+    assert proc.returncode == 0, stdout_data
+    assert '4 source files to recompile' in stdout_data, stdout_data
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_dag_rebuild_set()
+    test_rebuild_set()
+    test_teardown()
@@ -0,0 +1,92 @@
+from __future__ import print_function
+import os
+import sys
+import shutil
+import pymake
+from pymake.dag import get_reachable_srcfiles
+from helpers import hello_srcs, write_sources
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# set up paths
+dstpth = os.path.join('temp', 't021')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+
+# files that are not used by the hello program
+extra = {
+    'dead.f90': '''module dead
+  implicit none
+contains
+  subroutine unused()
+  end subroutine unused
+end module dead
+''',
+    'util.f90': '''program util
+  use dead
+  call unused()
+end program util
+''',
+}
+
+
+def test_prune():
+    write_sources(srcpth, hello_srcs, dstpth)
+    write_sources(srcpth, extra)
+    srcfiles = pymake.get_ordered_srcfiles(srcpth)
+
+    # hello needs everything but dead.f90 and util.f90, which includes
+    # utils.f (called) and other.f90 (used)
+    reachable = get_reachable_srcfiles(srcfiles, 'hello')
+    names = sorted([os.path.basename(f) for f in reachable])
+    assert names == ['constants.f90', 'helper.f90', 'kinds.f90',
+                     'main.f90', 'other.f90', 'utils.f'], names
+    reachable = get_reachable_srcfiles(srcfiles, 'util')
+    names = sorted([os.path.basename(f) for f in reachable])
+    assert names == ['dead.f90', 'util.f90'], names
+    assert len(get_reachable_srcfiles(srcfiles)) == len(srcfiles)
+
+    # the build only compiles the reachable files
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, prune='hello')
+    assert success == 0, 'build failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    return
+
+
+def test_alternates():
+    # serial and parallel versions of a subroutine are both reachable
+    altpth = os.path.join(dstpth, 'alt')
+    write_sources(altpth, {
+        'p.f': '      PROGRAM P\n      CALL FOO()\n      END\n',
+        'serial.f': '      SUBROUTINE FOO()\n      END\n',
+        'parallel.f': '      SUBROUTINE FOO()\n      END\n'})
+    srcfiles = [os.path.join(altpth, fname)
+                for fname in ['p.f', 'serial.f', 'parallel.f']]
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        reachable = get_reachable_srcfiles(srcfiles)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    print(output)
+    assert reachable == srcfiles, reachable
+    assert 'Warning: FOO is defined in more than one source file: ' \
+           '{}, {}'.format(srcfiles[1], srcfiles[2]) in output, output
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_prune()
+    test_alternates()
+    test_teardown()
@@ -0,0 +1,112 @@
+from __future__ import print_function
+import os
+import shutil
+import pymake
+from pymake.scanner import scan_data
+from pymake.dag import get_reachable_srcfiles
+import helpers
+from helpers import shapes_srcs, write_source, write_sources, get_mtimes
+
+# set up paths
+dstpth = os.path.join('temp', 't022')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'shapes')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+
+def build():
+    helpers.build(srcpth, target, expedite=True, builddir=builddir)
+    return get_mtimes(objdir)
+
+
+def test_lexer():
+    # continued use statements and submodules
+    info = scan_data(b'''module a
+  use b, &
+  ! comment
+    only: x
+  use, intrinsic :: iso_c_binding
+  interface
+    module integer function f()
+    end function f
+  end interface
+end module a
+submodule (a) s1
+end submodule s1
+submodule (a:s1) s2
+  implicit none; use c
+end submodule s2
+''')
+    assert info['modules'] == ['A'], info['modules']
+    assert info['uses'] == ['B', 'ISO_C_BINDING', 'C'], info['uses']
+    assert info['submodules'] == ['A@S1', 'A@S2'], info['submodules']
+    assert info['parents'] == ['A', 'A@S1'], info['parents']
+
+    # fixed form continuation lines and comment lines
+    info = scan_data(b'''      subroutine x
+      use
+     +  mymod
+c     use notme
+     & , only : y
+      include 'openspec.inc'
+      end
+''', fixed=True)
+    assert info['uses'] == ['MYMOD'], info['uses']
+    assert info['includes'] == ['openspec.inc'], info['includes']
+    return
+
+
+def test_submodule():
+    write_sources(srcpth, shapes_srcs, dstpth)
+
+    # the submodule is compiled after the module and the program after
+    # the module used in its include file
+    srcfiles = pymake.get_ordered_srcfiles(srcpth)
+    names = [os.path.basename(f) for f in srcfiles]
+    assert names.index('shapes.f90') < names.index('shapes_impl.f90'), names
+    assert names.index('units.f90') < names.index('main.f90'), names
+
+    # the submodule is reachable from the program through its module
+    reachable = get_reachable_srcfiles(srcfiles)
+    assert len(reachable) == len(srcfiles), reachable
+
+    mtimes0 = build()
+    assert len(mtimes0) == 4, mtimes0
+
+    # changing the implementation in the submodule does not recompile
+    # the program that uses the module
+    text = shapes_srcs['shapes_impl.f90'].replace('3.14159', '3.1416')
+    write_source(srcpth, 'shapes_impl.f90', text)
+    mtimes1 = build()
+    changed = set([f for f in mtimes1 if mtimes1[f] != mtimes0[f]])
+    assert changed == set(['shapes_impl.o']), changed
+
+    # changing the private part of the module recompiles the submodule
+    # but not the program
+    text = shapes_srcs['shapes.f90'].replace('ncalls = 0',
+                                             'ncalls = 0, nerrors = 0')
+    write_source(srcpth, 'shapes.f90', text)
+    mtimes2 = build()
+    changed = set([f for f in mtimes2 if mtimes2[f] != mtimes1[f]])
+    assert changed == set(['shapes.o', 'shapes_impl.o']), changed
+
+    # changing the module used in the include file recompiles the program
+    text = shapes_srcs['units.f90'].replace("'m2'", "'square meters'")
+    write_source(srcpth, 'units.f90', text)
+    mtimes3 = build()
+    changed = set([f for f in mtimes3 if mtimes3[f] != mtimes2[f]])
+    assert changed == set(['units.o', 'main.o']), changed
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_lexer()
+    test_submodule()
+    test_teardown()
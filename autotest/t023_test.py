@@ -0,0 +1,174 @@
+from __future__ import print_function
+import os
+import shutil
+import pymake
+from pymake.scanner import eval_condition, preprocess, scan_data, \
+    scan_file, get_define_key, _get_variant
+from pymake.compilers import get_defines
+from helpers import write_source, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't023')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'variant')
+
+# alpha only uses beta, which uses alpha, when ALPHA_BETA is defined
+srcs = {
+    'alpha.F90': '''module alpha
+#ifdef ALPHA_BETA
+  use beta
+#elif !defined(__GFORTRAN__)
+  use gamma
+#endif
+  implicit none
+  integer, parameter :: one = 1
+end module alpha
+''',
+    'beta.f90': '''module beta
+  use alpha
+  implicit none
+  integer, parameter :: two = 2 * one
+end module beta
+''',
+    'main.f90': '''program main
+  use beta
+  print *, two
+end program main
+''',
+}
+
+
+def test_conditions():
+    defines = {'FOO': '1', 'VER': '3', 'EMPTY': '', 'ALIAS': 'VER'}
+    assert eval_condition('defined(FOO) && VER >= 2', defines)
+    assert eval_condition('!defined BAR', defines)
+    assert eval_condition('(1 + 2) * 3 == 9 // comment', defines)
+    assert eval_condition('ALIAS == 3 && -VER < 0', defines)
+    assert not eval_condition('BAR', defines)
+    assert not eval_condition('defined(FOO) && !(VER % 3 == 0)', defines)
+    # expressions that can not be evaluated are true
+    assert eval_condition('EMPTY', defines)
+    assert eval_condition('FOO ? 0 : 0', defines)
+    return
+
+
+def test_preprocess():
+    data = b'''#define LOCAL
+#if defined(A)
+use a
+#  if B > 1
+use b
+#  endif
+#elif defined(LOCAL)
+use local
+#else
+use other
+#endif
+#undef LOCAL
+#ifdef LOCAL
+use never
+#endif
+'''
+    info = scan_data(data)
+    assert info['conditional']
+    assert info['uses'] == ['A', 'B', 'LOCAL', 'OTHER', 'NEVER'], \
+        info['uses']
+    info = scan_data(preprocess(data, {'A': '1', 'B': '2'}))
+    assert info['uses'] == ['A', 'B'], info['uses']
+    info = scan_data(preprocess(data, {'A': '1'}))
+    assert info['uses'] == ['A'], info['uses']
+    info = scan_data(preprocess(data, {}))
+    assert info['uses'] == ['LOCAL'], info['uses']
+    return
+
+
+def test_extensions():
+    if not os.path.isdir(srcpth):
+        os.makedirs(srcpth)
+    text = '#ifdef NEVER\nuse never\n#endif\nuse always\n'
+    defines = get_defines('gfortran')
+
+    # gfortran only preprocesses files with an upper case extension
+    # without -cpp, so both branches of the other files are compiled
+    for fname in ('lower.f90', 'lower.f', 'upper.F90', 'upper.F',
+                  'other.fpp'):
+        write_source(srcpth, fname, text)
+    for fname in ('lower.f90', 'lower.f'):
+        info = scan_file(os.path.join(srcpth, fname), defines)
+        assert info['uses'] == ['NEVER', 'ALWAYS'], info['uses']
+    for fname in ('upper.F90', 'upper.F', 'other.fpp'):
+        info = scan_file(os.path.join(srcpth, fname), defines)
+        assert info['uses'] == ['ALWAYS'], info['uses']
+
+    # every fortran file is preprocessed with -cpp
+    defines = get_defines('gfortran', ['-O2', '-cpp'])
+    info = scan_file(os.path.join(srcpth, 'lower.f90'), defines)
+    assert info['uses'] == ['ALWAYS'], info['uses']
+    return
+
+
+def test_variant_build():
+    write_sources(srcpth, srcs, dstpth)
+
+    # gfortran predefines __GFORTRAN__
+    defines = get_defines('gfortran')
+    assert '__GFORTRAN__' in defines
+    assert get_defines('gfortran', ['-DFOO', '-DVER=2'])['VER'] == '2'
+    assert 'FOO' not in get_defines('gfortran', ['-DFOO', '-UFOO'])
+
+    # the macros that depend on the compile flags are probed with them
+    assert '__OPTIMIZE__' not in defines
+    assert '__OPTIMIZE__' in get_defines('gfortran', ['-O2', '-fbacktrace'])
+
+    # the macros predefined by other compilers are not known, so every
+    # branch is scanned
+    assert get_defines('no-such-compiler', ['-DFOO']) is None
+    assert get_defines('ifort') is None
+
+    # all of the branches have a cycle
+    try:
+        pymake.get_ordered_srcfiles(srcpth)
+        raise AssertionError('cycle was not found')
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+    try:
+        pymake.get_ordered_srcfiles(srcpth,
+                                    defines=get_defines('gfortran',
+                                                        ['-DALPHA_BETA']))
+        raise AssertionError('cycle was not found')
+    except AssertionError:
+        raise
+    except Exception:
+        pass
+
+    # the default configuration does not
+    srcfiles = pymake.get_ordered_srcfiles(srcpth, defines=defines)
+    names = [os.path.basename(f) for f in srcfiles]
+    assert names == ['alpha.F90', 'beta.f90', 'main.f90'], names
+
+    # the facts for the configuration are stored with the facts for the
+    # file
+    variant = _get_variant(srcfiles[0], get_define_key(defines))
+    assert variant is not None and variant['uses'] == [], variant
+
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True)
+    assert success == 0, 'build failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_conditions()
+    test_preprocess()
+    test_extensions()
+    test_variant_build()
+    test_teardown()
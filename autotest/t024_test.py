@@ -0,0 +1,100 @@
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+from pymake.builddb import read_depfile
+import helpers
+from helpers import chello_srcs, write_source, write_sources, get_mtimes
+
+# set up paths
+dstpth = os.path.join('temp', 't024')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'chello')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+def build(cachedir=None, bdir=builddir):
+    helpers.build(srcpth, target, expedite=True, builddir=bdir,
+                  cachedir=cachedir)
+    return get_mtimes(objdir)
+
+
+def run():
+    proc = subprocess.Popen([os.path.abspath(target)],
+                            stdout=subprocess.PIPE)
+    stdout_data, stderr_data = proc.communicate()
+    return stdout_data.decode().split()
+
+
+def test_read_depfile():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    os.makedirs(dstpth)
+    fpth = os.path.join(dstpth, 'a.d')
+    f = open(fpth, 'w')
+    f.write('obj/a.o: src/a.c src/a.h \\\n src/my\\ dir/b.h\n')
+    f.close()
+    assert read_depfile(fpth) == ['src/a.h', 'src/my dir/b.h']
+    assert read_depfile(os.path.join(dstpth, 'missing.d')) is None
+    return
+
+
+def test_headers():
+    write_sources(srcpth, chello_srcs, dstpth)
+
+    mtimes0 = build()
+    assert sorted(mtimes0) == ['main.o', 'plain.o', 'twice.o'], mtimes0
+
+    # nothing is rebuilt if nothing changed
+    mtimes1 = build()
+    assert mtimes1 == mtimes0, 'unchanged files were recompiled'
+
+    # editing a header that is only included by another header rebuilds
+    # the translation unit that includes it and nothing else
+    write_source(srcpth, 'config.h', '#define FACTOR 3\n')
+    mtimes2 = build()
+    changed = set([f for f in mtimes2 if mtimes2[f] != mtimes1[f]])
+    assert changed == set(['twice.o']), changed
+    return
+
+
+def test_headers_cache():
+    write_sources(srcpth, chello_srcs, dstpth)
+    cachedir = os.path.join(dstpth, 'cache')
+
+    build(cachedir)
+    assert run() == ['4', '3']
+
+    # the object file compiled with the old header is not used
+    write_source(srcpth, 'config.h', '#define FACTOR 3\n')
+    build(cachedir)
+    assert run() == ['6', '3']
+
+    # a build directory filled from the cache gets the depfiles, so a
+    # header that is changed later is found
+    bdir = os.path.join(dstpth, 'build2')
+    build(cachedir, bdir)
+    assert run() == ['6', '3']
+    assert os.path.isfile(os.path.join(bdir, 'obj_temp', 'twice.d'))
+    write_source(srcpth, 'config.h', '#define FACTOR 4\n')
+    build(cachedir, bdir)
+    assert run() == ['8', '3']
+
+    # the object file for a header that is changed back is in the cache
+    write_source(srcpth, 'config.h', '#define FACTOR 2\n')
+    build(cachedir, bdir)
+    assert run() == ['4', '3']
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_read_depfile()
+    test_headers()
+    test_headers_cache()
+    test_teardown()
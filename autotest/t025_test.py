@@ -0,0 +1,105 @@
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import pymake
+from pymake.compilers import which
+from helpers import shapes_srcs, write_source, write_sources, get_mtimes
+
+# set up paths
+dstpth = os.path.join('temp', 't025')
+srcpth = 'src'
+target = 'shapes'
+builddir = 'build'
+objdir = os.path.join(builddir, 'obj_temp')
+makefile = os.path.join(builddir, 'makefile')
+
+
+def age():
+    # make the existing files older so that a file changed next is newer
+    # than the files built from it
+    now = os.stat(makefile).st_mtime
+    for pth, dt in ((srcpth, 200), (objdir, 100)):
+        for fname in os.listdir(pth):
+            fpth = os.path.join(pth, fname)
+            os.utime(fpth, (now - dt, now - dt))
+    os.utime(target, (now - 100, now - 100))
+    return get_mtimes(objdir)
+
+
+def make():
+    proc = subprocess.Popen(['make', '-f', makefile, '-j8'],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    stdout_data, stderr_data = proc.communicate()
+    print(stdout_data.decode())
+    assert proc.returncode == 0, 'make failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    return get_mtimes(objdir)
+
+
+def test_makefile():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    os.makedirs(os.path.join(dstpth, srcpth))
+    cwd = os.getcwd()
+    os.chdir(dstpth)
+    try:
+        write_sources(srcpth, shapes_srcs)
+        success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                              makeclean=True, makefile=True,
+                              builddir=builddir)
+        assert success == 0, 'build failed'
+
+        # the makefile is written to the build directory and has the
+        # module and include file dependencies
+        assert not os.path.isfile('makefile')
+        f = open(makefile, 'r')
+        text = f.read()
+        f.close()
+        assert '$(OBJDIR)/shapes.mod : $(OBJDIR)/shapes.o\n' in text
+        assert '$(OBJDIR)/shapes_impl.o : $(OBJDIR)/shapes.mod ' \
+               '$(OBJDIR)/shapes.smod\n' in text
+        assert '$(OBJDIR)/main.o : $(OBJDIR)/shapes.mod ' \
+               '$(OBJDIR)/units.mod report.inc\n' in text
+
+        if which('make') is None:
+            print('make is not available...skipping parallel make')
+            return
+
+        # the makefile can be run with several jobs
+        os.remove(target)
+        mtimes0 = make()
+        assert len(mtimes0) == 4, mtimes0
+        mtimes0 = age()
+
+        # changing the private part of the module recompiles the
+        # submodule, which reads shapes.smod, but not the program
+        text = shapes_srcs['shapes.f90'].replace('ncalls = 0',
+                                                 'ncalls = 0, nerrors = 0')
+        write_source(srcpth, 'shapes.f90', text)
+        mtimes1 = make()
+        changed = set([f for f in mtimes1 if mtimes1[f] != mtimes0[f]])
+        assert changed == set(['shapes.o', 'shapes_impl.o']), changed
+
+        # changing an include file recompiles the file that includes it
+        mtimes1 = age()
+        f = open(os.path.join(srcpth, 'report.inc'), 'a')
+        f.write('  ! changed\n')
+        f.close()
+        mtimes2 = make()
+        changed = set([f for f in mtimes2 if mtimes2[f] != mtimes1[f]])
+        assert changed == set(['main.o']), changed
+    finally:
+        os.chdir(cwd)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_makefile()
+    test_teardown()
@@ -0,0 +1,88 @@
+from __future__ import print_function
+import os
+import sys
+import shutil
+import subprocess
+import pymake
+from pymake.compilers import which
+from helpers import shapes_srcs, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't026')
+srcpth = 'src'
+target = 'shapes'
+builddir = 'build'
+ddfile = 'build/obj_temp/fortran.dd'
+ninjafile = 'build/build.ninja'
+
+
+def read(fpth):
+    f = open(fpth, 'r')
+    text = f.read()
+    f.close()
+    return text
+
+
+def test_ninja():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    os.makedirs(os.path.join(dstpth, srcpth))
+    pth = os.path.dirname(os.path.dirname(os.path.abspath(pymake.__file__)))
+    cwd = os.getcwd()
+    os.chdir(dstpth)
+    try:
+        write_sources(srcpth, shapes_srcs)
+        success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                              makeclean=False, ninja=True,
+                              builddir=builddir)
+        assert success == 0, 'build failed'
+
+        # one edge for each source file in the source directory, and the
+        # module files in the dyndep file
+        assert not os.path.isfile('build.ninja')
+        text = read(ninjafile)
+        assert 'build build/obj_temp/shapes_impl.o: fc ' \
+               'src/shapes_impl.f90 || {}\n'.format(ddfile) in text
+        assert '  dyndep = {}\n'.format(ddfile) in text
+        assert 'build shapes: link ' in text
+        dyndep = read(ddfile)
+        assert dyndep.startswith('ninja_dyndep_version = 1\n')
+        assert 'build build/obj_temp/shapes.o | build/obj_temp/shapes.mod ' \
+               'build/obj_temp/shapes.smod: dyndep\n' in dyndep
+        assert 'build build/obj_temp/main.o: dyndep | ' \
+               'build/obj_temp/shapes.mod build/obj_temp/units.mod ' \
+               'src/report.inc\n' in dyndep
+
+        # the dyndep file written by ninja is the same
+        os.remove(ddfile)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([pth,
+                                             env.get('PYTHONPATH', '')])
+        cmdlist = [sys.executable, '-m', 'pymake.ninja', ddfile,
+                   'build/obj_temp'] + \
+                  [os.path.join(srcpth, fname) for fname in
+                   ['shapes.f90', 'shapes_impl.f90', 'units.f90',
+                    'main.f90']] + ['--fc', 'gfortran']
+        assert subprocess.call(cmdlist, env=env) == 0
+        assert read(ddfile) == dyndep
+
+        if which('ninja') is None:
+            print('ninja is not available...skipping ninja build')
+            return
+        os.remove(target)
+        assert subprocess.call(['ninja', '-f', ninjafile], env=env) == 0
+        assert os.path.isfile(target)
+    finally:
+        os.chdir(cwd)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_ninja()
+    test_teardown()
@@ -0,0 +1,204 @@
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import threading
+import subprocess
+import pymake
+from pymake.watch import PollingWatcher, InotifyWatcher, WatchBuild
+from pymake.builddb import BuildDatabase
+from helpers import shapes_srcs, chello_srcs, write_source, write_sources, \
+    get_mtimes
+
+# set up paths
+dstpth = os.path.join('temp', 't027')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'shapes')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+
+def setup_sources():
+    write_sources(srcpth, shapes_srcs, dstpth)
+    return
+
+
+def check_watcher(watcher):
+    try:
+        # nothing changed
+        assert watcher.wait(timeout=0.2) == []
+        write_source(srcpth, 'units.f90', shapes_srcs['units.f90'] + '\n')
+        write_source(srcpth, 'new.f90', 'module new\nend module new\n')
+        os.remove(os.path.join(srcpth, 'report.inc'))
+        write_source(srcpth, 'ignored.txt', 'not watched\n')
+        changed = watcher.wait(timeout=5)
+        names = [os.path.basename(f) for f in changed]
+        assert names == ['new.f90', 'report.inc', 'units.f90'], names
+    finally:
+        watcher.close()
+    return
+
+
+def test_polling_watcher():
+    setup_sources()
+    check_watcher(PollingWatcher([srcpth], exclude=[os.path.join(
+        srcpth, 'ignored.txt')], interval=0.05))
+    return
+
+
+def test_inotify_watcher():
+    if not sys.platform.startswith('linux'):
+        print('inotify is only available on linux...skipping')
+        return
+    setup_sources()
+    check_watcher(InotifyWatcher([srcpth], exclude=[os.path.join(
+        srcpth, 'ignored.txt')]))
+    return
+
+
+def test_sync():
+    setup_sources()
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=False, builddir=builddir)
+    assert success == 0, 'build failed'
+    srcdir_temp = os.path.join(builddir, 'src_temp')
+    watchbuild = WatchBuild(None, srcpth, None, srcdir_temp, objdir)
+    names = [os.path.basename(f) for f in watchbuild.graph.toposort()]
+    assert names == ['shapes.f90', 'units.f90', 'shapes_impl.f90',
+                     'main.f90'], names
+
+    # a new source file is staged and added to the graph
+    write_source(srcpth, 'new.f90', 'module new\nend module new\n')
+    invalidated = watchbuild.sync([os.path.join(srcpth, 'new.f90')])
+    staged = os.path.join(srcdir_temp, 'new.f90')
+    assert invalidated == [staged], invalidated
+    assert os.path.isfile(staged)
+
+    # the files that include a changed include file are scanned again
+    write_source(srcpth, 'report.inc', '  use units\n  use new\n')
+    invalidated = watchbuild.sync([os.path.join(srcpth, 'report.inc')])
+    assert [os.path.basename(f) for f in invalidated] == ['main.f90']
+    main = os.path.join(srcdir_temp, 'main.f90')
+    assert watchbuild.graph.dependencies[main] == \
+        set([os.path.join(srcdir_temp, f) for f in
+             ['shapes.f90', 'units.f90', 'new.f90']])
+
+    # a removed source file is removed from the graph
+    os.remove(os.path.join(srcpth, 'new.f90'))
+    invalidated = watchbuild.sync([os.path.join(srcpth, 'new.f90')])
+    assert invalidated == [main], invalidated
+    assert not os.path.isfile(staged)
+    assert staged not in watchbuild.graph.srcfiles
+    return
+
+
+def test_watch():
+    setup_sources()
+    result = []
+
+    def run():
+        result.append(pymake.main(srcpth, target, 'gfortran', 'gcc',
+                                  makeclean=False, expedite=True,
+                                  builddir=builddir, watch=1))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    # wait for the first build
+    start = time.time()
+    while not os.path.isfile(target):
+        assert thread.is_alive(), 'first build failed'
+        assert time.time() - start < 120, 'first build did not finish'
+        time.sleep(0.1)
+    mtimes0 = get_mtimes(objdir)
+    assert len(mtimes0) == 4, mtimes0
+
+    # only the invalidated source files are hashed when the target is
+    # rebuilt
+    hashed = []
+    fingerprint = BuildDatabase.fingerprint
+
+    def record(self, srcfile, cmdlist, compiler):
+        hashed.append(os.path.basename(srcfile))
+        return fingerprint(self, srcfile, cmdlist, compiler)
+    BuildDatabase.fingerprint = record
+
+    # change the submodule until the watch loop has rebuilt the target.
+    # The file is written again in case the watch loop was not watching
+    # yet.
+    text = shapes_srcs['shapes_impl.f90'].replace('3.14159', '3.14160')
+    try:
+        while thread.is_alive():
+            assert time.time() - start < 240, 'the target was not rebuilt'
+            write_source(srcpth, 'shapes_impl.f90', text)
+            thread.join(2)
+    finally:
+        BuildDatabase.fingerprint = fingerprint
+    assert result == [0], result
+    assert set(hashed) == set(['shapes_impl.f90']), hashed
+
+    # only the submodule was recompiled
+    mtimes1 = get_mtimes(objdir)
+    changed = set([f for f in mtimes1 if mtimes1[f] != mtimes0[f]])
+    assert changed == set(['shapes_impl.o']), changed
+    assert os.path.isfile(target)
+    return
+
+
+def test_watch_headers():
+    write_sources(srcpth, chello_srcs, dstpth)
+    ctarget = os.path.join(dstpth, 'chello')
+    result = []
+
+    def run():
+        result.append(pymake.main(srcpth, ctarget, 'gfortran', 'gcc',
+                                  makeclean=False, expedite=True,
+                                  builddir=builddir, watch=1))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+    # wait for the first build
+    start = time.time()
+    while not os.path.isfile(ctarget):
+        assert thread.is_alive(), 'first build failed'
+        assert time.time() - start < 120, 'first build did not finish'
+        time.sleep(0.1)
+    mtimes0 = get_mtimes(objdir)
+
+    # the source graph does not know that twice.c includes config.h
+    # through twice.h, but the depfile of twice.c does.  The file is
+    # written again in case the watch loop was not watching yet.
+    while thread.is_alive():
+        assert time.time() - start < 240, 'the target was not rebuilt'
+        write_source(srcpth, 'config.h', '#define FACTOR 3\n')
+        thread.join(2)
+    assert result == [0], result
+
+    # only the translation unit that includes config.h was recompiled
+    mtimes1 = get_mtimes(objdir)
+    changed = set([f for f in mtimes1 if mtimes1[f] != mtimes0[f]])
+    assert changed == set(['twice.o']), changed
+    proc = subprocess.Popen([os.path.abspath(ctarget)],
+                            stdout=subprocess.PIPE)
+    stdout_data, stderr_data = proc.communicate()
+    assert stdout_data.decode().split() == ['6', '3'], stdout_data
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_polling_watcher()
+    test_inotify_watcher()
+    test_sync()
+    test_watch()
+    test_watch_headers()
+    test_teardown()
@@ -0,0 +1,100 @@
+from __future__ import print_function
+import os
+import time
+import shutil
+import subprocess
+import pymake
+from pymake.manifest import TargetManifest
+import helpers
+from helpers import hello_srcs, write_source, write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't028')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+
+
+def build(fflags=None, force=False):
+    helpers.build(srcpth, target, makeclean=True, fflags=fflags,
+                  builddir=builddir, force=force)
+    return os.stat(target).st_mtime
+
+
+def no_process(*args, **kwargs):
+    raise AssertionError('a process was started')
+
+
+def noop_build():
+    # nothing is staged or compiled
+    popen = subprocess.Popen
+    subprocess.Popen = no_process
+    try:
+        t0 = time.time()
+        mtime = build()
+        dt = time.time() - t0
+    finally:
+        subprocess.Popen = popen
+    assert not os.path.isdir(builddir), 'the source files were staged'
+    print('no-op build took {:.3f} s'.format(dt))
+    return mtime
+
+
+def test_noop():
+    write_sources(srcpth, hello_srcs, dstpth)
+    manifest = TargetManifest(target)
+    manifest.remove()
+
+    mtime0 = build()
+    assert not os.path.isdir(builddir)
+    assert noop_build() == mtime0
+
+    # touching a file does not change its hash
+    st = os.stat(os.path.join(srcpth, 'main.f90'))
+    os.utime(os.path.join(srcpth, 'main.f90'),
+             (st.st_atime + 10, st.st_mtime + 10))
+    assert noop_build() == mtime0
+
+    # changed flags, source files, and targets are rebuilt
+    time.sleep(0.01)
+    mtime1 = build('fcheck=all')
+    assert mtime1 != mtime0
+    mtime2 = build()
+    assert mtime2 != mtime1
+    text = hello_srcs['other.f90'].replace('3', '4')
+    write_source(srcpth, 'other.f90', text)
+    mtime3 = build()
+    assert mtime3 != mtime2
+    write_source(srcpth, 'new.txt', 'a file that is staged\n')
+    mtime4 = build()
+    assert mtime4 != mtime3
+    os.remove(target)
+    mtime5 = build()
+    assert noop_build() == mtime5
+
+    # a forced build and a new version of pymake, which may use other
+    # compile flags, rebuild the target
+    time.sleep(0.01)
+    mtime6 = build(force=True)
+    assert mtime6 != mtime5
+    version = pymake.pymake.__version__
+    pymake.pymake.__version__ = version + '.dev0'
+    try:
+        mtime7 = build()
+        assert mtime7 != mtime6
+        assert noop_build() == mtime7
+    finally:
+        pymake.pymake.__version__ = version
+    return
+
+
+def test_teardown():
+    TargetManifest(target).remove()
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_noop()
+    test_teardown()
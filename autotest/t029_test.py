@@ -0,0 +1,87 @@
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import pymake
+from helpers import hello_srcs, write_source, write_sources, get_mtimes
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# set up paths
+dstpth = os.path.join('temp', 't029')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'hello')
+builddir = os.path.join(dstpth, 'build')
+objdir = os.path.join(builddir, 'obj_temp')
+
+
+def build(force=False):
+    # return the modification times of the target and the object files
+    # and the output of the build
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                              makeclean=False, expedite=True,
+                              builddir=builddir, force=force)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    print(output)
+    assert success == 0, 'build failed'
+    assert os.path.isfile(target), 'Target {} does not exist.'.format(target)
+    return os.stat(target).st_mtime, get_mtimes(objdir), output
+
+
+def test_relink():
+    write_sources(srcpth, hello_srcs, dstpth)
+    mtime0, mtimes0, output = build()
+
+    # a comment changes the source file but not the object file, so the
+    # target is not linked again
+    text = hello_srcs['other.f90'] + '! a comment\n'
+    write_source(srcpth, 'other.f90', text)
+    mtime1, mtimes1, output = build()
+    assert mtimes1['other.o'] != mtimes0['other.o']
+    assert mtime1 == mtime0, 'the target was linked again'
+    assert 'the object files did not change' in output
+
+    # a changed object file is reported.  other.o only has a parameter,
+    # so it is the same, but main.o, which uses it, changes.
+    text = hello_srcs['other.f90'].replace('3', '4')
+    write_source(srcpth, 'other.f90', text)
+    mtime2, mtimes2, output = build()
+    assert mtime2 != mtime1, 'the target was not linked again'
+    assert 'relinking because of changes to: main.o\n' in output, output
+
+    # the target is linked again if it was changed
+    f = open(target, 'ab')
+    f.write(b'\0')
+    f.close()
+    mtime3, mtimes3, output = build()
+    assert mtimes3 == mtimes2
+    assert 'relinking because of changes to: target\n' in output, output
+
+    # a forced build compiles and links everything again
+    time.sleep(0.01)
+    mtime4, mtimes4, output = build(force=True)
+    assert mtime4 != mtime3, 'the target was not linked again'
+    for fname in mtimes4:
+        assert mtimes4[fname] != mtimes3[fname], \
+            '{} was not recompiled'.format(fname)
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_relink()
+    test_teardown()
@@ -0,0 +1,75 @@
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import pymake
+from pymake.dag import get_reachable_srcfiles
+from helpers import write_sources
+
+# set up paths
+dstpth = os.path.join('temp', 't030')
+srcpth = os.path.join(dstpth, 'src')
+target = os.path.join(dstpth, 'extern')
+
+# fn is only passed as an argument, blockdat is never referenced, and
+# unused is not reachable
+srcs = {
+    'main.f': '''      PROGRAM MAIN
+      EXTERNAL FN
+      COMMON /CONST/ K
+      CALL SOLVE(FN, K)
+      END
+''',
+    'solve.f': '''      SUBROUTINE SOLVE(F, K)
+      EXTERNAL F
+      INTEGER F, K
+      WRITE(*, '(I4)') F(K)
+      RETURN
+      END
+''',
+    'fn.f': '''      INTEGER FUNCTION FN(I)
+      INTEGER I
+      FN = 2 * I
+      RETURN
+      END
+''',
+    'blockdat.f': '''      BLOCK DATA INIT
+      COMMON /CONST/ K
+      DATA K /21/
+      END
+''',
+    'unused.f': '''      SUBROUTINE UNUSED
+      RETURN
+      END
+''',
+}
+
+
+def test_prune_external_blockdata():
+    write_sources(srcpth, srcs, dstpth)
+
+    srcfiles = pymake.get_ordered_srcfiles(srcpth)
+    names = sorted([os.path.basename(f)
+                    for f in get_reachable_srcfiles(srcfiles)])
+    assert names == ['blockdat.f', 'fn.f', 'main.f', 'solve.f'], names
+
+    success = pymake.main(srcpth, target, 'gfortran', 'gcc',
+                          makeclean=True, prune=True)
+    assert success == 0, 'build failed'
+    proc = subprocess.Popen([os.path.abspath(target)],
+                            stdout=subprocess.PIPE)
+    stdout_data, stderr_data = proc.communicate()
+    # the COMMON block was initialized by the BLOCK DATA unit
+    assert stdout_data.decode().split() == ['42'], stdout_data
+    return
+
+
+def test_teardown():
+    if os.path.isdir(dstpth):
+        shutil.rmtree(dstpth)
+    return
+
+
+if __name__ == '__main__':
+    test_prune_external_blockdata()
+    test_teardown()
@@ -16,14 +16,8 @@ def make_mt3d():
     url = "http://hydro.geo.ua.edu/mt3d/mt3dms_530.exe"
     download_and_unzip(url)
 
-    # Set srcdir and remove unneeded files
+    # Set srcdir
     srcdir = os.path.join('src', 'true-binary')
-    dlist = ['automake.fig', 'mt3dms5b.exe']
-    for d in dlist:
-        dname = os.path.join(srcdir, d)
-        if os.path.isfile(dname):
-            print('Removing ', dname)
-            os.remove(dname)
 
     # Replace the getcl command with getarg
     f1 = open(os.path.join(srcdir, 'mt3dms5.for'), 'r')
@@ -50,7 +44,8 @@ def make_mt3d():
 
     target = 'mt3dms'
     pymake.main(srcdir, target, 'gfortran', 'gcc', makeclean=True,
-                expedite=False, dryrun=False, double=False, debug=False)
+                expedite=False, dryrun=False, double=False, debug=False,
+                prune=True)
 
     # Clean up unneeded folders
     dlist = ['bin', 'doc', 'examples', 'src', 'utility']
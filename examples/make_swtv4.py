@@ -7,8 +7,8 @@ from pymake.download import download_and_unzip
 def make_swtv4():
 
     # To compile SEAWAT on mac or linux:
-    # 1. The starting source folder should not have the parallel and serial folders
-    # 3. The program needs to be compiled in double precision.
+    # 1. Only the source files reachable from the program are compiled
+    # 2. The program needs to be compiled in double precision.
 
     # get current directory
     dstpth = os.path.join('temp')
@@ -25,14 +25,7 @@ def make_swtv4():
     url = "http://water.usgs.gov/ogw/seawat/{0}.zip".format(dirname)
     download_and_unzip(url)
 
-    # Remove the parallel and serial folders from the source directory
     srcdir = os.path.join(dirname, 'source')
-    dlist = ['parallel', 'serial']
-    for d in dlist:
-        dname = os.path.join(srcdir, d)
-        if os.path.isdir(dname):
-            print('Removing ', dname)
-            shutil.rmtree(os.path.join(srcdir, d))
 
     # Replace filespec with standard fortran
     l = '''
@@ -61,7 +54,8 @@ def make_swtv4():
     # make target
     target = 'swtv4'
     pymake.main(srcdir, target, 'gfortran', 'gcc', makeclean=True,
-                expedite=False, dryrun=False, double=True, debug=False)
+                expedite=False, dryrun=False, double=True, debug=False,
+                prune=True)
 
     assert os.path.isfile(target), 'Target does not exist.'
 
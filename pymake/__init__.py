@@ -1,7 +1,11 @@
 # __init__.py
 
-from .pymake import main, parser, get_ordered_srcfiles
-from .dag import order_source_files, order_c_source_files, get_f_nodelist
+from .pymake import main, parser, get_srcfiles, get_ordered_srcfiles, \
+    get_builddir
+from .dag import order_source_files, order_c_source_files, get_f_nodelist, \
+    SourceGraph
+from .batch import build_many
+from .cache import ObjectCache
 from .download import download_and_unzip
 from .visualize import make_plots
 from .autotest import setup, setup_comparison, teardown, \
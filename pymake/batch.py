@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+"""
+Build several targets at the same time.  Each target is downloaded,
+staged, scanned, compiled, and linked in its own thread and the compiler
+and linker processes of all of the targets are limited by one shared pool
+of jobs, so the wall time of a batch approaches the time of the slowest
+target instead of the sum of the times of all of the targets.
+"""
+from __future__ import print_function
+
+import json
+import argparse
+import threading
+import multiprocessing
+
+from .pymake import main
+from .download import download_and_unzip
+
+
+def build_target(spec, jobs, jobserver):
+    """
+    Build the target described by spec, a dictionary with the arguments
+    for pymake.main.  spec may also contain a url that is downloaded and
+    unzipped (into the directory given by download_dir, or the current
+    directory) and a setup function that is called with spec after the
+    download and before the build.  Return the value returned by main.
+
+    """
+    kwargs = dict(spec)
+    url = kwargs.pop('url', None)
+    download_dir = kwargs.pop('download_dir', './')
+    setup = kwargs.pop('setup', None)
+    kwargs.setdefault('fc', 'gfortran')
+    kwargs.setdefault('cc', 'gcc')
+    kwargs.setdefault('jobs', jobs)
+    kwargs['jobserver'] = jobserver
+    if url is not None:
+        download_and_unzip(url, pth=download_dir)
+    if setup is not None:
+        setup(spec)
+    return main(**kwargs)
+
+
+def build_many(specs, jobs=None):
+    """
+    Build several targets at the same time.
+
+    Parameters
+    ----------
+    specs : list of dict
+        target specifications.  Each dictionary contains the arguments for
+        pymake.main (srcdir and target are required; fc and cc default to
+        gfortran and gcc) and, optionally, a url to download before the
+        build, the download_dir to unzip it in, and a setup function that
+        is called with the dictionary before the build.
+    jobs : int
+        maximum number of compiler and linker processes for all of the
+        targets (default is the number of processors)
+
+    Returns
+    -------
+    results : list
+        the value returned by pymake.main for each target (0 if the build
+        was successful).  The result is 1 if the build raised an exception.
+
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobserver = threading.BoundedSemaphore(jobs)
+    results = [1 for spec in specs]
+
+    def build(idx, spec):
+        try:
+            results[idx] = build_target(spec, jobs, jobserver)
+        except Exception as e:
+            print('build_many: {} failed: {}'.format(spec.get('target'), e))
+            results[idx] = 1
+        return
+
+    threads = []
+    for idx, spec in enumerate(specs):
+        t = threading.Thread(target=build, args=(idx, spec))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+    # write a summary
+    print('\nbuild_many summary:')
+    for spec, result in zip(specs, results):
+        status = 'succeeded'
+        if result != 0:
+            status = 'failed'
+        print('  {} {}'.format(spec.get('target'), status))
+    return results
+
+
+def parser():
+    '''
+    Construct the parser and return argument values
+    '''
+    parser = argparse.ArgumentParser(description='''Build several targets
+                                     at the same time using one shared pool
+                                     of compiler jobs.''')
+    parser.add_argument('specfile',
+                        help='''json file with a list of target
+                        specifications.  Each specification is an object
+                        with the arguments for pymake.main and an optional
+                        url and download_dir.''')
+    parser.add_argument('-j', '--jobs',
+                        help='''Maximum number of compiler and linker
+                        processes for all of the targets (default is the
+                        number of processors).''',
+                        default=None, type=int)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    # get the arguments
+    args = parser()
+
+    f = open(args.specfile, 'r')
+    specs = json.load(f)
+    f.close()
+
+    results = build_many(specs, args.jobs)
+    for result in results:
+        if result != 0:
+            raise SystemExit(1)
@@ -0,0 +1,349 @@
+"""
+Persistent build database used to determine which object files are out of
+date.  For each object file the database stores a hash of the source file,
+hashes of the files it includes, the identity of the compiler, and a
+fingerprint of the compile command.  An object file is only rebuilt when
+one of these has changed, so copying the source into src_temp or rewriting
+openspec.inc does not force a rebuild.  For c/c++ source files compiled
+with a depfile (-MMD -MF), the hashes of all of the headers listed in the
+depfile are also stored, so editing a header rebuilds exactly the object
+files that include it, directly or through other headers.  The hashes
+of the object files a target was linked from and a fingerprint of the
+link command are also stored, so that the target is only linked again
+when one of them has changed.
+
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import json
+import zlib
+import hashlib
+
+from .compilers import get_compiler_info
+from .scanner import get_included_files, get_stat_key
+
+# name of the build database file in the object directory
+dbname = 'builddb.json'
+
+
+def hash_file(fpth):
+    """
+    Return the sha1 hash of the contents of a file or None if the file
+    does not exist.
+
+    """
+    try:
+        f = open(fpth, 'rb')
+    except:
+        return None
+    h = hashlib.sha1()
+    while True:
+        data = f.read(65536)
+        if not data:
+            break
+        h.update(data)
+    f.close()
+    return h.hexdigest()
+
+
+def hash_module(fpth):
+    """
+    Return the sha1 hash of the interface in a compiled fortran module
+    file or None if the file does not exist.  gfortran module files are
+    decompressed and the header line, which names the source file and, for
+    older versions of gfortran, the creation date, is ignored.
+
+    """
+    try:
+        f = open(fpth, 'rb')
+    except:
+        return None
+    data = f.read()
+    f.close()
+    if data[:2] == b'\x1f\x8b':
+        try:
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        except:
+            pass
+    if data.startswith(b'GFORTRAN module'):
+        data = data.split(b'\n', 1)[-1]
+    return hashlib.sha1(data).hexdigest()
+
+
+def hash_list(items):
+    """
+    Return the sha1 hash of a list of strings.
+
+    """
+    h = hashlib.sha1()
+    for item in items:
+        h.update(item.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def get_compiler_id(compiler):
+    """
+    Return a string that identifies a compiler executable using its
+    resolved path, size, modification time, and version.
+
+    """
+    info = get_compiler_info(compiler)
+    if info['key'] is None:
+        return compiler
+    return '{}:{}'.format(info['key'], info['version'])
+
+
+def get_target_key(target):
+    """
+    Return the size and modification time of a linked target or None if
+    it does not exist.
+
+    """
+    try:
+        st = os.stat(target)
+    except OSError:
+        return None
+    return [st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime)]
+
+
+def get_depfile(cmdlist):
+    """
+    Return the path of the depfile written by a compile command (the
+    argument after -MF) or None.
+
+    """
+    for i, arg in enumerate(cmdlist[:-1]):
+        if arg == '-MF':
+            return cmdlist[i + 1]
+    return None
+
+
+def read_depfile(fpth):
+    """
+    Return the list of prerequisites, other than the source file, of the
+    first rule in a depfile written by a compiler (-MD or -MMD) or None if
+    the depfile can not be read.
+
+    """
+    try:
+        f = open(fpth, 'r')
+        text = f.read()
+        f.close()
+    except:
+        return None
+    text = re.sub(r'\\\r?\n', ' ', text).split('\n')[0]
+    # the target ends at the first colon followed by white space
+    m = re.search(r':(?:\s|$)', text)
+    if m is None:
+        return None
+    names = [name.replace('\\ ', ' ')
+             for name in re.findall(r'(?:\\ |\S)+', text[m.end():])]
+    return names[1:]
+
+
+class BuildDatabase(object):
+    """
+    Build database stored as a json file.
+
+    Parameters
+    ----------
+    fpth : str
+        path of the json file
+
+    """
+
+    def __init__(self, fpth):
+        self.fpth = fpth
+        self.entries = {}
+        self._pending = {}
+        self._headers = {}
+        if os.path.isfile(fpth):
+            try:
+                f = open(fpth, 'r')
+                self.entries = json.load(f)
+                f.close()
+            except:
+                print('BuildDatabase: could not read {}'.format(fpth))
+                self.entries = {}
+        return
+
+    def fingerprint(self, srcfile, cmdlist, compiler):
+        """
+        Return the fingerprint for an object file built from srcfile with
+        the compile command cmdlist.
+
+        """
+        # include files are keyed by their path relative to srcfile so that
+        # files with the same name in different directories are distinct
+        pth = os.path.dirname(srcfile)
+        includes = {}
+        for fpth in get_included_files(srcfile):
+            includes[os.path.relpath(fpth, pth)] = hash_file(fpth)
+        return {'srcfile': srcfile,
+                'source': hash_file(srcfile),
+                'includes': includes,
+                'compiler': get_compiler_id(compiler),
+                'flags': hash_list(cmdlist)}
+
+    def out_of_date(self, srcfile, objfile, cmdlist, compiler):
+        """
+        Determine if objfile needs to be rebuilt from srcfile.
+
+        """
+        entry = self.fingerprint(srcfile, cmdlist, compiler)
+        self._pending[objfile] = entry
+        if not os.path.isfile(objfile):
+            return True
+        previous = self.entries.get(objfile)
+        if previous is None:
+            return True
+        for key in entry:
+            if previous.get(key) != entry[key]:
+                return True
+        for fpth, h in previous.get('headers', {}).items():
+            if self.hash_header(fpth) != h:
+                return True
+        return False
+
+    def reset(self):
+        """
+        Forget the fingerprints and header hashes computed for the previous
+        build so that the database can be used for another build.
+
+        """
+        self._pending = {}
+        self._headers = {}
+        return
+
+    def hash_header(self, fpth):
+        """
+        Return the hash of a header listed in a depfile.  Each header is
+        only hashed once.
+
+        """
+        h = self._headers.get(fpth)
+        if h is None:
+            h = hash_file(fpth)
+            self._headers[fpth] = h
+        return h
+
+    def update(self, srcfile, objfile, cmdlist, compiler, modules=None):
+        """
+        Record that objfile was successfully built from srcfile.  modules
+        is an optional dictionary with the interface hash of each fortran
+        module compiled from srcfile.  If cmdlist writes a depfile, the
+        hashes of the headers listed in it are recorded.
+
+        """
+        entry = self._pending.pop(objfile, None)
+        if entry is None:
+            entry = self.fingerprint(srcfile, cmdlist, compiler)
+        if modules is not None:
+            entry['modules'] = modules
+        depfile = get_depfile(cmdlist)
+        if depfile is not None:
+            headers = read_depfile(depfile)
+            if headers is not None:
+                entry['headers'] = dict([(fpth, self.hash_header(fpth))
+                                         for fpth in headers])
+        self.entries[objfile] = entry
+        return
+
+    def link_changes(self, target, cmdlist, objfiles):
+        """
+        Return the list of changes since target was linked: the object
+        files in objfiles that were added, removed, or changed, 'link
+        command' if the linker or the link flags or libraries in cmdlist
+        changed, and 'target' if the target was changed or removed.  An
+        empty list means that target does not need to be linked again.
+        An object file is only hashed if its inode, size, or modification
+        time changed.
+
+        """
+        previous = self.entries.get(target)
+        if previous is None:
+            previous = {'objects': {}}
+        objects = {}
+        for objfile in objfiles:
+            key = get_stat_key(objfile)
+            if key is not None:
+                key = list(key)
+            entry = previous['objects'].get(objfile)
+            if entry is not None and key is not None and entry[0] == key:
+                objects[objfile] = entry
+            else:
+                objects[objfile] = [key, hash_file(objfile)]
+        objset = set(objfiles)
+        entry = {'compiler': get_compiler_id(cmdlist[0]),
+                 'flags': hash_list([arg for arg in cmdlist
+                                     if arg not in objset]),
+                 'objects': objects}
+        self._pending[target] = entry
+
+        changes = [objfile for objfile in objfiles
+                   if previous['objects'].get(objfile, [None, None])[1] !=
+                   objects[objfile][1]]
+        changes += sorted(set(previous['objects']) - objset)
+        if previous.get('compiler') != entry['compiler'] or \
+                previous.get('flags') != entry['flags']:
+            changes.append('link command')
+        if previous.get('target') != get_target_key(target):
+            changes.append('target')
+        return changes
+
+    def update_link(self, target, cmdlist, objfiles):
+        """
+        Record that target was successfully linked from objfiles with
+        cmdlist.
+
+        """
+        entry = self._pending.pop(target, None)
+        if entry is None:
+            self.link_changes(target, cmdlist, objfiles)
+            entry = self._pending.pop(target)
+        entry['target'] = get_target_key(target)
+        self.entries[target] = entry
+        return
+
+    def get_modules(self, objfile):
+        """
+        Return the dictionary of module interface hashes recorded for
+        objfile.
+
+        """
+        entry = self.entries.get(objfile)
+        if entry is None:
+            return {}
+        return entry.get('modules', {})
+
+    def remove(self, objfile):
+        """
+        Remove objfile from the build database.
+
+        """
+        self.entries.pop(objfile, None)
+        return
+
+    def write(self):
+        """
+        Write the build database.
+
+        """
+        pth = os.path.dirname(self.fpth)
+        if pth != '' and not os.path.isdir(pth):
+            os.makedirs(pth)
+        tmp = self.fpth + '.tmp'
+        f = open(tmp, 'w')
+        json.dump(self.entries, f, indent=1, sort_keys=True)
+        f.close()
+        try:
+            os.replace(tmp, self.fpth)
+        except AttributeError:
+            if os.path.isfile(self.fpth):
+                os.remove(self.fpth)
+            os.rename(tmp, self.fpth)
+        return
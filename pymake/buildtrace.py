@@ -0,0 +1,178 @@
+"""
+Build tracing.  A BuildTrace records the phases of a build (staging,
+scanning, compiling, linking, and cleaning up) and, for every source file
+that is compiled, the time it was queued, started, and finished, the peak
+memory of the compiler, the return code, and whether the object was found
+in the object cache.  The trace can be written as Chrome trace-event json
+(load it in chrome://tracing or https://ui.perfetto.dev) and as a csv
+summary sorted by compile time.
+
+"""
+
+from __future__ import print_function
+
+import os
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class BuildTrace(object):
+    """
+    Timing information for a build.
+
+    Parameters
+    ----------
+    name : str
+        name of the build (the target)
+
+    """
+
+    def __init__(self, name='pymake'):
+        self.name = name
+        self.t0 = time.time()
+        self.phases = []
+        self.files = {}
+        self._lock = threading.Lock()
+        return
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager that records a build phase.
+
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append({'name': name, 'start': start,
+                                    'end': time.time()})
+
+    def file(self, srcfile):
+        """
+        Return the dictionary with the trace information for srcfile.  The
+        dictionary is filled in by the compile driver and run_command with
+        the times (from time.time) the compile was queued, started, and
+        ended, the peak resident memory of the compiler in kilobytes, the
+        return code, whether the object cache was hit, and the thread that
+        ran the compile.
+
+        """
+        with self._lock:
+            info = self.files.get(srcfile)
+            if info is None:
+                info = {'queued': None, 'start': None, 'end': None,
+                        'maxrss': None, 'returncode': None, 'cache': None,
+                        'thread': None}
+                self.files[srcfile] = info
+        return info
+
+    def _compiled(self):
+        """
+        Return a list of (srcfile, info) for the source files that were
+        compiled or fetched from the object cache.
+
+        """
+        return [(srcfile, self.files[srcfile])
+                for srcfile in sorted(self.files)
+                if self.files[srcfile]['start'] is not None and
+                self.files[srcfile]['end'] is not None]
+
+    def write_chrome(self, fpth):
+        """
+        Write the trace as Chrome trace-event json.
+
+        """
+        t0 = self.t0
+        events = []
+        threads = {}
+        for phase in self.phases:
+            events.append({'name': phase['name'], 'cat': 'phase', 'ph': 'X',
+                           'ts': int((phase['start'] - t0) * 1e6),
+                           'dur': int((phase['end'] - phase['start']) * 1e6),
+                           'pid': 1, 'tid': 0})
+        for srcfile, info in self._compiled():
+            tid = threads.setdefault(info['thread'], len(threads) + 1)
+            args = {'returncode': info['returncode'],
+                    'maxrss_kb': info['maxrss'],
+                    'cache': info['cache']}
+            if info['queued'] is not None:
+                args['queue_s'] = info['start'] - info['queued']
+            events.append({'name': os.path.basename(srcfile),
+                           'cat': 'compile', 'ph': 'X',
+                           'ts': int((info['start'] - t0) * 1e6),
+                           'dur': int((info['end'] - info['start']) * 1e6),
+                           'pid': 1, 'tid': tid, 'args': args})
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': 1,
+                       'args': {'name': self.name}})
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 0,
+                       'args': {'name': 'phases'}})
+        for tid in threads.values():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                           'tid': tid,
+                           'args': {'name': 'job {}'.format(tid)}})
+        f = open(fpth, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f,
+                  indent=1)
+        f.close()
+        return
+
+    def write_csv(self, fpth):
+        """
+        Write a csv summary of the phases and the compiled source files,
+        with the longest compiles first.
+
+        """
+        t0 = self.t0
+        rows = []
+        for phase in self.phases:
+            rows.append(['phase', phase['name'], '', phase['start'] - t0,
+                         phase['end'] - t0, phase['end'] - phase['start'],
+                         '', '', ''])
+        files = []
+        for srcfile, info in self._compiled():
+            queue = ''
+            if info['queued'] is not None:
+                queue = info['start'] - info['queued']
+            files.append(['compile', srcfile, queue, info['start'] - t0,
+                          info['end'] - t0, info['end'] - info['start'],
+                          info['maxrss'], info['returncode'],
+                          info['cache']])
+        files.sort(key=lambda row: -row[5])
+        f = open(fpth, 'w')
+        writer = csv.writer(f)
+        writer.writerow(['category', 'name', 'queue_s', 'start_s', 'end_s',
+                         'duration_s', 'maxrss_kb', 'returncode', 'cache'])
+        for row in rows + files:
+            writer.writerow(row)
+        f.close()
+        return
+
+    def write(self, fpth):
+        """
+        Write the Chrome trace to fpth and the csv summary to fpth with a
+        .csv extension.
+
+        """
+        self.write_chrome(fpth)
+        self.write_csv(os.path.splitext(fpth)[0] + '.csv')
+        print('build trace written to {}'.format(fpth))
+        return
+
+
+@contextmanager
+def phase(trace, name):
+    """
+    Context manager that records a build phase in trace if trace is not
+    None.
+
+    """
+    if trace is None:
+        yield
+    else:
+        with trace.phase(name):
+            yield
@@ -0,0 +1,282 @@
+"""
+Object cache that can be shared by several builds and targets.  Compiled
+object files, and the fortran module files compiled with them, are stored
+in a cache directory under a key computed from the source and include file
+hashes, the compiler identity, the compile flags, and the interface hashes
+of the modules the source file uses.  For c/c++ source files compiled with
+a depfile, the headers listed in the depfile of the last compile are
+stored under that key and the object file is stored under a second key
+that also includes the hashes of those headers, so that editing a header
+that is only included by another header is a cache miss.  The depfile is
+written again when the object file is copied from the cache.  The least
+recently used entries are removed when the cache grows beyond its maximum
+size.
+
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from .builddb import hash_file, hash_module, get_compiler_id, read_depfile
+from .scanner import get_included_files
+from .utils import write_json
+
+# name of the file with the hit and miss statistics in the cache directory
+statsname = 'stats.json'
+
+# name of the file with the headers read by the last compile of a source
+# file that writes a depfile
+headersname = 'headers.json'
+
+
+def write_depfile(fpth, objfile, srcfile, headers):
+    """
+    Write a depfile for objfile, compiled from srcfile, that lists the
+    headers in headers, which are relative to the directory of srcfile.
+
+    """
+    pth = os.path.dirname(srcfile)
+    names = [srcfile] + [os.path.normpath(os.path.join(pth, rel))
+                         for rel in headers]
+    f = open(fpth, 'w')
+    f.write('{}: {}\n'.format(objfile, ' '.join([name.replace(' ', '\\ ')
+                                                 for name in names])))
+    f.close()
+    return
+
+
+class ObjectCache(object):
+    """
+    Cache of compiled object and module files.
+
+    Parameters
+    ----------
+    cachedir : str
+        path of the cache directory.  It is created if it does not exist.
+    maxsize : int
+        maximum size of the cache in megabytes (default is 2048)
+
+    """
+
+    def __init__(self, cachedir, maxsize=2048):
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        return
+
+    def get_key(self, srcfile, objfile, cmdlist, usedmods):
+        """
+        Return the cache key for compiling srcfile with cmdlist.  usedmods
+        is a list of the paths of the module files the source file uses.
+        Paths of the source, object, and module directories are removed
+        from the compile command so that the key is the same for all
+        targets and build directories.
+
+        """
+        h = hashlib.sha1()
+        h.update(get_compiler_id(cmdlist[0]).encode('utf-8'))
+        skip = False
+        for arg in cmdlist[1:]:
+            if skip:
+                skip = False
+                arg = '<dir>'
+            elif arg == srcfile:
+                arg = os.path.basename(srcfile)
+            elif arg == objfile:
+                arg = '<obj>'
+            elif arg in ('-module', '-MF'):
+                skip = True
+            elif arg[:2] in ('-I', '-J'):
+                arg = arg[:2] + '<dir>'
+            h.update(arg.encode('utf-8'))
+            h.update(b'\0')
+        h.update(str(hash_file(srcfile)).encode('utf-8'))
+        pth = os.path.dirname(srcfile)
+        for fpth in get_included_files(srcfile):
+            h.update(os.path.relpath(fpth, pth).encode('utf-8'))
+            h.update(str(hash_file(fpth)).encode('utf-8'))
+        for fpth in sorted(usedmods):
+            h.update(os.path.basename(fpth).encode('utf-8'))
+            h.update(str(hash_module(fpth)).encode('utf-8'))
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.cachedir, key[:2], key)
+
+    def _header_key(self, key, srcfile, headers):
+        """
+        Return the key for the object file compiled from srcfile that read
+        headers, a list of header paths relative to the directory of
+        srcfile, when it was compiled.
+
+        """
+        h = hashlib.sha1(key.encode('utf-8'))
+        pth = os.path.dirname(srcfile)
+        for rel in headers:
+            h.update(rel.encode('utf-8'))
+            h.update(b'\0')
+            h.update(str(hash_file(os.path.join(pth, rel))).encode('utf-8'))
+        return h.hexdigest()
+
+    def fetch(self, key, objfile, moddir, srcfile=None, depfile=None):
+        """
+        Copy the cached object file and module files for key to objfile
+        and moddir.  Return True if key was found in the cache.  If
+        depfile is not None, the object file is only found if the headers
+        srcfile read when it was compiled have not changed, and depfile is
+        written.
+
+        """
+        headers = None
+        if depfile is not None:
+            try:
+                f = open(os.path.join(self._entry(key), headersname), 'r')
+                headers = json.load(f)
+                f.close()
+                key = self._header_key(key, srcfile, headers)
+            except:
+                key = None
+        found = False
+        if key is not None:
+            pth = self._entry(key)
+            found = os.path.isfile(os.path.join(pth, 'manifest.json'))
+        if found:
+            try:
+                f = open(os.path.join(pth, 'manifest.json'), 'r')
+                manifest = json.load(f)
+                f.close()
+                shutil.copyfile(os.path.join(pth, manifest['object']),
+                                objfile)
+                for fname in manifest['modules']:
+                    shutil.copyfile(os.path.join(pth, fname),
+                                    os.path.join(moddir, fname))
+                if headers is not None:
+                    write_depfile(depfile, objfile, srcfile, headers)
+                # mark the entry as recently used
+                os.utime(pth, None)
+            except:
+                found = False
+        with self._lock:
+            if found:
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+        return found
+
+    def store(self, key, objfile, modfiles, srcfile=None, depfile=None):
+        """
+        Store objfile and the existing files in modfiles in the cache
+        under key.  If depfile is not None, the headers it lists are
+        stored under key and objfile is stored under a key that also
+        includes their hashes.
+
+        """
+        if depfile is not None:
+            names = read_depfile(depfile)
+            if names is None:
+                return
+            pth = os.path.dirname(srcfile)
+            headers = [os.path.relpath(name, pth) for name in names]
+            write_json(os.path.join(self._entry(key), headersname), headers)
+            key = self._header_key(key, srcfile, headers)
+        pth = self._entry(key)
+        if os.path.isdir(pth):
+            return
+        tmp = '{}.{}.{}.tmp'.format(pth, os.getpid(),
+                                    threading.current_thread().ident)
+        try:
+            os.makedirs(tmp)
+            manifest = {'object': os.path.basename(objfile), 'modules': []}
+            shutil.copyfile(objfile, os.path.join(tmp, manifest['object']))
+            for fpth in modfiles:
+                if os.path.isfile(fpth):
+                    fname = os.path.basename(fpth)
+                    shutil.copyfile(fpth, os.path.join(tmp, fname))
+                    manifest['modules'].append(fname)
+            f = open(os.path.join(tmp, 'manifest.json'), 'w')
+            json.dump(manifest, f)
+            f.close()
+            os.rename(tmp, pth)
+        except:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        with self._lock:
+            self.stats['stores'] += 1
+        return
+
+    def get_entries(self):
+        """
+        Return a list of (last used time, size in bytes, path) for the
+        entries in the cache.
+
+        """
+        entries = []
+        for d in os.listdir(self.cachedir):
+            dpth = os.path.join(self.cachedir, d)
+            if not os.path.isdir(dpth):
+                continue
+            for key in os.listdir(dpth):
+                pth = os.path.join(dpth, key)
+                if key.endswith('.tmp') or not os.path.isdir(pth):
+                    continue
+                size = 0
+                for fname in os.listdir(pth):
+                    size += os.path.getsize(os.path.join(pth, fname))
+                entries.append((os.path.getmtime(pth), size, pth))
+        return entries
+
+    def cleanup(self):
+        """
+        Remove the least recently used entries until the size of the cache
+        is less than the maximum size.
+
+        """
+        entries = self.get_entries()
+        entries.sort()
+        size = sum([e[1] for e in entries])
+        maxsize = self.maxsize * 1024 * 1024
+        for mtime, esize, pth in entries:
+            if size <= maxsize:
+                break
+            shutil.rmtree(pth, ignore_errors=True)
+            size -= esize
+            self.stats['evictions'] += 1
+        return
+
+    def write_stats(self):
+        """
+        Add the statistics for this build to the statistics stored in the
+        cache directory and print a summary.
+
+        """
+        fpth = os.path.join(self.cachedir, statsname)
+        total = {}
+        try:
+            f = open(fpth, 'r')
+            total = json.load(f)
+            f.close()
+        except:
+            pass
+        for key, value in self.stats.items():
+            total[key] = total.get(key, 0) + value
+        try:
+            f = open(fpth, 'w')
+            json.dump(total, f, indent=1, sort_keys=True)
+            f.close()
+        except:
+            print('ObjectCache: could not write {}'.format(fpth))
+        print('object cache: {} hits, {} misses, '.format(self.stats['hits'],
+                                                         self.stats['misses'])
+              + '{} stored, {} evicted '.format(self.stats['stores'],
+                                               self.stats['evictions'])
+              + '({} total hits, {} total misses)'.format(total['hits'],
+                                                        total['misses']))
+        return
@@ -0,0 +1,362 @@
+"""
+Compiler introspection.  Each compiler is probed once for its version,
+supported command line flags, module file format, module directory
+switch, and predefined preprocessor macros, and the result is cached in
+a user cache directory.  The cache is keyed by the resolved path, size,
+and modification time of the compiler executable, so a build with a
+compiler that has already been probed does not start any probe
+processes.  The version string is stored with the result and is part
+of the compiler identity used by the build database.  The macros that
+depend on the compile flags, such as __OPTIMIZE__ for -O2 or _OPENMP for
+-fopenmp, are probed once for each set of flags and cached with the
+flags in the key.
+
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import zlib
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from .utils import write_json
+
+# version of the stored probe results.  It must be increased when the
+# results of probe_compiler or probe_macros change so that stored results
+# are not used.
+probeversion = 1
+
+# results of the probes in this process
+_compilers = {}
+_lock = threading.Lock()
+
+# option names in compiler help output
+_help_option = re.compile(r'^\s*(-[A-Za-z0-9_][^\s=<\[,]*)')
+
+# macro definitions in preprocessor output
+_define = re.compile(r'^#define[ \t]+([A-Za-z_]\w*)(?:[ \t]+(.*))?$')
+
+# macros probed for a compiler and a set of compile flags in this process
+_macros = {}
+
+# compile flags that can change the predefined macros
+_macro_flags = ('-O', '-f', '-m', '-D', '-U', '-std')
+
+
+def which(program):
+    """
+    Return the full path of an executable on the PATH or None.
+
+    """
+    if os.path.dirname(program):
+        if os.path.isfile(program):
+            return os.path.abspath(program)
+        return None
+    for pth in os.environ.get('PATH', '').split(os.pathsep):
+        fpth = os.path.join(pth.strip('"'), program)
+        if os.path.isfile(fpth) and os.access(fpth, os.X_OK):
+            return fpth
+    return None
+
+
+def get_cachedir():
+    """
+    Return the user cache directory for pymake.  The PYMAKE_CACHE_DIR
+    environment variable can be used to set the directory.
+
+    """
+    pth = os.environ.get('PYMAKE_CACHE_DIR')
+    if pth is not None:
+        return pth
+    if sys.platform == 'win32':
+        pth = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        return os.path.join(pth, 'pymake', 'cache')
+    pth = os.environ.get('XDG_CACHE_HOME',
+                         os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(pth, 'pymake')
+
+
+def _run(cmdlist, cwd=None):
+    """
+    Run a probe command and return the combined stdout and stderr.
+
+    """
+    try:
+        proc = subprocess.Popen(cmdlist, cwd=cwd,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        stdout_data, stderr_data = proc.communicate()
+    except OSError:
+        return ''
+    return stdout_data.decode('ascii', 'replace')
+
+
+def get_moddirflag(family):
+    """
+    Return the switch that sets the module directory for a compiler
+    family.
+
+    """
+    if family == 'gfortran':
+        return '-J'
+    elif family == 'ifort':
+        if sys.platform == 'win32':
+            return '/module:'
+        return '-module'
+    return None
+
+
+def probe_compiler(compiler):
+    """
+    Run the compiler to determine its version, family, supported flags,
+    module file format, module directory switch, and the macros it
+    predefines when it preprocesses a fortran source file.  The macros
+    are None if they could not be determined.
+
+    """
+    text = _run([compiler, '--version'])
+    lines = [line.strip() for line in text.splitlines() if line.strip() != '']
+    version = None
+    if len(lines) > 0:
+        version = lines[0]
+    family = os.path.splitext(os.path.basename(compiler))[0]
+    if version is not None:
+        if 'GNU Fortran' in version:
+            family = 'gfortran'
+        elif 'ifort' in version or 'Intel' in version:
+            family = 'ifort'
+        elif 'clang' in version:
+            family = 'clang'
+        elif 'gcc' in version or 'GCC' in version:
+            family = 'gcc'
+
+    # supported flags
+    flags = []
+    if family == 'gfortran':
+        text = _run([compiler, '--help', '-v'])
+    elif family == 'ifort':
+        text = _run([compiler, '-help'])
+    else:
+        text = ''
+    for line in text.splitlines():
+        m = _help_option.match(line)
+        if m is not None and m.group(1) not in flags:
+            flags.append(m.group(1))
+
+    # module file format
+    modformat = None
+    if family == 'gfortran':
+        pth = tempfile.mkdtemp(prefix='pymake_probe')
+        try:
+            f = open(os.path.join(pth, 'probe.f90'), 'w')
+            f.write('module pymake_probe\nend module pymake_probe\n')
+            f.close()
+            _run([compiler, '-c', 'probe.f90', '-J', '.'], cwd=pth)
+            f = open(os.path.join(pth, 'pymake_probe.mod'), 'rb')
+            data = f.read()
+            f.close()
+            if data[:2] == b'\x1f\x8b':
+                data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+            m = re.match(br"GFORTRAN module version '([^']+)'", data)
+            if m is not None:
+                modformat = 'gfortran-' + m.group(1).decode('ascii')
+        except:
+            pass
+        shutil.rmtree(pth, ignore_errors=True)
+    elif family == 'ifort':
+        modformat = 'ifort'
+
+    # predefined macros, which are only known for gfortran
+    macros = None
+    if family == 'gfortran':
+        macros = probe_macros(compiler)
+
+    return {'version': version,
+            'family': family,
+            'flags': flags,
+            'modformat': modformat,
+            'moddirflag': get_moddirflag(family),
+            'macros': macros}
+
+
+def probe_macros(compiler, flags=None):
+    """
+    Run the compiler to determine the macros it predefines when it
+    preprocesses a fortran source file with the compile flags in flags.
+    None is returned if the macros could not be determined.
+
+    """
+    if flags is None:
+        flags = []
+    macros = None
+    pth = tempfile.mkdtemp(prefix='pymake_probe')
+    try:
+        f = open(os.path.join(pth, 'probe.F90'), 'w')
+        f.write('end\n')
+        f.close()
+        text = _run([compiler, '-cpp', '-dM', '-E'] + flags + ['probe.F90'],
+                    cwd=pth)
+        defined = {}
+        for line in text.splitlines():
+            m = _define.match(line.strip())
+            if m is not None:
+                defined[m.group(1)] = (m.group(2) or '').strip()
+        # a failed probe does not define any macros
+        if len(defined) > 0:
+            macros = defined
+    except:
+        pass
+    shutil.rmtree(pth, ignore_errors=True)
+    return macros
+
+
+def get_compiler_info(compiler):
+    """
+    Return a dictionary with the path, key, version, family, supported
+    flags, module file format, module directory switch, and predefined
+    macros of compiler.
+    The compiler is only probed if it has not been probed before.  If the
+    compiler can not be found, it is not probed and the path, key, and
+    version are None.
+
+    """
+    fpth = which(compiler)
+    if fpth is None:
+        family = os.path.splitext(os.path.basename(compiler))[0]
+        return {'compiler': compiler, 'path': None, 'key': None,
+                'version': None, 'family': family, 'flags': [],
+                'modformat': None, 'moddirflag': get_moddirflag(family),
+                'macros': None}
+    fpth = os.path.realpath(fpth)
+    st = os.stat(fpth)
+    key = '{}:{}:{}'.format(fpth, st.st_size, st.st_mtime)
+
+    with _lock:
+        info = _compilers.get(key)
+        if info is not None:
+            return info
+
+        # look for the result of a previous probe in the user cache
+        h = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        cachefile = os.path.join(get_cachedir(), 'compilers', h + '.json')
+        try:
+            f = open(cachefile, 'r')
+            info = json.load(f)
+            f.close()
+            if info.get('probeversion') != probeversion or \
+                    info.get('key') != key:
+                info = None
+        except:
+            info = None
+
+        if info is None:
+            info = probe_compiler(fpth)
+            info['compiler'] = compiler
+            info['path'] = fpth
+            info['key'] = key
+            info['probeversion'] = probeversion
+            write_json(cachefile, info)
+
+        _compilers[key] = info
+    return info
+
+
+def get_flag_macros(info, flags):
+    """
+    Return the macros predefined by the compiler described by info, a
+    dictionary returned by get_compiler_info, when it preprocesses a
+    fortran source file with the optimization, code generation, -D, -U,
+    and -std flags in flags, or None if they could not be determined.  The
+    macros are only probed once for each compiler and set of flags, and
+    the result is cached in the user cache directory.
+
+    """
+    flags = [flag for flag in flags if flag.startswith(_macro_flags)]
+    if len(flags) == 0 or info['key'] is None:
+        return info['macros']
+    key = '{}:{}'.format(info['key'], ' '.join(flags))
+    with _lock:
+        if key in _macros:
+            return _macros[key]
+
+        # look for the result of a previous probe in the user cache
+        h = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        cachefile = os.path.join(get_cachedir(), 'compilers', 'macros',
+                                 h + '.json')
+        try:
+            f = open(cachefile, 'r')
+            entry = json.load(f)
+            f.close()
+            if entry.get('probeversion') != probeversion or \
+                    entry.get('key') != key:
+                entry = None
+        except:
+            entry = None
+
+        if entry is None:
+            entry = {'probeversion': probeversion, 'key': key,
+                     'macros': probe_macros(info['path'], flags)}
+            write_json(cachefile, entry)
+
+        _macros[key] = entry['macros']
+    return entry['macros']
+
+
+class Defines(dict):
+    """
+    Dictionary of macro names and values.  cpp is True if the macros were
+    determined for flags that include -cpp or -fpp, which preprocess every
+    fortran source file, not only the files with an upper case extension.
+
+    """
+    cpp = False
+
+
+def get_defines(compiler, flags=None):
+    """
+    Return a dictionary (Defines) with the names and values of the macros
+    defined when compiler preprocesses a fortran source file with the
+    command line flags in flags: the macros predefined by the compiler and
+    the macros set by -D flags, without the macros removed by -U flags.
+    The predefined macros are probed with the flags that can change them
+    (see get_flag_macros).  None is returned if the predefined macros are
+    not known, for example for compilers other than gfortran or if the
+    compiler can not be found, so that every branch of the cpp
+    conditionals is scanned.
+
+    """
+    info = get_compiler_info(compiler)
+    macros = info.get('macros')
+    if macros is None:
+        return None
+    if flags is not None:
+        macros = get_flag_macros(info, flags) or macros
+    defines = Defines(macros)
+    if flags is not None:
+        defines.cpp = '-cpp' in flags or '-fpp' in flags
+        for flag in flags:
+            if flag.startswith('-D') and len(flag) > 2:
+                name, sep, value = flag[2:].partition('=')
+                if not sep:
+                    value = '1'
+                defines[name] = value
+            elif flag.startswith('-U') and len(flag) > 2:
+                defines.pop(flag[2:], None)
+    return defines
+
+
+def flag_available(flag, compiler='gfortran'):
+    """
+    Determine if a specified flag exists
+
+    """
+    info = get_compiler_info(compiler)
+    name = re.split(r'[=<\[]', flag)[0]
+    return name in info['flags']
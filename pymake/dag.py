@@ -2,7 +2,7 @@
 
 Set of classes for building a directed acyclic graph.  Can be used to
 determine the order of dependencies.  Can be used to determine compiling
-order, for example.  Topological sort pseudocode based on:
+order, for example.  Topological sort (Kahn's algorithm) based on:
 http://en.wikipedia.org/wiki/Topological_sorting
 
 """
@@ -18,12 +18,19 @@ __status__ = "Production"
 
 import re
 import os
+from collections import deque
+
+from .scanner import scan_files, scan_file, scan_data, is_c_file, get_uses
 
 
 class Node(object):
+    __slots__ = ('name', 'dependencies', 'modules', 'submodules')
+
     def __init__(self, name):
         self.name = name
         self.dependencies = []
+        self.modules = []
+        self.submodules = []
         return
 
     def add_dependency(self, d):
@@ -36,45 +43,261 @@ class Node(object):
 
 
 class DirectedAcyclicGraph(object):
+    """
+    Directed acyclic graph of a list of nodes.  The nodes are numbered in
+    the order of nodelist and the graph is stored as the number of
+    dependencies (in-degree) of each node and the list of dependents of
+    each node, so the nodes and their dependencies are not changed by
+    sorting.  Dependencies that are not in nodelist are ignored.
+    """
     def __init__(self, nodelist):
         self.nodelist = nodelist
+        self.index = {}
+        for i, n in enumerate(nodelist):
+            self.index[n] = i
+        self.indegree = [0] * len(nodelist)
+        self.dependents = [[] for n in nodelist]
+        for i, n in enumerate(nodelist):
+            deps = set()
+            for m in n.dependencies:
+                j = self.index.get(m)
+                if j is None or j == i or j in deps:
+                    continue
+                deps.add(j)
+                self.indegree[i] += 1
+                self.dependents[j].append(i)
+        self._order = None
+        self._reach = None
         return
 
-    def toposort(self):
+    def toposort_indices(self):
         """
-        Perform topological sort
+        Return the indices of the nodes in dependency order.  Nodes are
+        ordered by when they become ready and nodes that become ready at
+        the same time keep the order of nodelist, so the order is the same
+        every time.
         """
-        l = []  # empty list that will contain sorted elements
-
-        # build a list of nodes with no dependencies
-        s = set([])
-        for n in self.nodelist:
-            if len(n.dependencies) == 0:
-                s.add(n)
-        if len(s) == 0:
+        indegree = list(self.indegree)
+        ready = deque([i for i, d in enumerate(indegree) if d == 0])
+        if len(ready) == 0 and len(self.nodelist) > 0:
             for n in self.nodelist:
                 print(n.name, [nn.name for nn in n.dependencies])
             raise Exception('All nodes have dependencies')
 
         # build up the list
-        while len(s) > 0:
-            n = s.pop()
-            l.append(n)
-            for m in self.nodelist:
-                if n in m.dependencies:
-                    m.dependencies.remove(n)
-                    if len(m.dependencies) == 0:
-                        s.add(m)
+        l = []
+        while len(ready) > 0:
+            i = ready.popleft()
+            l.append(i)
+            for j in self.dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    ready.append(j)
 
         # check to make sure no remaining dependencies
-        for n in l:
-            if len(n.dependencies) > 0:
-                raise Exception('Graph has at least one cycle')
+        if len(l) < len(self.nodelist):
+            names = [self.nodelist[i].name
+                     for i, d in enumerate(indegree) if d > 0]
+            raise Exception('Graph has at least one cycle: ' +
+                            ', '.join(names))
 
         return l
 
+    def toposort(self):
+        """
+        Perform topological sort and return the list of nodes in
+        dependency order.  The graph is not changed.
+        """
+        return [self.nodelist[i] for i in self.toposort_indices()]
+
+    def get_dependents(self, node):
+        """
+        Return the list of nodes that depend directly on node.
+        """
+        return [self.nodelist[j] for j in self.dependents[self.index[node]]]
+
+    def _get_reach(self):
+        """
+        Return the list with the bitset (an integer with bit j set for
+        node j) of each node and the nodes that depend on it, directly or
+        indirectly.  The bitsets are computed once, in reverse dependency
+        order, and kept for later queries.
+        """
+        if self._reach is None:
+            self._order = self.toposort_indices()
+            self._position = [0] * len(self.nodelist)
+            for k, i in enumerate(self._order):
+                self._position[i] = k
+            reach = [0] * len(self.nodelist)
+            for i in reversed(self._order):
+                bits = 1 << i
+                for j in self.dependents[i]:
+                    bits |= reach[j]
+                reach[i] = bits
+            self._reach = reach
+        return self._reach
+
+    def get_rebuild_set(self, nodes):
+        """
+        Return the list of nodes, in dependency order, that must be
+        rebuilt if the nodes in nodes change: the nodes and all of the
+        nodes that depend on them, directly or indirectly.
+        """
+        reach = self._get_reach()
+        bits = 0
+        for node in nodes:
+            bits |= reach[self.index[node]]
+        indices = []
+        while bits:
+            low = bits & -bits
+            indices.append(low.bit_length() - 1)
+            bits ^= low
+        indices.sort(key=self._position.__getitem__)
+        return [self.nodelist[i] for i in indices]
+
+    def levels(self):
+        """
+        Return the list of levels (waves) of the graph.  Each level is the
+        list of nodes whose dependencies are all in earlier levels, so the
+        nodes in a level can be built at the same time once the earlier
+        levels are built.
+        """
+        level = [0] * len(self.nodelist)
+        for i in self.toposort_indices():
+            for j in self.dependents[i]:
+                if level[j] < level[i] + 1:
+                    level[j] = level[i] + 1
+        levels = []
+        if len(level) > 0:
+            levels = [[] for k in range(max(level) + 1)]
+        for i, n in enumerate(self.nodelist):
+            levels[level[i]].append(n)
+        return levels
+
+    def widths(self):
+        """
+        Return the number of nodes in each level.  The largest width is
+        the largest number of nodes that can be built at the same time.
+        """
+        return [len(l) for l in self.levels()]
+
+    def critical_path(self, weights=None):
+        """
+        Return the length and the list of nodes of the longest path
+        through the graph.  weights is an optional dictionary with the
+        weight (for example, the compile time) of each node name and the
+        weight of a node that is not in weights is 1.  Without weights the
+        length is the number of levels.
+        """
+        if weights is None:
+            weights = {}
+        length = [0] * len(self.nodelist)
+        previous = [None] * len(self.nodelist)
+        end = None
+        for i in self.toposort_indices():
+            length[i] += weights.get(self.nodelist[i].name, 1)
+            if end is None or length[i] > length[end]:
+                end = i
+            for j in self.dependents[i]:
+                if previous[j] is None or length[i] > length[j]:
+                    length[j] = length[i]
+                    previous[j] = i
+        if end is None:
+            return 0, []
+        path = []
+        i = end
+        while i is not None:
+            path.append(self.nodelist[i])
+            i = previous[i]
+        path.reverse()
+        return length[end], path
+
+    def summary(self, weights=None):
+        """
+        Return a dictionary with the number of nodes, the number of
+        levels, the width of each level, the largest width, and the
+        critical path length of the graph.
+        """
+        widths = self.widths()
+        length, path = self.critical_path(weights)
+        return {'nodes': len(self.nodelist),
+                'levels': len(widths),
+                'widths': widths,
+                'max_width': max(widths + [0]),
+                'critical_path': length}
+
+    def ready_set(self):
+        """
+        Return a ReadySet for the graph.
+        """
+        return ReadySet(self)
+
+
+class ReadySet(object):
+    """
+    Nodes of a DirectedAcyclicGraph that are ready to be built.  get_ready
+    returns the nodes whose dependencies are all done and that have not
+    been returned before, and done is called with each node once it is
+    built.  Iterating over a ReadySet returns the ready nodes one at a time
+    and stops when no nodes are ready, so a serial driver can call done for
+    each node it is given and a parallel driver can call get_ready again
+    after each done while is_active is True.
+
+    Parameters
+    ----------
+    dag : DirectedAcyclicGraph
+        the graph
+
+    """
+    def __init__(self, dag):
+        self.dag = dag
+        self.indegree = list(dag.indegree)
+        self.ready = deque([i for i, d in enumerate(self.indegree) if d == 0])
+        self.ndone = 0
+        self.nout = 0
+        return
+
+    def get_ready(self):
+        """
+        Return the list of nodes that became ready since the last call.
+        """
+        nodes = [self.dag.nodelist[i] for i in self.ready]
+        self.nout += len(self.ready)
+        self.ready.clear()
+        return nodes
+
+    def done(self, node):
+        """
+        Mark node as built and make the nodes that depend on it ready if
+        all of their dependencies are done.
+        """
+        self.ndone += 1
+        for j in self.dag.dependents[self.dag.index[node]]:
+            self.indegree[j] -= 1
+            if self.indegree[j] == 0:
+                self.ready.append(j)
+        return
 
-def get_f_nodelist(srcfiles):
+    def is_active(self):
+        """
+        Return True if nodes are ready or if nodes that were returned by
+        get_ready are not done.
+        """
+        return len(self.ready) > 0 or self.nout > self.ndone
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if len(self.ready) == 0:
+            raise StopIteration
+        self.nout += 1
+        return self.dag.nodelist[self.ready.popleft()]
+
+    next = __next__
+
+
+def get_f_nodelist(srcfiles, defines=None):
     # create a dictionary that has module name and source file name
     # create a dictionary that has a list of modules used within each source
     # create a list of Nodes for later ordering
@@ -83,35 +306,26 @@ def get_f_nodelist(srcfiles):
     sourcefile_module_dict = {}
     nodelist = []
     nodedict = {}
+    # evaluate cpp conditionals with defines
+    index = scan_files(srcfiles, defines=defines)
     for srcfile in srcfiles:
         node = Node(srcfile)
         nodelist.append(node)
         nodedict[srcfile] = node
-        try:
-            f = open(srcfile, 'rb')
-        except:
-            print('get_f_nodelist: could not open {}'.format(os.path.basename(srcfile)))
-            sourcefile_module_dict[srcfile] = []
-            continue
-        lines = f.read()
-        lines = lines.decode('ascii', 'replace').splitlines()
-        # develop a list of modules in the file
-        modulelist = []  # list of modules used by this source file
-        for idx, line in enumerate(lines):
-            linelist = line.strip().split()
-            if len(linelist) == 0:
-                continue
-            if linelist[0].upper() == 'MODULE':
-                modulename = linelist[1].upper()
-                module_dict[modulename] = srcfile
-            if linelist[0].upper() == 'USE':
-                modulename = linelist[1].split(',')[0].upper()
-                if modulename not in modulelist:
-                    modulelist.append(modulename)
-        # update the dictionary if any entries have been found
-        sourcefile_module_dict[srcfile] = modulelist
-        # close the src file
-        f.close()
+        info = index[srcfile]
+        # modules defined in the file
+        for modulename in info['modules']:
+            module_dict[modulename] = srcfile
+            node.modules.append(modulename)
+        # submodules defined in the file
+        for submodulename in info['submodules']:
+            module_dict[submodulename] = srcfile
+            node.submodules.append(submodulename)
+        # modules used by this source file and the files it includes and
+        # the modules and submodules its submodules extend
+        sourcefile_module_dict[srcfile] = get_uses(srcfile, info,
+                                                   defines) + \
+                                          info['parents']
 
 
     # go through and add the dependencies to each node
@@ -139,11 +353,13 @@ def get_dag(nodelist):
     return dag
 
 
-def order_source_files(srcfiles):
+def order_source_files(srcfiles, defines=None):
     """
-    Use a dag and a nodelist to order the fortran source files
+    Use a dag and a nodelist to order the fortran source files.  If
+    defines, a dictionary of macro names and values, is not None, it is
+    used to evaluate the cpp conditionals in the source files.
     """
-    nodelist = get_f_nodelist(srcfiles)
+    nodelist = get_f_nodelist(srcfiles, defines)
     dag = get_dag(nodelist)
     orderednodes = dag.toposort()
     osrcfiles = []
@@ -152,7 +368,7 @@ def order_source_files(srcfiles):
     return osrcfiles
 
 
-def order_c_source_files(srcfiles):
+def get_c_nodelist(srcfiles):
     # create a dictionary that has module name and source file name
     # create a dictionary that has a list of modules used within each source
     # create a list of Nodes for later ordering
@@ -161,38 +377,25 @@ def order_c_source_files(srcfiles):
     sourcefile_module_dict = {}
     nodelist = []
     nodedict = {}
+    index = scan_files(srcfiles)
     for srcfile in srcfiles:
         node = Node(srcfile)
         nodelist.append(node)
         nodedict[srcfile] = node
-        try:
-            f = open(srcfile, 'rb')
-        except:
-            print('order_c_source_files: could not open {}'.format(os.path.basename(srcfile)))
-            sourcefile_module_dict[srcfile] = []
-            continue
-        lines = f.read()
-        lines = lines.decode('ascii', 'replace').splitlines()
-        # develop a list of modules in the file
-        modulelist = []  # list of modules used by this source file
-        for idx, line in enumerate(lines):
-            linelist = line.strip().split()
-            if len(linelist) == 0:
-                continue
-            if linelist[0].upper() == '#INCLUDE':
-                modulename = linelist[1].replace('"', '').replace("'", "").replace('<', '').replace('>', '').upper()
-                # add source file for this c(pp) file if it is the same
-                # as the include file without the extension
-                bn = os.path.basename(srcfile)
-                if os.path.splitext(modulename)[0] == os.path.splitext(bn)[0].upper():
-                    module_dict[modulename] = srcfile
-                # add include file name
-                if modulename not in modulelist:
-                    modulelist.append(modulename)
-        # update the dictionary if any entries have been found
+        info = index[srcfile]
+        # develop a list of the files included by this source file
+        modulelist = []
+        bn = os.path.splitext(os.path.basename(srcfile))[0].upper()
+        for modulename in info['includes'] + info['sysincludes']:
+            modulename = modulename.upper()
+            # add source file for this c(pp) file if it is the same
+            # as the include file without the extension
+            if os.path.splitext(modulename)[0] == bn:
+                module_dict[modulename] = srcfile
+            # add include file name
+            if modulename not in modulelist:
+                modulelist.append(modulename)
         sourcefile_module_dict[srcfile] = modulelist
-        # close the src file
-        f.close()
 
 
     # go through and add the dependencies to each node
@@ -207,8 +410,16 @@ def order_c_source_files(srcfiles):
                         # print 'adding dependency: ', srcfile, mlocation
                         node.add_dependency(nodedict[mlocation])
         except:
-            print('order_c_source_files: {} key does not exist'.format(srcfile))
+            print('get_c_nodelist: {} key does not exist'.format(srcfile))
+
+    return nodelist
 
+
+def order_c_source_files(srcfiles):
+    """
+    Use a dag and a nodelist to order the c/c++ source files
+    """
+    nodelist = get_c_nodelist(srcfiles)
     dag = get_dag(nodelist)
     orderednodes = dag.toposort()
     osrcfiles = []
@@ -217,6 +428,349 @@ def order_c_source_files(srcfiles):
     return osrcfiles
 
 
+def get_source_nodelist(srcfiles, defines=None):
+    """
+    Create a nodelist for a list of fortran and c/c++ source files.
+    Fortran files depend on the files that provide the modules they use
+    and c/c++ files depend on the files that provide the headers they
+    include.  If defines, a dictionary of macro names and values, is not
+    None, it is used to evaluate the cpp conditionals in the fortran
+    source files.
+    """
+    ffiles = []
+    cfiles = []
+    for srcfile in srcfiles:
+        if is_c_file(srcfile):
+            cfiles.append(srcfile)
+        else:
+            ffiles.append(srcfile)
+    nodelist = []
+    if len(ffiles) > 0:
+        nodelist += get_f_nodelist(ffiles, defines)
+    if len(cfiles) > 0:
+        nodelist += get_c_nodelist(cfiles)
+    return nodelist
+
+
+def get_reachable_srcfiles(srcfiles, program=None, defines=None):
+    """
+    Return the source files, in the order of srcfiles, that are reachable
+    from the fortran PROGRAM units by following the modules each file
+    uses, the submodules of those modules, and the subroutines and
+    functions each file references, including the procedures that are
+    declared EXTERNAL or passed as arguments.  If program is not None,
+    only the PROGRAM unit with that name is used.  c/c++ source files and
+    the files that define BLOCK DATA units, which are never referenced by
+    name but initialize COMMON blocks, are always kept.  srcfiles is
+    returned if there is no PROGRAM unit.  If defines, a dictionary of
+    macro names and values, is not None, it is used to evaluate the cpp
+    conditionals in the source files.  A warning that lists the files is
+    printed for each referenced name that is defined in more than one
+    reachable file, such as serial and parallel versions of a procedure,
+    because the files can not be linked together.
+    """
+    index = scan_files(srcfiles, defines=defines)
+    module_dict = {}
+    submodule_dict = {}
+    procedure_dict = {}
+    start = []
+    for srcfile in srcfiles:
+        info = index[srcfile]
+        for modulename in info['modules']:
+            module_dict[modulename] = srcfile
+        for submodulename in info['submodules']:
+            module_dict[submodulename] = srcfile
+            # the procedures of a module can be implemented in its
+            # submodules
+            ancestor = submodulename.split('@')[0]
+            submodule_dict.setdefault(ancestor, []).append(srcfile)
+        for name in info['procedures']:
+            procedure_dict.setdefault(name, []).append(srcfile)
+        if program is None:
+            if len(info['programs']) > 0:
+                start.append(srcfile)
+        elif program.upper() in info['programs']:
+            start.append(srcfile)
+    if len(start) == 0:
+        if program is not None:
+            raise Exception('PROGRAM {} was not found'.format(program))
+        print('get_reachable_srcfiles: no PROGRAM unit was found')
+        return srcfiles
+
+    # walk the use and reference edges from the programs and the block
+    # data units
+    start += [srcfile for srcfile in srcfiles
+              if index[srcfile].get('blockdata') and srcfile not in start]
+    reachable = set(start)
+    stack = list(start)
+    while len(stack) > 0:
+        srcfile = stack.pop()
+        info = index[srcfile]
+        found = []
+        for modulename in get_uses(srcfile, info, defines) + \
+                info['parents']:
+            if modulename in module_dict:
+                found.append(module_dict[modulename])
+        for modulename in info['modules']:
+            found += submodule_dict.get(modulename, [])
+        for name in info['references']:
+            found += procedure_dict.get(name, [])
+        for srcfile in found:
+            if srcfile not in reachable:
+                reachable.add(srcfile)
+                stack.append(srcfile)
+    reachable = [srcfile for srcfile in srcfiles
+                 if srcfile in reachable or is_c_file(srcfile)]
+
+    # all of the files that define a referenced name are kept, so the
+    # user has to choose between alternate versions
+    references = set()
+    for srcfile in reachable:
+        references.update(index[srcfile]['references'])
+    for name in sorted(references):
+        fpths = [srcfile for srcfile in procedure_dict.get(name, [])
+                 if srcfile in reachable]
+        if len(fpths) > 1:
+            print('Warning: {} is defined in more than one '.format(name) +
+                  'source file: ' + ', '.join(fpths))
+    return reachable
+
+
+class SourceGraph(object):
+    """
+    Mutable dependency graph of fortran and c/c++ source files for long
+    lived processes, such as a watch loop or a build server.  Files are
+    added, removed, and updated one at a time.  Only the file that changed
+    is scanned and only the edges of the files that use the modules or
+    headers it provides are changed.  Each change returns the list of
+    files that are invalidated (the file and the files that depend on it,
+    directly or indirectly) in dependency order.
+
+    Dependencies are resolved in the same way as get_f_nodelist and
+    get_c_nodelist: a fortran file depends on the files that define the
+    modules it uses and the modules and submodules its submodules extend
+    and a c/c++ file depends on the c/c++ file with the
+    same name as a header it includes.
+
+    Parameters
+    ----------
+    srcfiles : list of str
+        source files to add to the graph
+    defines : dict
+        macro names and values used to evaluate the cpp conditionals in
+        the source files (optional)
+
+    """
+    def __init__(self, srcfiles=None, defines=None):
+        self.defines = defines
+        self.facts = {}
+        self.position = {}
+        self.providers = {}
+        self.users = {}
+        self.dependencies = {}
+        self.dependents = {}
+        self._count = 0
+        if srcfiles is not None:
+            scan_files(srcfiles, defines=defines)
+            for srcfile in srcfiles:
+                self.add_file(srcfile)
+        return
+
+    @property
+    def srcfiles(self):
+        """
+        The source files in the order they were added.
+        """
+        return sorted(self.position, key=self.position.get)
+
+    def _provides(self, srcfile, info):
+        if is_c_file(srcfile):
+            bn = os.path.splitext(os.path.basename(srcfile))[0].upper()
+            return [('c', name.upper())
+                    for name in info['includes'] + info['sysincludes']
+                    if os.path.splitext(name.upper())[0] == bn]
+        return [('f', name) for name in info['modules'] + info['submodules']]
+
+    def _requires(self, srcfile, info):
+        if is_c_file(srcfile):
+            return [('c', name.upper())
+                    for name in info['includes'] + info['sysincludes']]
+        return [('f', name)
+                for name in get_uses(srcfile, info, self.defines) +
+                info['parents']]
+
+    def _link(self, srcfile):
+        """
+        Set the dependencies of srcfile from the providers of the modules
+        or headers it requires.
+        """
+        deps = set()
+        for key in self._requires(srcfile, self.facts[srcfile]):
+            providers = self.providers.get(key)
+            if providers:
+                provider = providers[-1]
+                if provider != srcfile:
+                    deps.add(provider)
+        for dep in self.dependencies.get(srcfile, set()) - deps:
+            self.dependents[dep].discard(srcfile)
+        for dep in deps:
+            self.dependents[dep].add(srcfile)
+        self.dependencies[srcfile] = deps
+        return
+
+    def _affected(self, srcfile):
+        """
+        Return the files that require a module or header srcfile provides.
+        """
+        affected = set()
+        for key in self._provides(srcfile, self.facts[srcfile]):
+            affected |= self.users.get(key, set())
+        affected.discard(srcfile)
+        return affected
+
+    def downstream(self, srcfiles):
+        """
+        Return the set of files that depend, directly or indirectly, on
+        any of the files in srcfiles.
+        """
+        found = set()
+        stack = list(srcfiles)
+        while len(stack) > 0:
+            srcfile = stack.pop()
+            for dependent in self.dependents.get(srcfile, ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return found
+
+    def order(self, srcfiles):
+        """
+        Return the files in srcfiles, which must be in the graph, in
+        dependency order.
+        """
+        subset = set(srcfiles)
+        indegree = {}
+        for srcfile in subset:
+            indegree[srcfile] = len(self.dependencies[srcfile] & subset)
+        ready = deque(sorted([f for f in subset if indegree[f] == 0],
+                             key=self.position.get))
+        l = []
+        while len(ready) > 0:
+            srcfile = ready.popleft()
+            l.append(srcfile)
+            for dependent in sorted(self.dependents[srcfile] & subset,
+                                    key=self.position.get):
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    ready.append(dependent)
+        if len(l) < len(subset):
+            raise Exception('Graph has at least one cycle: ' +
+                            ', '.join(sorted(subset - set(l))))
+        return l
+
+    def add_file(self, srcfile):
+        """
+        Scan srcfile and add it to the graph.  If srcfile is already in
+        the graph, it is updated.  Return the invalidated files in
+        dependency order.
+        """
+        if srcfile in self.facts:
+            return self.update_file(srcfile)
+        info = scan_file(srcfile, self.defines)
+        if info is None:
+            print('SourceGraph: could not open ' +
+                  '{}'.format(os.path.basename(srcfile)))
+            info = scan_data(b'')
+        self.facts[srcfile] = info
+        self.position[srcfile] = self._count
+        self._count += 1
+        self.dependents[srcfile] = set()
+        for key in self._provides(srcfile, info):
+            self.providers.setdefault(key, []).append(srcfile)
+        for key in self._requires(srcfile, info):
+            self.users.setdefault(key, set()).add(srcfile)
+        self._link(srcfile)
+        for user in self._affected(srcfile):
+            self._link(user)
+        return self.order(set([srcfile]) | self.downstream([srcfile]))
+
+    def remove_file(self, srcfile):
+        """
+        Remove srcfile from the graph.  Return the files that depended on
+        it, directly or indirectly, in dependency order.
+        """
+        if srcfile not in self.facts:
+            return []
+        invalidated = self.downstream([srcfile])
+        info = self.facts[srcfile]
+        affected = self._affected(srcfile)
+        for key in self._provides(srcfile, info):
+            self.providers[key].remove(srcfile)
+            if len(self.providers[key]) == 0:
+                del self.providers[key]
+        # the modules used in include files may have changed since
+        # srcfile was added
+        for key in list(self.users):
+            self.users[key].discard(srcfile)
+            if len(self.users[key]) == 0:
+                del self.users[key]
+        for dep in self.dependencies.pop(srcfile):
+            self.dependents[dep].discard(srcfile)
+        for dependent in self.dependents.pop(srcfile):
+            self.dependencies[dependent].discard(srcfile)
+        del self.facts[srcfile]
+        del self.position[srcfile]
+        for user in affected:
+            self._link(user)
+        invalidated.discard(srcfile)
+        invalidated |= self.downstream(affected) | affected
+        return self.order(invalidated)
+
+    def update_file(self, srcfile):
+        """
+        Scan srcfile again and update its edges and the edges of the
+        files that use the modules or headers it provides.  Return the
+        invalidated files in dependency order.
+        """
+        if srcfile not in self.facts:
+            return self.add_file(srcfile)
+        position = self.position[srcfile]
+        invalidated = set(self.remove_file(srcfile))
+        invalidated |= set(self.add_file(srcfile))
+        self.position[srcfile] = position
+        return self.order(invalidated & set(self.facts))
+
+    def get_nodelist(self):
+        """
+        Return a list of Nodes for the graph in the order the files were
+        added.
+        """
+        nodes = {}
+        nodelist = []
+        for srcfile in self.srcfiles:
+            node = Node(srcfile)
+            for key in self._provides(srcfile, self.facts[srcfile]):
+                if key[0] != 'f':
+                    continue
+                if '@' in key[1]:
+                    node.submodules.append(key[1])
+                else:
+                    node.modules.append(key[1])
+            nodes[srcfile] = node
+            nodelist.append(node)
+        for node in nodelist:
+            for dep in sorted(self.dependencies[node.name],
+                              key=self.position.get):
+                node.add_dependency(nodes[dep])
+        return nodelist
+
+    def toposort(self):
+        """
+        Return all of the files in dependency order.
+        """
+        return self.order(self.facts)
+
+
 if __name__ == '__main__':
     a = Node('a')
     b = Node('b')
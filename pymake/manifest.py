@@ -0,0 +1,188 @@
+"""
+Target manifests.  After a target is built, a manifest with the hash of
+every file in its source directories, the identity of the compilers, the
+arguments that change how the target is built, the version of pymake,
+which determines the compile and link flags, and the size and
+modification time of the target is stored in the user cache directory.
+If the same target is requested again, the source directories are walked
+and only the files whose inode, size, or modification time changed are
+hashed.  If nothing changed and the target has not been replaced or
+removed, the build is a no-op and pymake returns without staging the
+source files or starting any processes.
+
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import hashlib
+
+from .builddb import hash_file, hash_list, get_compiler_id, \
+    get_target_key
+from .compilers import get_cachedir
+from .utils import write_json
+from .scanner import get_stat_key
+
+# version of the manifest format
+manifestversion = 1
+
+
+def get_manifest_file(target):
+    """
+    Return the path of the manifest of target in the user cache
+    directory.
+
+    """
+    h = hashlib.sha1(os.path.abspath(target).encode('utf-8')).hexdigest()
+    return os.path.join(get_cachedir(), 'manifests', h + '.json')
+
+
+def get_request(srcdir, fc, cc, double=False, debug=False,
+                include_subdirs=False, fflags=None, arch='intel64',
+                srcdir2=None, staging='copy', prune=False):
+    """
+    Return a list of strings with the arguments of main that change the
+    target that is built, the identity of the compilers, and the version
+    of pymake, because the compile and link flags that are derived from
+    the arguments can change when pymake is upgraded.
+
+    """
+    # imported here because pymake.pymake imports pymake.manifest
+    from .pymake import __version__
+    if srcdir2 is not None:
+        srcdir2 = os.path.abspath(srcdir2)
+    return ['pymake={}'.format(__version__),
+            'srcdir={}'.format(os.path.abspath(srcdir)),
+            'srcdir2={}'.format(srcdir2),
+            'fc={}'.format(get_compiler_id(fc)),
+            'cc={}'.format(get_compiler_id(cc)),
+            'double={}'.format(double),
+            'debug={}'.format(debug),
+            'subdirs={}'.format(include_subdirs),
+            'fflags={}'.format(fflags),
+            'arch={}'.format(arch),
+            'staging={}'.format(staging),
+            'prune={}'.format(prune)]
+
+
+class TargetManifest(object):
+    """
+    Manifest of the inputs of a target.
+
+    Parameters
+    ----------
+    target : str
+        path of the target
+
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.fpth = get_manifest_file(target)
+        self.data = None
+        try:
+            f = open(self.fpth, 'r')
+            data = json.load(f)
+            f.close()
+            if data.get('version') == manifestversion and \
+                    data.get('target') == os.path.abspath(target):
+                self.data = data
+        except:
+            pass
+        return
+
+    def snapshot(self, dirs, exclude=None):
+        """
+        Return a dictionary with the stat key and the hash of every file in
+        the directories in dirs, which are walked in the same way as they
+        are staged, without the files and directories in exclude.  A file
+        is only hashed if its stat key is not the one in the manifest.
+
+        """
+        exclude = [os.path.abspath(d) for d in exclude or []]
+        previous = {}
+        if self.data is not None:
+            previous = self.data['files']
+        files = {}
+        for i, srcdir in enumerate(dirs):
+            if srcdir is None:
+                continue
+            for path, subdirs, names in os.walk(srcdir):
+                subdirs.sort()
+                subdirs[:] = [d for d in subdirs
+                              if os.path.abspath(os.path.join(path, d))
+                              not in exclude]
+                for name in sorted(names):
+                    fpth = os.path.join(path, name)
+                    if os.path.abspath(fpth) in exclude:
+                        continue
+                    key = get_stat_key(fpth)
+                    if key is None:
+                        continue
+                    key = list(key)
+                    rel = '{}:{}'.format(i, os.path.relpath(fpth, srcdir))
+                    entry = previous.get(rel)
+                    if entry is not None and entry[0] == key:
+                        files[rel] = entry
+                    else:
+                        files[rel] = [key, hash_file(fpth)]
+        return files
+
+    def get_tree_hash(self, files):
+        """
+        Return the hash of the relative paths and hashes of the files in a
+        snapshot.
+
+        """
+        return hash_list(['{}\0{}'.format(rel, files[rel][1])
+                          for rel in sorted(files)])
+
+    def up_to_date(self, request, files):
+        """
+        Determine if the target was built with the same request (see
+        get_request) from the files in the snapshot files and has not
+        changed since.
+
+        """
+        if self.data is None:
+            return False
+        if self.data['request'] != hash_list(request):
+            return False
+        if self.data['tree'] != self.get_tree_hash(files):
+            return False
+        if self.data['stat'] != get_target_key(self.target):
+            return False
+        # remember the new stat keys of files that were only touched
+        if self.data['files'] != files:
+            self.data['files'] = files
+            write_json(self.fpth, self.data)
+        return True
+
+    def update(self, request, files):
+        """
+        Record that the target was built with request from the files in
+        the snapshot files.
+
+        """
+        self.data = {'version': manifestversion,
+                     'target': os.path.abspath(self.target),
+                     'stat': get_target_key(self.target),
+                     'request': hash_list(request),
+                     'tree': self.get_tree_hash(files),
+                     'files': files}
+        write_json(self.fpth, self.data)
+        return
+
+    def remove(self):
+        """
+        Remove the manifest so that the target is built by the next
+        request.
+
+        """
+        self.data = None
+        try:
+            os.remove(self.fpth)
+        except:
+            pass
+        return
@@ -0,0 +1,270 @@
+#! /usr/bin/env python
+"""
+Ninja build file generator.  create_ninja writes a ninja build file
+(build.ninja in the build directory by default) with one edge for each
+source file.  The module and submodule files that each fortran source
+file writes and reads, and the files it includes, are not written in the
+build file but in a dyndep file that ninja asks pymake to write (python
+-m pymake.ninja) before it compiles any fortran source file and again
+when a fortran source file changes.  The fortran compile rule uses
+restat, so the files that use a module are not recompiled if the
+compiler did not rewrite the module file because its interface did not
+change.  c/c++ headers are tracked with the depfiles written by the
+compiler.
+
+Source files that are added or removed are only found if pymake is run
+again with --ninja.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+import datetime
+
+from .dag import get_source_nodelist
+from .scanner import scan_files, is_c_file, get_included_files
+from .compilers import get_defines
+from .pymake import get_module_files, get_module_needs
+
+# name of the dyndep file in the object directory
+ddname = 'fortran.dd'
+
+
+def _path(pth):
+    """
+    Return pth with forward slashes.
+
+    """
+    return pth.replace('\\', '/')
+
+
+def _escape(pth):
+    """
+    Return a path escaped for a ninja build file.
+
+    """
+    return _path(pth).replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+
+def get_objfile(srcfile, objdir):
+    """
+    Return the path of the object file for srcfile in objdir.
+
+    """
+    srcname = os.path.splitext(os.path.basename(srcfile))[0]
+    return _path(objdir) + '/' + srcname + '.o'
+
+
+def get_staged_srcfile(srcfile, srcdir, srcdir2, srcdir_temp):
+    """
+    Return the path of the file in the source directory (srcdir) or the
+    common source directory (srcdir2) that was staged as srcfile in
+    srcdir_temp.  srcfile is returned if it was not staged.
+
+    """
+    rel = os.path.relpath(srcfile, srcdir_temp)
+    if rel.startswith(os.pardir):
+        return srcfile
+    if srcdir2 is not None:
+        common = os.path.basename(os.path.normpath(srcdir2))
+        parts = rel.split(os.sep, 1)
+        if len(parts) == 2 and parts[0] == common and \
+                not os.path.isfile(os.path.join(srcdir, rel)):
+            return os.path.join(srcdir2, parts[1])
+    return os.path.join(srcdir, rel)
+
+
+def write_dyndep(fpth, srcfiles, objdir, defines=None):
+    """
+    Write the ninja dyndep file for the fortran source files in srcfiles.
+    The edge of each object file gets the module and submodule files that
+    are written when it is compiled and read by other source files as
+    implicit outputs and the module and submodule files it reads and the
+    files it includes as implicit inputs.  The file is not rewritten if it
+    has not changed, so that ninja does not reload it.
+
+    """
+    srcfiles = [srcfile for srcfile in srcfiles if not is_c_file(srcfile)]
+    nodelist = get_source_nodelist(srcfiles, defines)
+    index = scan_files(srcfiles, defines=defines)
+    needs = {}
+    needed = set()
+    for node in nodelist:
+        needs[node.name] = get_module_needs(node.name, index[node.name],
+                                            defines)
+        needed |= needs[node.name]
+
+    # the edges are sorted by object file so that the file does not depend
+    # on the order of the source files
+    edges = []
+    for node in nodelist:
+        outputs = [_escape(_path(objdir) + '/' + fname)
+                   for key, fname in get_module_files(node)
+                   if key in needed]
+        inputs = []
+        for dep in node.dependencies:
+            inputs += [_escape(_path(objdir) + '/' + fname)
+                       for key, fname in get_module_files(dep)
+                       if key in needs[node.name]]
+        for inc in get_included_files(node.name, defines):
+            if os.path.isfile(inc):
+                inputs.append(_escape(inc))
+        line = 'build {}'.format(_escape(get_objfile(node.name, objdir)))
+        if len(outputs) > 0:
+            line += ' | ' + ' '.join(outputs)
+        line += ': dyndep'
+        if len(inputs) > 0:
+            line += ' | ' + ' '.join(inputs)
+        edges.append(line + '\n  restat = 1\n')
+    text = 'ninja_dyndep_version = 1\n' + ''.join(sorted(edges))
+
+    try:
+        f = open(fpth, 'r')
+        previous = f.read()
+        f.close()
+    except:
+        previous = None
+    if text != previous:
+        pth = os.path.dirname(fpth)
+        if pth != '' and not os.path.isdir(pth):
+            os.makedirs(pth)
+        f = open(fpth, 'w')
+        f.write(text)
+        f.close()
+    return
+
+
+def create_ninja(target, srcdir, srcdir2, srcfiles, objfiles, fc, fflags,
+                 cc, cflags, syslibs, modules=['-I', '-J'], fpth=None):
+    """
+    Write a ninja build file for target to fpth or, if fpth is None, to
+    build.ninja in the build directory that contains the object directory,
+    so that the build files of different targets do not overwrite each
+    other.  The paths in the build file are relative to the current
+    directory, and it is run from there with ninja -f fpth.  srcfiles
+    and objfiles are the source files, which may be staged in src_temp,
+    and the object files in dependency order.  The build file compiles
+    the files in srcdir and srcdir2 and writes the object and module files
+    in the directory of the object files.  modules are the switches that
+    are followed by the module directory in the fortran compile command.
+
+    """
+    objdir = os.path.dirname(objfiles[0])
+    if fpth is None:
+        fpth = os.path.join(os.path.dirname(objdir), 'build.ninja')
+    srcdir_temp = os.path.join(os.path.dirname(objdir), 'src_temp')
+    srcs = [get_staged_srcfile(srcfile, srcdir, srcdir2, srcdir_temp)
+            for srcfile in srcfiles]
+    ffiles = [srcfile for srcfile in srcs if not is_c_file(srcfile)]
+    ddfile = _path(objdir) + '/' + ddname
+
+    # -D, -U, and -cpp flags are used to evaluate cpp conditionals in the
+    # dyndep file
+    dflags = [flag for flag in fflags
+              if flag[:2] in ('-D', '-U') or flag in ('-cpp', '-fpp')]
+
+    print('\nWriting {}'.format(fpth))
+    f = open(fpth, 'w')
+    f.write('# build.ninja created on {}\n'.format(datetime.datetime.now()) +
+            '# by pymake using the {} fortran and '.format(fc) +
+            '{} c/c++ compilers.\n'.format(cc))
+    f.write('ninja_required_version = 1.10\n')
+    f.write('\n')
+    f.write('objdir = {}\n'.format(_escape(objdir)))
+    f.write('fc = {}\n'.format(fc))
+    f.write('fflags = {}\n'.format(' '.join(fflags)))
+    f.write('dflags = {}\n'.format(' '.join(dflags)))
+    f.write('moddir = {}\n'.format(' '.join([m + '$objdir'
+                                             for m in modules])))
+    f.write('cc = {}\n'.format(cc))
+    f.write('cflags = {}\n'.format(' '.join(cflags)))
+    f.write('syslibs = {}\n'.format(' '.join(syslibs)))
+    f.write('python = {}\n'.format(_escape(sys.executable)))
+    f.write('\n')
+
+    f.write('rule fc\n' +
+            '  command = $fc $fflags -c $in -o $out $moddir\n' +
+            '  description = FC $out\n' +
+            '  restat = 1\n')
+    f.write('\n')
+    f.write('rule cc\n' +
+            '  command = $cc $cflags -MMD -MF $out.d -c $in -o $out\n' +
+            '  description = CC $out\n' +
+            '  depfile = $out.d\n' +
+            '  deps = gcc\n')
+    f.write('\n')
+    f.write('rule link\n' +
+            '  command = $fc $fflags -o $out $in $syslibs\n' +
+            '  description = LINK $out\n')
+    f.write('\n')
+    f.write('rule dyndep\n' +
+            '  command = $python -m pymake.ninja $out $objdir $in ' +
+            '--fc $fc $dflags\n' +
+            '  description = SCAN $out\n' +
+            '  restat = 1\n')
+    f.write('\n')
+
+    if len(ffiles) > 0:
+        f.write('build {}: dyndep {}\n'.format(ddfile,
+                                               ' '.join([_escape(s)
+                                                         for s in ffiles])))
+        f.write('\n')
+    objs = []
+    for srcfile in srcs:
+        objfile = _escape(get_objfile(srcfile, objdir))
+        objs.append(objfile)
+        if is_c_file(srcfile):
+            f.write('build {}: cc {}\n'.format(objfile, _escape(srcfile)))
+        else:
+            f.write('build {}: fc {} || {}\n'.format(objfile,
+                                                     _escape(srcfile),
+                                                     ddfile))
+            f.write('  dyndep = {}\n'.format(ddfile))
+    f.write('\n')
+    f.write('build {}: link {}\n'.format(_escape(target), ' '.join(objs)))
+    f.write('default {}\n'.format(_escape(target)))
+    f.close()
+
+    # write the dyndep file for the current source files.  ninja has it
+    # rewritten when a fortran source file changes.
+    write_dyndep(ddfile, ffiles, objdir, get_defines(fc, dflags))
+    return
+
+
+def parser():
+    '''
+    Construct the parser and return argument values
+    '''
+    parser = argparse.ArgumentParser(description='''Write the ninja dyndep
+                                     file with the module files written and
+                                     read by fortran source files.''')
+    parser.add_argument('ddfile', help='Path of the dyndep file')
+    parser.add_argument('objdir',
+                        help='Directory of the object and module files')
+    parser.add_argument('srcfiles', nargs='*',
+                        help='Fortran source files')
+    parser.add_argument('--fc', help='Fortran compiler (default is gfortran)',
+                        default='gfortran')
+    parser.add_argument('-D', help='Define a macro', action='append',
+                        default=[], dest='defines')
+    parser.add_argument('-U', help='Undefine a macro', action='append',
+                        default=[], dest='undefines')
+    parser.add_argument('-cpp', '-fpp', help='Preprocess all of the fortran '
+                        'source files', action='store_true', dest='cpp')
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    # get the arguments
+    args = parser()
+
+    flags = ['-D' + name for name in args.defines] + \
+            ['-U' + name for name in args.undefines]
+    if args.cpp:
+        flags.append('-cpp')
+    write_dyndep(args.ddfile, args.srcfiles, args.objdir,
+                 get_defines(args.fc, flags))
@@ -22,15 +22,40 @@ import sys
 import shutil
 import subprocess
 import argparse
-from .dag import order_source_files, order_c_source_files
+import threading
+import hashlib
+import time
+from .dag import order_source_files, order_c_source_files, \
+    get_source_nodelist, get_dag, get_reachable_srcfiles
+from .builddb import BuildDatabase, dbname, hash_module, get_depfile
+from .cache import ObjectCache
+from .compilers import get_compiler_info, flag_available, get_defines
+from .buildtrace import BuildTrace, phase
+from .manifest import TargetManifest, get_request
+from .scanner import scan_files, get_uses, is_c_file, get_included_files
+from .schedule import CompileHistory, get_history_file, get_weights, \
+    get_priorities
 import datetime
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 try:
     from flopy import is_exe as flopy_is_exe
     flopy_avail = True
 except:
     flopy_avail = False
 
+# directory in which the default build directory for each target is created
+buildroot = 'pymake_build'
+
+# extensions (lower case) of the fortran and c/c++ source files that are
+# compiled
+fortran_exts = ('.f', '.f90', '.for', '.fpp')
+c_exts = ('.c', '.cpp')
+
 def parser():
     '''
     Construct the parser and return argument values
@@ -41,7 +66,7 @@ def parser():
                                      should not contain any bad or duplicate
                                      source files as all source files in the
                                      source directory will be built and
-                                     linked.''')
+                                     linked, unless --prune is used.''')
     parser.add_argument('srcdir', help='Location of source directory')
     parser.add_argument('target', help='Name of target to create')
     parser.add_argument('-fc', help='Fortran compiler to use (default is gfortran)',
@@ -59,8 +84,11 @@ def parser():
                         action='store_true')
     parser.add_argument('-e', '--expedite',
                         help='''Only compile out of date source files.
-                        Clean must not have been used on previous build.
-                        Does not work yet for ifort.''',
+                        A source file is out of date if it, the files it
+                        includes, the compiler, or the compile flags have
+                        changed since the previous build, or if a module it
+                        uses is recompiled.  Clean must not have been used
+                        on previous build.  Does not work yet for ifort.''',
                         action='store_true')
     parser.add_argument('-dr', '--dryrun',
                         help='''Do not actually compile.  Files will be
@@ -75,42 +103,182 @@ def parser():
                         help='''Additional fortran compiler flags.''',
                         default=None)
     parser.add_argument('-mf', '--makefile',
-                        help='''Create a standard makefile.''',
-                        action='store_true')
+                        help='''Create a standard makefile.  The makefile
+                        is written to MAKEFILE or, if no path is given, to
+                        makefile in the build directory.  The paths in the
+                        makefile are relative to the current directory, so
+                        it is run from there with make -f MAKEFILE.''',
+                        nargs='?', const=True, default=False)
+    parser.add_argument('-nj', '--ninja',
+                        help='''Create a ninja build file that uses dyndep
+                        and restat so that files that use a module are
+                        only recompiled when its interface changes.  The
+                        build file is written to NINJA or, if no path is
+                        given, to build.ninja in the build directory.  The
+                        paths in the build file are relative to the
+                        current directory, so it is run from there with
+                        ninja -f NINJA.''',
+                        nargs='?', const=True, default=False)
     parser.add_argument('-cs', '--commonsrc',
                         help='''Additional directory with common source files.''',
                         default=None)
+    parser.add_argument('-j', '--jobs',
+                        help='''Number of source files to compile at the
+                        same time (default is 1).  Does not work yet for
+                        ifort on Windows.''',
+                        default=1, type=int)
+    parser.add_argument('-cd', '--cachedir',
+                        help='''Directory for an object cache that is shared
+                        by builds of all targets.  Does not work yet for
+                        ifort on Windows.''',
+                        default=None)
+    parser.add_argument('-cz', '--cachesize',
+                        help='''Maximum size of the object cache in megabytes
+                        (default is 2048).  The least recently used objects
+                        are removed when the cache is larger.''',
+                        default=2048, type=int)
+    parser.add_argument('-st', '--staging',
+                        help='''How source files are staged in src_temp
+                        (default is copy).  symlink and hardlink link the
+                        source files instead of copying them and only copy
+                        files that pymake rewrites, such as openspec.inc.
+                        none compiles the files in the source directory
+                        directly and does not rewrite openspec.inc or
+                        FILESPEC.INC, so a MODFLOW target uses the access
+                        and form in the original files instead of STREAM
+                        ACCESS; a warning is printed for each of these
+                        files that is found.''',
+                        default='copy',
+                        choices=['copy', 'symlink', 'hardlink', 'none'])
+    parser.add_argument('-bd', '--builddir',
+                        help='''Directory for the temporary source, object,
+                        and module directories (default is a directory in
+                        ./{} that is unique for the
+                        target).'''.format(buildroot),
+                        default=None)
+    parser.add_argument('-pr', '--prune',
+                        help='''Only compile the source files that are
+                        reachable from the PROGRAM unit(s) through the
+                        modules they use and the subroutines and functions
+                        they call.  If a PROGRAM name is given, only that
+                        program is used.  c/c++ source files are always
+                        compiled.''',
+                        nargs='?', const=True, default=False,
+                        metavar='PROGRAM')
+    parser.add_argument('-w', '--watch',
+                        help='''After the target is built, keep the source
+                        dependency graph and the build database in memory,
+                        watch the source directories, and rebuild the
+                        target, compiling only the out of date source
+                        files, each time a file changes.  Stop with Ctrl-C
+                        or, if N is given, after N rebuilds.  Does not work
+                        yet for ifort on Windows.''',
+                        nargs='?', const=True, default=False, type=int,
+                        metavar='N')
+    parser.add_argument('-fo', '--force',
+                        help='''Build the target even if it is up to date,
+                        compiling every source file and linking the
+                        target again.''',
+                        action='store_true')
+    parser.add_argument('-tr', '--trace',
+                        help='''Write a Chrome trace (json) of the build
+                        with the time, peak memory, and cache status of each
+                        compile to this file and a csv summary with the same
+                        name and a .csv extension.  The trace can be viewed
+                        in chrome://tracing or https://ui.perfetto.dev.''',
+                        default=None)
     args = parser.parse_args()
     return args
 
 
-def initialize(srcdir, target, commonsrc):
+def stage_tree(src, dst, staging='copy'):
     '''
-    Remove temp source directory and target, and then copy source into
-    source temp directory.  Return temp directory path.
+    Stage the source directory src in dst.  If staging is 'copy', the
+    directory tree is copied.  If staging is 'symlink' or 'hardlink', the
+    directories are created and every file is linked to the file in src.
+    Files that can not be linked are copied.
     '''
-    # remove the target if it already exists
-    srcdir_temp = os.path.join('.', 'src_temp')
-    objdir_temp = os.path.join('.', 'obj_temp')
-    moddir_temp = os.path.join('.', 'mod_temp')
+    if staging == 'copy':
+        shutil.copytree(src, dst)
+        return
+    for path, subdirs, files in os.walk(src):
+        pth = os.path.join(dst, os.path.relpath(path, src))
+        if not os.path.isdir(pth):
+            os.makedirs(pth)
+        for name in files:
+            stage_file(os.path.join(path, name), os.path.join(pth, name),
+                       staging)
+    return
 
-    # remove srcdir_temp and copy in srcdir
-    try:
-        os.remove(target)
-    except:
-        pass
+
+def stage_file(src, dst, staging='copy'):
+    '''
+    Stage the file src as dst by copying it or, if staging is 'symlink' or
+    'hardlink', linking it.  A file that can not be linked is copied.  The
+    directory of dst is created if it does not exist.
+    '''
+    pth = os.path.dirname(dst)
+    if pth != '' and not os.path.isdir(pth):
+        os.makedirs(pth)
     try:
-        shutil.rmtree(srcdir_temp)
+        if staging == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+            return
+        elif staging == 'hardlink':
+            os.link(src, dst)
+            return
     except:
         pass
-    shutil.copytree(srcdir, srcdir_temp)
+    shutil.copy2(src, dst)
+    return
 
-    # copy files from a specified common source directory if
-    # commonsrc is not None
-    if commonsrc is not None:
-        pth = os.path.basename(os.path.normpath(commonsrc))
-        pth = os.path.join(srcdir_temp, pth)
-        shutil.copytree(commonsrc, pth)
+
+def get_builddir(target):
+    '''
+    Return the default build directory for target.  The build directory is
+    unique for each target so that several targets can be built at the
+    same time from the same directory.
+    '''
+    name = os.path.basename(target)
+    h = hashlib.sha1(os.path.abspath(target).encode('utf-8')).hexdigest()
+    return os.path.join('.', buildroot, '{}-{}'.format(name, h[:8]))
+
+
+def initialize(srcdir, target, commonsrc, staging='copy', builddir=None):
+    '''
+    Remove temp source directory, and then copy source into source temp
+    directory.  Return temp directory path.  The target is not removed so
+    that it is not linked again if its object files do not change.  Source
+    files are linked instead of copied if staging is 'symlink' or
+    'hardlink' and the source directory is used directly if staging is
+    'none'.  The temp directories are created in builddir, which defaults
+    to a directory that is unique for target.
+    '''
+    if staging not in ('copy', 'symlink', 'hardlink', 'none'):
+        raise Exception('Unsupported staging: {}'.format(staging))
+    if builddir is None:
+        builddir = get_builddir(target)
+
+    srcdir_temp = os.path.join(builddir, 'src_temp')
+    objdir_temp = os.path.join(builddir, 'obj_temp')
+    moddir_temp = os.path.join(builddir, 'mod_temp')
+
+    # remove srcdir_temp and copy in srcdir
+    if staging == 'none':
+        srcdir_temp = srcdir
+    else:
+        try:
+            shutil.rmtree(srcdir_temp)
+        except:
+            pass
+        stage_tree(srcdir, srcdir_temp, staging)
+
+        # copy files from a specified common source directory if
+        # commonsrc is not None
+        if commonsrc is not None:
+            pth = os.path.basename(os.path.normpath(commonsrc))
+            pth = os.path.join(srcdir_temp, pth)
+            stage_tree(commonsrc, pth, staging)
 
     # set srcdir_temp
     srcdir_temp = os.path.join(srcdir_temp)
@@ -124,50 +292,83 @@ def initialize(srcdir, target, commonsrc):
     return srcdir_temp, objdir_temp, moddir_temp
 
 
-def clean(srcdir_temp, objdir_temp, moddir_temp, objext, winifort):
+def clean(srcdir_temp, objdir_temp, moddir_temp, objext, winifort,
+          staging='copy'):
     """
-    Remove mod and object files, and remove the temp source directory.
+    Remove mod and object files, and remove the temp source directory
+    unless the source directory was used directly (staging is 'none').
+    The build directory that contains the temp directories is removed if
+    it is empty.
 
     """
     # clean things up
     print('\nCleaning up temporary source, object, and module files...')
-    filelist = os.listdir('.')
+    builddir = os.path.dirname(objdir_temp)
+    filelist = os.listdir(builddir)
     delext = ['.mod', objext]
     for f in filelist:
         for ext in delext:
             if f.endswith(ext):
-                os.remove(f)
-    shutil.rmtree(srcdir_temp)
+                os.remove(os.path.join(builddir, f))
+    if staging != 'none':
+        shutil.rmtree(srcdir_temp)
     shutil.rmtree(objdir_temp)
     shutil.rmtree(moddir_temp)
     if winifort:
-        os.remove('compile.bat')
+        os.remove(os.path.join(builddir, 'compile.bat'))
+
+    # remove the build directory and the default build root if empty
+    if os.path.normpath(builddir) != '.':
+        for pth in [builddir, os.path.join('.', buildroot)]:
+            try:
+                os.rmdir(pth)
+            except:
+                pass
     return
 
 
-def get_ordered_srcfiles(srcdir_temp, include_subdir=False):
+def get_srcfiles(srcdir_temp, include_subdir=False):
     '''
-    Create a list of ordered source files (both fortran and c).  Ordering
-    is build using a directed acyclic graph to determine module dependencies.
+    Return the lists of fortran and c/c++ source files in srcdir_temp,
+    which can be a directory or a list of directories.  The files are
+    listed in sorted order in each directory so that the lists, and the
+    order of the source files, are the same on every file system.
     '''
     # create a list of all c(pp), f and f90 source files
 
+    if isinstance(srcdir_temp, (list, tuple)):
+        srcdirs = srcdir_temp
+    else:
+        srcdirs = [srcdir_temp]
     templist = []
-    for path, subdirs, files in os.walk(srcdir_temp):
-        for name in files:
-            if not include_subdir:
-                if path != srcdir_temp:
-                    continue
-            f = os.path.join(os.path.join(path, name))
-            templist.append(f)
+    for srcdir in srcdirs:
+        for path, subdirs, files in os.walk(srcdir):
+            subdirs.sort()
+            for name in sorted(files):
+                if not include_subdir:
+                    if path != srcdir:
+                        continue
+                f = os.path.join(os.path.join(path, name))
+                templist.append(f)
     cfiles = []  # mja
     srcfiles = []
     for f in templist:
-        if f.lower().endswith('.f') or f.lower().endswith('.f90') \
-                or f.lower().endswith('.for') or f.lower().endswith('.fpp'):
+        if f.lower().endswith(fortran_exts):
             srcfiles.append(f)
-        elif f.lower().endswith('.c') or f.lower().endswith('.cpp'):  # mja
+        elif f.lower().endswith(c_exts):  # mja
             cfiles.append(f)  # mja
+    return srcfiles, cfiles
+
+
+def get_ordered_srcfiles(srcdir_temp, include_subdir=False, defines=None):
+    '''
+    Create a list of ordered source files (both fortran and c).  Ordering
+    is build using a directed acyclic graph to determine module dependencies.
+    srcdir_temp can be a directory or a list of directories.  If defines,
+    a dictionary of macro names and values, is not None, it is used to
+    evaluate the cpp conditionals in the fortran source files.
+    '''
+    srcfiles, cfiles = get_srcfiles(srcdir_temp, include_subdir)
 
     # orderedsourcefiles = order_source_files(srcfiles) + \
     #                     order_c_source_files(cfiles)
@@ -175,21 +376,19 @@ def get_ordered_srcfiles(srcdir_temp, include_subdir=False):
 
     srcfileswithpath = []
     for srcfile in srcfiles:
-        s = os.path.join(srcdir_temp, srcfile)
         s = srcfile
         srcfileswithpath.append(s)
 
     # from mja
     cfileswithpath = []
     for srcfile in cfiles:
-        s = os.path.join(srcdir_temp, srcfile)
         s = srcfile
         cfileswithpath.append(s)
 
     # order the source files using the directed acyclic graph in dag.py
     orderedsourcefiles = []
     if len(srcfileswithpath) > 0:
-        orderedsourcefiles += order_source_files(srcfileswithpath)
+        orderedsourcefiles += order_source_files(srcfileswithpath, defines)
         
     if len(cfileswithpath) > 0:
         orderedsourcefiles += order_c_source_files(cfileswithpath)
@@ -197,96 +396,557 @@ def get_ordered_srcfiles(srcdir_temp, include_subdir=False):
     return orderedsourcefiles
 
 
-def create_openspec(srcdir_temp):
+def create_openspec(srcdir_temp, recursive=True):
     '''
     Create a new openspec.inc file that uses STREAM ACCESS.  This is specific
-    to MODFLOW.
+    to MODFLOW.  Every directory in srcdir_temp is searched, because the
+    include files do not have to be in a directory with source files, unless
+    recursive is False.
+    '''
+    for fname in find_openspec(srcdir_temp, recursive):
+        print('replacing..."{}"'.format(fname))
+        # remove the file first so that a linked file is replaced
+        # instead of the original source file being overwritten
+        os.remove(fname)
+        f = open(fname, 'w')
+        line = "c -- created by pymake.py\n" + \
+               "      CHARACTER*20 ACCESS,FORM,ACTION(2)\n" + \
+               "      DATA ACCESS/'STREAM'/\n" + \
+               "      DATA FORM/'UNFORMATTED'/\n" + \
+               "      DATA (ACTION(I),I=1,2)/'READ','READWRITE'/\n" + \
+               "c -- end of include file\n"
+        f.write(line)
+        f.close()
+    return
+
+
+def find_openspec(srcdir, recursive=True):
+    '''
+    Return the paths of the openspec.inc and FILESPEC.INC files in srcdir,
+    which can be a directory or a list of directories, and, if recursive,
+    its subdirectories.
     '''
     files = ['openspec.inc', 'FILESPEC.INC']
-    dirs = [d[0] for d in os.walk(srcdir_temp)]
+    if not isinstance(srcdir, list):
+        srcdir = [srcdir]
+    dirs = []
+    for pth in srcdir:
+        if recursive:
+            dirs += [d[0] for d in os.walk(pth)]
+        else:
+            dirs.append(pth)
+    fpths = []
     for d in dirs:
         for f in files:
             fname = os.path.join(d, f)
             if os.path.isfile(fname):
-                print('replacing..."{}"'.format(fname))
-                f = open(fname, 'w')
-                line = "c -- created by pymake.py\n" + \
-                       "      CHARACTER*20 ACCESS,FORM,ACTION(2)\n" + \
-                       "      DATA ACCESS/'STREAM'/\n" + \
-                       "      DATA FORM/'UNFORMATTED'/\n" + \
-                       "      DATA (ACTION(I),I=1,2)/'READ','READWRITE'/\n" + \
-                       "c -- end of include file\n"
-                f.write(line)
-                f.close()
-    return
+                fpths.append(fname)
+    return fpths
 
 
-def out_of_date(srcfile, objfile):
-    ood = True
-    if os.path.exists(objfile):
-        t1 = os.path.getmtime(objfile)
-        t2 = os.path.getmtime(srcfile)
-        if t1 > t2:
-            ood = False
-    return ood
+def warn_openspec(srcdir):
+    '''
+    Warn that the openspec.inc and FILESPEC.INC files in srcdir, which can
+    be a directory or a list of directories, are not rewritten to use
+    STREAM ACCESS because the source files are not staged.
+    '''
+    for fname in find_openspec(srcdir):
+        print('Warning: "{}" is not replaced with '.format(fname) +
+              'STREAM ACCESS because staging is none')
+    return
 
 
 # determine if iso_c_binding is used so that correct
 # gcc and clang compiler flags can be set
-def get_iso_c(srcfiles):
-    use_iso_c = False
+def get_iso_c(srcfiles, graph=None):
+    """
+    Determine if any of the source files use iso_c_binding.  If graph, a
+    SourceGraph with the source files, is not None, the facts it keeps are
+    used instead of scanning the source files.
+
+    """
+    if graph is None:
+        index = scan_files(srcfiles)
+    else:
+        index = graph.facts
     for srcfile in srcfiles:
-        try:
-            f = open(srcfile, 'rb')
-        except:
-            print('get_f_nodelist: could not open {0}'.format(os.path.basename(srcfile)))
-            continue
-        lines = f.read()
-        lines = lines.decode('ascii', 'replace').splitlines()
-        # develop a list of modules in the file
-        for idx, line in enumerate(lines):
-            linelist = line.strip().split()
-            if len(linelist) == 0:
-                continue
-            if linelist[0].upper() == 'USE':
-                modulename = linelist[1].split(',')[0].upper()
-                if 'ISO_C_BINDING' == modulename:
-                    return True
+        if index[srcfile]['iso_c']:
+            return True
     return False
 
-def flag_available(flag):
+def run_command(cmdlist, shellflg=False, jobserver=None, usage=None):
     """
-    Determine if a specified flag exists
+    Run a compiler or linker command and return the return code and the
+    combined stdout and stderr output.  If jobserver is not None, it is a
+    semaphore that limits the number of commands run at the same time by
+    all of the builds that share it.  If usage is not None, it is a
+    dictionary (from BuildTrace.file) in which the start and end times, the
+    peak resident memory, the return code, and the thread of the command
+    are recorded.
+
     """
-    found = False
-    # determin the gfortran command line flags available
-    logfn = 'gfortran.txt'
-    errfn = 'gfortran.err'
-    logfile = open(logfn, 'w')
-    errfile = open(errfn, 'w')
-    proc = subprocess.Popen(["gfortran", "--help", "-v"],
-                            stdout=logfile, stderr=errfile)
-    ret_code = proc.wait()
-    logfile.close()
-    errfile.close()
-    # read data
-    f = open(logfn, 'r')
-    lines = f.readlines()
-    for line in lines:
-        if flag.lower() in line.lower():
-            found=True
+    if jobserver is not None:
+        jobserver.acquire()
+    try:
+        if usage is not None:
+            usage['thread'] = threading.current_thread().ident
+            usage['start'] = time.time()
+        proc = subprocess.Popen(cmdlist, shell=shellflg,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        if usage is not None and hasattr(os, 'wait4'):
+            # wait4 returns the resource usage of this process only
+            stdout_data = proc.stdout.read()
+            stderr_data = None
+            proc.stdout.close()
+            pid, status, rusage = os.wait4(proc.pid, 0)
+            if os.WIFSIGNALED(status):
+                proc.returncode = -os.WTERMSIG(status)
+            else:
+                proc.returncode = os.WEXITSTATUS(status)
+            maxrss = rusage.ru_maxrss
+            if sys.platform == 'darwin':
+                maxrss //= 1024
+            usage['maxrss'] = maxrss
+        else:
+            stdout_data, stderr_data = proc.communicate()
+        if usage is not None:
+            usage['end'] = time.time()
+            usage['returncode'] = proc.returncode
+    finally:
+        if jobserver is not None:
+            jobserver.release()
+    return proc.returncode, stdout_data, stderr_data
+
+
+def command_failed(cmdlist, returncode, stdout_data, stderr_data):
+    """
+    Print the failure message for a compiler or linker command.
+
+    """
+    msg = '{} failed, '.format(cmdlist) + \
+          'status code {} '.format(returncode) + \
+          'stdout {} '.format(stdout_data) + \
+          'stderr {}'.format(stderr_data)
+    print(msg)
+    return
+
+
+def compile_sources(compilelist, dependencies=None, jobs=1, dryrun=False,
+                    shellflg=False, callback=None, skip=None, runner=None,
+                    jobserver=None, trace=None, priority=None):
+    """
+    Compile a list of (srcfile, cmdlist) tuples.  The list must be in
+    dependency order.  If jobs is greater than one, up to jobs compiler
+    processes are run at the same time and a source file is started as soon
+    as all of the source files it depends on (from dependencies, a
+    dictionary of srcfile: [srcfiles]) have been compiled.  Source files
+    that are not in compilelist are assumed to be up to date.  If callback
+    is not None, it is called with the name of each source file that was
+    compiled successfully.  If skip is not None, it is called with the name
+    of each source file once the source files it depends on are complete
+    and the source file is not compiled if it returns True.  If runner is
+    not None, it is called with the source file name and the compile
+    command instead of running the compile command and must return the
+    return code and output of the command.  jobserver is passed to
+    run_command.  If trace is not None, it is a BuildTrace in which the
+    time each source file is queued and the compile of each source file
+    are recorded.  If priority is not None, it is a dictionary of
+    srcfile: priority and the ready source file with the highest priority
+    is started first.
+
+    Returns the return code of the first failed command or 0.
+
+    """
+    if jobs is None or jobs < 1:
+        jobs = 1
+    if runner is None:
+        def runner(srcfile, cmdlist):
+            usage = None
+            if trace is not None:
+                usage = trace.file(srcfile)
+            return run_command(cmdlist, shellflg, jobserver, usage)
+
+    def queued(srcfile):
+        if trace is not None:
+            trace.file(srcfile)['queued'] = time.time()
+        return
+
+    if jobs == 1 or dryrun or dependencies is None:
+        for srcfile, cmdlist in compilelist:
+            if skip is not None and skip(srcfile):
+                continue
+            print(' '.join(cmdlist))
+            if not dryrun:
+                queued(srcfile)
+                returncode, stdout_data, stderr_data = \
+                    runner(srcfile, cmdlist)
+                if returncode != 0:
+                    command_failed(cmdlist, returncode, stdout_data,
+                                   stderr_data)
+                    return returncode
+                if callback is not None:
+                    callback(srcfile)
+        return 0
+
+    # set up the number of unfinished dependencies and the dependents
+    # of each source file to be compiled
+    cmds = {}
+    position = {}
+    for idx, (srcfile, cmdlist) in enumerate(compilelist):
+        cmds[srcfile] = cmdlist
+        position[srcfile] = idx
+    waiting = {}
+    dependents = {}
+    for srcfile in cmds:
+        waiting[srcfile] = set()
+        dependents[srcfile] = []
+    for srcfile in cmds:
+        for dep in dependencies.get(srcfile, []):
+            if dep in cmds and dep != srcfile:
+                waiting[srcfile].add(dep)
+                dependents[dep].append(srcfile)
+    def order(srcfile):
+        if priority is None:
+            return position[srcfile]
+        return -priority.get(srcfile, 0.), position[srcfile]
+
+    ready = [srcfile for srcfile, cmdlist in compilelist
+             if len(waiting[srcfile]) == 0]
+    ready.sort(key=order)
+    for srcfile in ready:
+        queued(srcfile)
+
+    def release(srcfile):
+        for dependent in dependents[srcfile]:
+            waiting[dependent].discard(srcfile)
+            if len(waiting[dependent]) == 0:
+                queued(dependent)
+                ready.append(dependent)
+        ready.sort(key=order)
+        return
+
+    def worker(srcfile, cmdlist):
+        try:
+            result = runner(srcfile, cmdlist)
+        except Exception as e:
+            result = (1, None, str(e))
+        done.put((srcfile, result))
+        return
+
+    # dispatch source files as their dependencies are satisfied
+    done = queue.Queue()
+    running = 0
+    returncode = 0
+    while len(ready) > 0 or running > 0:
+        while returncode == 0 and len(ready) > 0 and running < jobs:
+            srcfile = ready.pop(0)
+            if skip is not None and skip(srcfile):
+                release(srcfile)
+                continue
+            cmdlist = cmds[srcfile]
+            print(' '.join(cmdlist))
+            t = threading.Thread(target=worker, args=(srcfile, cmdlist))
+            t.daemon = True
+            t.start()
+            running += 1
+        if running == 0:
             break
-    f.close()
-    # remove file
-    os.remove(logfn)
-    os.remove(errfn)
-    # return
-    return found
+        srcfile, result = done.get()
+        running -= 1
+        if result[0] != 0:
+            command_failed(cmds[srcfile], *result)
+            if returncode == 0:
+                returncode = result[0]
+            continue
+        if callback is not None:
+            callback(srcfile)
+        release(srcfile)
+
+    return returncode
+
+
+def get_module_files(node):
+    """
+    Return a list of (key, file name) for the module and submodule files
+    written when the source file of node is compiled.  The key of the .mod
+    file of module M is M, the key of its .smod file is M.SMOD, and the
+    key of the .smod file of submodule S of M is M@S.
+
+    """
+    l = []
+    for m in node.modules:
+        l.append((m, m.lower() + '.mod'))
+        l.append((m + '.SMOD', m.lower() + '.smod'))
+    for m in node.submodules:
+        l.append((m, m.lower() + '.smod'))
+    return l
+
+
+def get_module_needs(srcfile, info, defines=None):
+    """
+    Return the set of keys (see get_module_files) of the module and
+    submodule files read when srcfile is compiled.  info is the dictionary
+    of facts for srcfile.
+
+    """
+    needs = set()
+    if not is_c_file(srcfile):
+        needs.update(get_uses(srcfile, info, defines))
+        for m in info['parents']:
+            needs.add(m)
+            if '@' not in m:
+                needs.add(m + '.SMOD')
+    return needs
+
+
+def build_objects(objlist, objdir_temp, moddir_temp, expedite=False,
+                  dryrun=False, jobs=1, shellflg=False, cache=None,
+                  jobserver=None, trace=None, defines=None, graph=None,
+                  builddb=None, invalidated=None):
+    """
+    Compile the object files in objlist, a list of (srcfile, objfile,
+    cmdlist) tuples in dependency order.  Successfully compiled object files
+    and the interface hashes of the fortran modules and submodules they
+    provide are recorded in the build database in objdir_temp.  If
+    expedite is True, only object files that the build database reports as
+    out of date, or that read a module or submodule file whose interface
+    changed when it was recompiled, are compiled.  The files that use a
+    module only read its .mod file, so they are not recompiled when only
+    the .smod file read by its submodules changes.  If cache is not None,
+    object and module files are copied from the object cache instead of
+    being compiled when possible and compiled object and module files are
+    added to it.  jobserver and trace are passed to compile_sources.  The
+    compile time of each source file that is compiled is recorded in a
+    history file for any number of jobs, so that the estimates are there
+    for pymake.rebuild and for the first parallel build, and, if jobs is
+    greater than one, the source files on the longest chain of estimated
+    compile times are started first.  If defines, a dictionary
+    of macro names and values, is not None, it is used to evaluate the
+    cpp conditionals in the source files.  A long lived process, such as
+    the watch loop, can pass the SourceGraph of the source files (graph)
+    and the BuildDatabase of objdir_temp (builddb) that it keeps in memory
+    so that they are not scanned and read again for each build.  If
+    invalidated, a collection of source files, is not None, only those
+    files are hashed to determine if they are out of date, and the other
+    source files are up to date unless their object file is missing or
+    is not in the build database.  The watch loop, which tracks the
+    changed source and include files and the headers listed in the
+    depfiles, uses this so that the cost of a rebuild does not grow with
+    the number of source files.
+
+    Returns the return code of the first failed command or 0.
+
+    """
+    srcfiles = [srcfile for srcfile, objfile, cmdlist in objlist]
+    if graph is None:
+        nodelist = get_source_nodelist(srcfiles, defines)
+        index = scan_files(srcfiles, defines=defines)
+    else:
+        names = set(srcfiles)
+        nodelist = [node for node in graph.get_nodelist()
+                    if node.name in names]
+        index = graph.facts
+    dependencies = {}
+    dependents = {}
+    interfaces = {}
+    needs = {}
+    for node in nodelist:
+        dependencies[node.name] = [n.name for n in node.dependencies]
+        for n in node.dependencies:
+            dependents.setdefault(n.name, []).append(node.name)
+        interfaces[node.name] = [(key, os.path.join(moddir_temp, fname))
+                                 for key, fname in get_module_files(node)]
+        needs[node.name] = get_module_needs(node.name, index[node.name],
+                                            defines)
+    if builddb is None:
+        builddb = BuildDatabase(os.path.join(objdir_temp, dbname))
+    else:
+        builddb.reset()
+    history = CompileHistory(get_history_file(objdir_temp))
+    if trace is None:
+        # used to measure the compile times for the history
+        trace = BuildTrace()
+
+    # determine the source files that are out of date
+    objects = {}
+    compilelist = []
+    stale = set()
+    previous = {}
+    for srcfile, objfile, cmdlist in objlist:
+        objects[srcfile] = (objfile, cmdlist)
+        previous[srcfile] = builddb.get_modules(objfile)
+        compilelist.append((srcfile, cmdlist))
+        if not expedite:
+            outdated = True
+        elif invalidated is not None and srcfile not in invalidated:
+            outdated = objfile not in builddb.entries or \
+                not os.path.isfile(objfile)
+        else:
+            outdated = builddb.out_of_date(srcfile, objfile, cmdlist,
+                                           cmdlist[0])
+        if outdated:
+            stale.add(srcfile)
+            # forget the previous build so that the object file is rebuilt
+            # next time if this compile fails or does not run
+            builddb.remove(objfile)
+
+    # module and submodule interfaces that changed for each source file
+    # (or, for a dry run, None for the source files that would be compiled)
+    changed = {}
+
+    def uses_changed(srcfile, dep):
+        if dep not in changed:
+            return False
+        return changed[dep] is None or len(changed[dep] & needs[srcfile]) > 0
+
+    def skip(srcfile):
+        if srcfile not in stale:
+            for dep in dependencies.get(srcfile, []):
+                if uses_changed(srcfile, dep):
+                    break
+            else:
+                return True
+        if dryrun:
+            changed[srcfile] = None
+        return False
+
+    def compiled(srcfile):
+        objfile, cmdlist = objects[srcfile]
+        hashes = {}
+        for m, fpth in interfaces[srcfile]:
+            hashes[m] = hash_module(fpth)
+        builddb.update(srcfile, objfile, cmdlist, cmdlist[0], hashes)
+        keys = set([m for m in set(hashes) | set(previous[srcfile])
+                    if hashes.get(m) != previous[srcfile].get(m)])
+        if len(keys) > 0:
+            changed[srcfile] = keys
+            # files that use the changed interfaces must be rebuilt even if
+            # the build stops before they are compiled
+            for dependent in dependents.get(srcfile, []):
+                if uses_changed(dependent, srcfile):
+                    builddb.remove(objects[dependent][0])
+        return
+
+    def get_modfiles(srcfile):
+        return [fpth for m, fpth in interfaces.get(srcfile, [])]
+
+    runner = None
+    if cache is not None:
+        def runner(srcfile, cmdlist):
+            objfile = objects[srcfile][0]
+            usedmods = []
+            for dep in dependencies.get(srcfile, []):
+                usedmods += get_modfiles(dep)
+            key = cache.get_key(srcfile, objfile, cmdlist, usedmods)
+            usage = None
+            if trace is not None:
+                usage = trace.file(srcfile)
+                usage['thread'] = threading.current_thread().ident
+                usage['start'] = time.time()
+            depfile = get_depfile(cmdlist)
+            if cache.fetch(key, objfile, moddir_temp, srcfile, depfile):
+                if usage is not None:
+                    usage['end'] = time.time()
+                    usage['returncode'] = 0
+                    usage['cache'] = 'hit'
+                return 0, None, None
+            if usage is not None:
+                usage['cache'] = 'miss'
+            result = run_command(cmdlist, shellflg, jobserver, usage)
+            if result[0] == 0:
+                cache.store(key, objfile, get_modfiles(srcfile), srcfile,
+                            depfile)
+            return result
+
+    # start the longest chains of compiles first
+    priority = None
+    if jobs is not None and jobs > 1:
+        weights = get_weights(srcfiles, history)
+        priority = get_priorities(srcfiles, dependents, weights)
+        summary = get_dag(nodelist).summary(weights)
+        total = max(sum(weights.values()), 1e-30)
+        msg = '{} source files in {} '.format(summary['nodes'],
+                                             summary['levels']) + \
+              'levels (widest level {}), '.format(summary['max_width']) + \
+              'critical path is {:.0f}% '.format(100. *
+                                                 summary['critical_path'] /
+                                                 total) + \
+              'of the estimated compile time'
+        print(msg)
+
+    returncode = compile_sources(compilelist, dependencies, jobs, dryrun,
+                                 shellflg, compiled, skip, runner, jobserver,
+                                 trace, priority)
+    if not dryrun:
+        builddb.write()
+        # the compile times are recorded for serial builds as well, because
+        # pymake.rebuild estimates the cost of a change from them and a
+        # later parallel build can schedule its first compiles with them
+        nupdated = 0
+        for srcfile in srcfiles:
+            info = trace.files.get(srcfile)
+            if info is None or info['end'] is None or \
+                    info['returncode'] != 0 or info['cache'] == 'hit':
+                continue
+            history.update(srcfile, info['end'] - info['start'])
+            nupdated += 1
+        if nupdated > 0:
+            history.write()
+        if cache is not None:
+            cache.cleanup()
+            cache.write_stats()
+    return returncode
+
+
+def link_objects(cmdlist, target, objfiles, builddb=None, dryrun=False,
+                 shellflg=False, jobserver=None, trace=None):
+    """
+    Link target from the object files in objfiles with the link command
+    cmdlist.  If builddb is not None, target is not linked again unless
+    the object files, the linker, or the link flags and libraries have
+    changed, or the target was changed or removed, since it was last
+    linked, and the changes that caused it to be linked again are
+    reported.  The link is recorded in builddb, which is written.
+
+    Returns the return code of the link command or 0.
+
+    """
+    if builddb is not None and not dryrun:
+        changes = builddb.link_changes(target, cmdlist, objfiles)
+        if len(changes) == 0:
+            print('{} is up to date, '.format(os.path.basename(target)) +
+                  'the object files did not change')
+            return 0
+        if target in builddb.entries:
+            names = [os.path.basename(c) for c in changes]
+            if len(names) > 10:
+                names = names[:10] + ['{} more'.format(len(names) - 10)]
+            print('relinking because of changes to: ' + ', '.join(names))
+    print(' '.join(cmdlist))
+    if dryrun:
+        return 0
+    with phase(trace, 'link'):
+        returncode, stdout_data, stderr_data = run_command(cmdlist,
+                                                           shellflg,
+                                                           jobserver)
+    if returncode != 0:
+        command_failed(cmdlist, returncode, stdout_data, stderr_data)
+        if builddb is not None:
+            builddb.remove(target)
+            builddb.write()
+        return returncode
+    if builddb is not None:
+        builddb.update_link(target, cmdlist, objfiles)
+        builddb.write()
+    return 0
 
 
 def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
                      expedite, dryrun, double, debug, fflags,
-                     srcdir, srcdir2, makefile):
+                     srcdir, srcdir2, makefile, jobs=1, cache=None,
+                     jobserver=None, trace=None, ninja=False, graph=None,
+                     builddb=None, invalidated=None):
     """
     Compile the program using the gnu compilers (gfortran and gcc)
 
@@ -297,8 +957,10 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
     if sys.platform == 'win32':
         shellflg = True
 
-    # fortran compiler switches
+    # fortran compiler switches.  The capabilities of the compiler are
+    # probed once and cached.
     fc = 'gfortran'
+    fcinfo = get_compiler_info(fc)
     if debug:
         # Debug flags
         compileflags = ['-g',
@@ -310,7 +972,7 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
         # Production version
         compileflags = ['-O2', '-fbacktrace',]
         if not sys.platform == 'win32':
-            lflag = flag_available('-ffpe-summary')
+            lflag = flag_available('-ffpe-summary', fc)
             if lflag:
                 compileflags.append('-ffpe-summary=overflow')
     objext = '.o'
@@ -337,13 +999,14 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
     # Add -D-UF flag for C code if ISO_C_BINDING is not used in Fortran
     # code that is linked to C/C++ code
     # -D_UF defines UNIX naming conventions for mixed language compilation.
-    use_iso_c = get_iso_c(srcfiles)
+    use_iso_c = get_iso_c(srcfiles, graph)
     if not use_iso_c:
         cflags.append('-D_UF')
 
     # build object files
     print('\nCompiling object files...')
     objfiles = []
+    objlist = []
     for srcfile in srcfiles:
         cmdlist = []
         iscfile = False
@@ -366,43 +1029,40 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
         cmdlist.append('-o')
         cmdlist.append(objfile)
 
-        if not iscfile:
+        if iscfile:
+            # write the headers the file includes to a depfile that is
+            # read into the build database
+            cmdlist.append('-MMD')
+            cmdlist.append('-MF')
+            cmdlist.append(os.path.join(objdir_temp, srcname + '.d'))
+        else:
             # put object files in objdir_temp
             cmdlist.append('-I' + objdir_temp)
             # put module files in moddir_temp
-            cmdlist.append('-J' + moddir_temp)
-
-        # If expedited, then check if object file is out of date (if exists).
-        # No need to compile if object file is newer.
-        compilefile = True
-        if expedite:
-            if not out_of_date(srcfile, objfile):
-                compilefile = False
-
-        # Compile
-        if compilefile:
-            s = ''
-            for c in cmdlist:
-                s += c + ' '
-            print(s)
-            if not dryrun:
-                #subprocess.check_call(cmdlist, shell=shellflg)
-                proc = subprocess.Popen(cmdlist, shell=shellflg,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.STDOUT)
-                stdout_data, stderr_data = proc.communicate()
-                if proc.returncode != 0:
-                    msg = '{} failed, '.format(cmdlist) + \
-                          'status code {} '.format(proc.returncode) + \
-                          'stdout {} '.format(stdout_data) + \
-                          'stderr {}'.format(stderr_data)
-                    print(msg)
-                    return proc.returncode
+            cmdlist.append(fcinfo['moddirflag'] + moddir_temp)
+
+        # Add to the list of object files to build
+        objlist.append((srcfile, objfile, cmdlist))
 
         # Save the name of the object file so that they can all be linked
         # at the end
         objfiles.append(objfile)
 
+    # Compile, using the dependency graph to run independent source
+    # files at the same time if more than one job is requested.  If
+    # expedited, only out of date object files and object files that use
+    # modules with a changed interface are compiled.
+    defines = get_defines(fc, compileflags)
+    if builddb is None:
+        builddb = BuildDatabase(os.path.join(objdir_temp, dbname))
+    with phase(trace, 'compile'):
+        returncode = build_objects(objlist, objdir_temp, moddir_temp,
+                                   expedite, dryrun, jobs, shellflg, cache,
+                                   jobserver, trace, defines, graph,
+                                   builddb, invalidated)
+    if returncode != 0:
+        return returncode
+
     # Build the link command and then link
     msg = '\nLinking object files ' + \
           'to make {}...'.format(os.path.basename(target))
@@ -419,29 +1079,31 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
         cmdlist.append(objfile)
     for switch in syslibs:
         cmdlist.append(switch)
-    s = ''
-    for c in cmdlist:
-        s += c + ' '
-    print(s)
-    if not dryrun:
-        #subprocess.check_call(cmdlist, shell=shellflg)
-        proc = subprocess.Popen(cmdlist, shell=shellflg,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-        stdout_data, stderr_data = proc.communicate()
-        if proc.returncode != 0:
-            msg = '{} failed, '.format(cmdlist) + \
-                  'status code {} '.format(proc.returncode) + \
-                  'stdout {} '.format(stdout_data) + \
-                  'stderr {}'.format(stderr_data)
-            print(msg)
-            return proc.returncode
+    returncode = link_objects(cmdlist, target, objfiles, builddb, dryrun,
+                              shellflg, jobserver, trace)
+    if returncode != 0:
+        return returncode
 
     # create makefile
     if makefile:
+        fpth = None
+        if makefile is not True:
+            fpth = makefile
         create_makefile(target, srcdir, srcdir2, objfiles,
                         fc, compileflags, cc, cflags, syslibs,
-                        modules=['-I', '-J'])
+                        modules=['-I', '-J'], srcfiles=srcfiles,
+                        defines=defines, fpth=fpth)
+
+    # create build.ninja
+    if ninja:
+        # imported here because pymake.ninja is also run as a script
+        from .ninja import create_ninja
+        fpth = None
+        if ninja is not True:
+            fpth = ninja
+        create_ninja(target, srcdir, srcdir2, srcfiles, objfiles,
+                     fc, compileflags, cc, cflags, syslibs,
+                     modules=['-I', '-J'], fpth=fpth)
 
     # return
     return 0
@@ -450,12 +1112,16 @@ def compile_with_gnu(srcfiles, target, cc, objdir_temp, moddir_temp,
 def compile_with_mac_ifort(srcfiles, target, cc,
                            objdir_temp, moddir_temp,
                            expedite, dryrun, double, debug, fflags,
-                           srcdir, srcdir2, makefile):
+                           srcdir, srcdir2, makefile, jobs=1, cache=None,
+                           jobserver=None, trace=None, ninja=False,
+                           graph=None, builddb=None, invalidated=None):
     """
     Make target on Mac OSX
     """
-    # fortran compiler switches
+    # fortran compiler switches.  The capabilities of the compiler are
+    # probed once and cached.
     fc = 'ifort'
+    fcinfo = get_compiler_info(fc)
     if debug:
         compileflags = [
             '-O0',
@@ -491,13 +1157,14 @@ def compile_with_mac_ifort(srcfiles, target, cc,
     # Add -D-UF flag for C code if ISO_C_BINDING is not used in Fortran
     # code that is linked to C/C++ code
     # -D_UF defines UNIX naming conventions for mixed language compilation.
-    use_iso_c = get_iso_c(srcfiles)
+    use_iso_c = get_iso_c(srcfiles, graph)
     if not use_iso_c:
         cflags.append('-D_UF')
 
     # build object files
     print('\nCompiling object files...')
     objfiles = []
+    objlist = []
     for srcfile in srcfiles:
         cmdlist = []
         if srcfile.endswith('.c') or srcfile.endswith('.cpp'):  # mja
@@ -508,8 +1175,8 @@ def compile_with_mac_ifort(srcfiles, target, cc,
             cmdlist.append(fc)
 
             # put module files in moddir_temp
-            cmdlist.append('-module')
-            cmdlist.append('./' + moddir_temp + '/')
+            cmdlist.append(fcinfo['moddirflag'])
+            cmdlist.append(os.path.join(moddir_temp, ''))
 
             for switch in compileflags:
                 cmdlist.append(switch)
@@ -524,38 +1191,29 @@ def compile_with_mac_ifort(srcfiles, target, cc,
         cmdlist.append('-o')
         cmdlist.append(objfile)
 
-        # If expedited, then check if object file is out of date (if exists).
-        # No need to compile if object file is newer.
-        compilefile = True
-        if expedite:
-            if not out_of_date(srcfile, objfile):
-                compilefile = False
-
-        # Compile
-        if compilefile:
-            s = ''
-            for c in cmdlist:
-                s += c + ' '
-            print(s)
-
-            if not dryrun:
-                #subprocess.check_call(cmdlist)
-                proc = subprocess.Popen(cmdlist,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.STDOUT)
-                stdout_data, stderr_data = proc.communicate()
-                if proc.returncode != 0:
-                    msg = '{} failed, '.format(cmdlist) + \
-                          'status code {} '.format(proc.returncode) + \
-                          'stdout {} '.format(stdout_data) + \
-                          'stderr {}'.format(stderr_data)
-                    print(msg)
-                    return proc.returncode
+        # Add to the list of object files to build
+        objlist.append((srcfile, objfile, cmdlist))
 
         # Save the name of the object file so that they can all be linked
         # at the end
         objfiles.append(objfile)
 
+    # Compile, using the dependency graph to run independent source
+    # files at the same time if more than one job is requested.  If
+    # expedited, only out of date object files and object files that use
+    # modules with a changed interface are compiled.
+    defines = get_defines(fc, compileflags)
+    if builddb is None:
+        builddb = BuildDatabase(os.path.join(objdir_temp, dbname))
+    with phase(trace, 'compile'):
+        returncode = build_objects(objlist, objdir_temp, moddir_temp,
+                                   expedite, dryrun, jobs, cache=cache,
+                                   jobserver=jobserver, trace=trace,
+                                   defines=defines, graph=graph,
+                                   builddb=builddb, invalidated=invalidated)
+    if returncode != 0:
+        return returncode
+
     # Build the link command and then link
     print(('\nLinking object files to make {0}...'.format(os.path.basename(target))))
     cmd = fc + ' '
@@ -570,29 +1228,31 @@ def compile_with_mac_ifort(srcfiles, target, cc,
         cmdlist.append(objfile)
     for switch in syslibs:
         cmdlist.append(switch)
-    if not dryrun:
-        s = ''
-        for c in cmdlist:
-            s += c + ' '
-        print(s)
-        #subprocess.check_call(cmdlist)
-        proc = subprocess.Popen(cmdlist,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-        stdout_data, stderr_data = proc.communicate()
-        if proc.returncode != 0:
-            msg = '{} failed, '.format(cmdlist) + \
-                  'status code {} '.format(proc.returncode) + \
-                  'stdout {} '.format(stdout_data) + \
-                  'stderr {}'.format(stderr_data)
-            print(msg)
-            return proc.returncode
+    returncode = link_objects(cmdlist, target, objfiles, builddb, dryrun,
+                              jobserver=jobserver, trace=trace)
+    if returncode != 0:
+        return returncode
 
     # create makefile
     if makefile:
+        fpth = None
+        if makefile is not True:
+            fpth = makefile
         create_makefile(target, srcdir, srcdir2, objfiles,
                         fc, compileflags, cc, cflags, syslibs,
-                        modules=['-module '])
+                        modules=['-module '], srcfiles=srcfiles,
+                        defines=defines, fpth=fpth)
+
+    # create build.ninja
+    if ninja:
+        # imported here because pymake.ninja is also run as a script
+        from .ninja import create_ninja
+        fpth = None
+        if ninja is not True:
+            fpth = ninja
+        create_ninja(target, srcdir, srcdir2, srcfiles, objfiles,
+                     fc, compileflags, cc, cflags, syslibs,
+                     modules=['-module '], fpth=fpth)
 
     # return
     return 0
@@ -614,6 +1274,9 @@ def compile_with_ifort(srcfiles, target, cc, objdir_temp, moddir_temp,
 
     fc = 'ifort.exe'
     cc = 'cl.exe'
+    fcinfo = get_compiler_info(fc)
+    if fcinfo['version'] is not None:
+        print('using {}'.format(fcinfo['version']))
     cflags = ['-nologo', '-c']
     fflags = ['-heap-arrays:0', '-fpe:0', '-traceback', '-nologo']
     if debug:
@@ -630,7 +1293,7 @@ def compile_with_ifort(srcfiles, target, cc, objdir_temp, moddir_temp,
         for fflag in t:
             fflags.append('-'+fflag)
     objext = '.obj'
-    batchfile = 'compile.bat'
+    batchfile = os.path.join(os.path.dirname(objdir_temp), 'compile.bat')
     if os.path.isfile(batchfile):
         try:
             os.remove(batchfile)
@@ -731,9 +1394,28 @@ def makebatch(batchfile, fc, cc, compileflags, cflags, srcfiles, target, arch,
 
 def create_makefile(target, srcdir, srcdir2, objfiles,
                     fc, fflags, cc, cflags, syslibs,
-                    objext='.o', modules=['-I', '-J']):
+                    objext='.o', modules=['-I', '-J'], srcfiles=None,
+                    defines=None, fpth=None):
+    """
+    Write a makefile for target to fpth or, if fpth is None, to makefile
+    in the build directory that contains the object directory, so that
+    builds of different targets do not overwrite each other's makefiles.
+    The paths in the makefile are relative to the current directory, and
+    it is run from there with make -f fpth.  If srcfiles, the list of
+    source files for objfiles, is not None, each object file depends on
+    the module and submodule files it reads and on the fortran files it
+    includes, and each module file depends on the object file that writes
+    it, so the makefile can be run with any number of jobs.  c/c++
+    dependencies are read from the depfiles written by the compiler.
+    defines is used to evaluate the cpp conditionals in the source files.
+
+    """
     # open makefile
-    f = open('makefile', 'w')
+    if fpth is None:
+        builddir = os.path.dirname(os.path.dirname(objfiles[0]))
+        fpth = os.path.join(builddir, 'makefile')
+    print('\nWriting {}'.format(fpth))
+    f = open(fpth, 'w')
 
     # write header for the make file
     f.write('# makefile created on {}\n'.format(datetime.datetime.now()) +
@@ -848,10 +1530,13 @@ def create_makefile(target, srcdir, srcdir2, objfiles,
     for tc in cfiles:
         f.write('$(OBJDIR)/%.o : %{}\n'.format(tc))
         f.write('\t@mkdir -p $(@D)\n')
-        line = '\t$(CC) $(CFLAGS) -c $< -o $@'
+        line = '\t$(CC) $(CFLAGS) -MMD -MP -c $< -o $@'
         f.write('{}\n'.format(line))
         f.write('\n')
 
+    if srcfiles is not None:
+        write_makefile_dependencies(f, srcfiles, objfiles, defines)
+
     f.write('# Clean the object and module files and the executable\n')
     f.write('.PHONY : clean\n' +
             'clean : \n' +
@@ -869,14 +1554,90 @@ def create_makefile(target, srcdir, srcdir2, objfiles,
     f.close()
 
 
+def write_makefile_dependencies(f, srcfiles, objfiles, defines=None):
+    """
+    Write the rules for the dependencies of the object files to the open
+    makefile f.  An object file depends on the module and submodule files
+    it reads, or on the object file of a source file it depends on that
+    does not write module files, and on the fortran files it includes.  A
+    module file depends on the object file that writes it.  The compilers
+    do not rewrite a module file whose interface did not change, so the
+    files that read it are not recompiled.
+
+    """
+    objects = dict(zip(srcfiles, ['$(OBJDIR)/' + os.path.basename(objfile)
+                                  for objfile in objfiles]))
+    nodelist = get_source_nodelist(srcfiles, defines)
+    index = scan_files(srcfiles, defines=defines)
+
+    # module files and the object files that write them
+    producers = set()
+    lines = []
+    for node in nodelist:
+        needs = get_module_needs(node.name, index[node.name], defines)
+        prereqs = []
+        for dep in node.dependencies:
+            modfiles = ['$(OBJDIR)/' + fname
+                        for key, fname in get_module_files(dep)
+                        if key in needs]
+            for fpth in modfiles:
+                producers.add((fpth, objects[dep.name]))
+            if len(modfiles) == 0:
+                modfiles = [objects[dep.name]]
+            for fpth in modfiles:
+                if fpth not in prereqs:
+                    prereqs.append(fpth)
+        if not is_c_file(node.name):
+            for fpth in get_included_files(node.name, defines):
+                if os.path.isfile(fpth) and \
+                        os.path.basename(fpth) not in prereqs:
+                    prereqs.append(os.path.basename(fpth))
+        if len(prereqs) > 0:
+            lines.append('{} : {}\n'.format(objects[node.name],
+                                            ' '.join(prereqs)))
+
+    f.write('# Define the module files written by each object file\n')
+    for fpth, objfile in sorted(producers):
+        f.write('{} : {}\n'.format(fpth, objfile))
+        f.write('\t@true\n')
+    f.write('\n')
+
+    f.write('# Define the module files and include files ' +
+            'used by each object file\n')
+    for line in lines:
+        f.write(line)
+    f.write('\n')
+
+    f.write('# Include the c/c++ header dependencies\n')
+    f.write('-include $(OBJECTS:.o=.d)\n')
+    f.write('\n')
+    return
+
+
 def main(srcdir, target, fc, cc, makeclean=True, expedite=False,
          dryrun=False, double=False, debug=False,
          include_subdirs=False, fflags=None, arch='intel64',
-         makefile=False, srcdir2=None):
+         makefile=False, srcdir2=None, jobs=1, cachedir=None,
+         cachesize=2048, staging='copy', builddir=None, jobserver=None,
+         trace=None, prune=False, ninja=False, watch=False, force=False):
     '''
-    Main part of program
+    Main part of program.  If watch is True, or the number of rebuilds
+    after which to stop, the target is rebuilt each time a file in the
+    source directories changes after it has been built.  Unless a dry
+    run, a makefile, a ninja build file, or watch is requested, nothing is
+    done if the target was built from the same source files with the same
+    compilers, arguments, and version of pymake and has not changed since
+    (see pymake.manifest) and, if makeclean is False, the object files of
+    the previous build have been kept.  If force is True, every source
+    file is compiled and the target is linked again even if it is up to
+    date.
 
     '''
+    # set up the build trace
+    buildtrace = None
+    if trace is not None:
+        buildtrace = BuildTrace(os.path.basename(target))
+
     # initialize success
     success = 0
 
@@ -895,47 +1656,175 @@ def main(srcdir, target, fc, cc, makeclean=True, expedite=False,
         os.makedirs(pth)
 
     # initialize
-    srcdir_temp, objdir_temp, moddir_temp = initialize(srcdir, target,
-                                                       srcdir2)
+    if builddir is None:
+        builddir = get_builddir(target)
+    print('build directory: {0}'.format(builddir))
+
+    # return without staging or compiling anything if the target is up to
+    # date
+    manifest = None
+    if not (dryrun or makefile or ninja or watch):
+        with phase(buildtrace, 'check'):
+            manifest = TargetManifest(target)
+            request = get_request(srcdir, fc, cc, double, debug,
+                                  include_subdirs, fflags, arch, srcdir2,
+                                  staging, prune)
+            inputs = manifest.snapshot([srcdir, srcdir2],
+                                       [builddir, target,
+                                        os.path.join('.', buildroot)])
+            uptodate = not force and manifest.up_to_date(request, inputs)
+            # the object files must be kept unless they are cleaned up
+            if not makeclean:
+                uptodate = uptodate and \
+                    os.path.isfile(os.path.join(builddir, 'obj_temp', dbname))
+        if uptodate:
+            print('{} is up to date'.format(target))
+            if buildtrace is not None:
+                buildtrace.write(trace)
+            return 0
+
+    with phase(buildtrace, 'stage'):
+        srcdir_temp, objdir_temp, moddir_temp = initialize(srcdir, target,
+                                                           srcdir2, staging,
+                                                           builddir)
 
     # get ordered list of files to compile
-    srcfiles = get_ordered_srcfiles(srcdir_temp, include_subdirs)
+    srcdirs = srcdir_temp
+    if staging == 'none' and srcdir2 is not None and include_subdirs:
+        srcdirs = [srcdir_temp, srcdir2]
+    with phase(buildtrace, 'scan'):
+        # evaluate cpp conditionals with the macros the compiler predefines
+        # for the optimization level and the flags of the build
+        flags = []
+        if not debug:
+            flags.append('-O2')
+        if fflags is not None:
+            flags += ['-' + fflag for fflag in fflags.split()]
+        defines = get_defines(fc, flags)
+        srcfiles = get_ordered_srcfiles(srcdirs, include_subdirs, defines)
+
+        # only compile the source files reachable from the program
+        if prune:
+            program = None
+            if prune is not True:
+                program = prune
+            nfiles = len(srcfiles)
+            srcfiles = get_reachable_srcfiles(srcfiles, program, defines)
+            print('compiling {} of {} source files'.format(len(srcfiles),
+                                                           nfiles) +
+                  ' reachable from the program')
+
+    # forget the previous build of the target so that everything is
+    # compiled and linked again
+    builddb = None
+    if force:
+        expedite = False
+        builddb = BuildDatabase(os.path.join(objdir_temp, dbname))
+        builddb.remove(target)
+
+    # set up the object cache
+    cache = None
+    if cachedir is not None:
+        cache = ObjectCache(cachedir, cachesize)
 
     # compile with gfortran or ifort
     winifort = False
     if fc == 'gfortran':
         objext = '.o'
-        create_openspec(srcdir_temp)
+        if staging != 'none':
+            create_openspec(srcdir_temp)
+        else:
+            warn_openspec(srcdirs)
         success = compile_with_gnu(srcfiles, target, cc,
                                    objdir_temp, moddir_temp,
                                    expedite, dryrun, double, debug, fflags,
-                                   srcdir, srcdir2, makefile)
+                                   srcdir, srcdir2, makefile, jobs, cache,
+                                   jobserver, buildtrace, ninja,
+                                   builddb=builddb)
     elif fc == 'ifort':
         platform = sys.platform
         if platform.lower() == 'darwin':
-            create_openspec(srcdir_temp)
+            if staging != 'none':
+                create_openspec(srcdir_temp)
+            else:
+                warn_openspec(srcdirs)
             objext = '.o'
             success = compile_with_mac_ifort(srcfiles, target, cc,
                                              objdir_temp, moddir_temp,
                                              expedite, dryrun, double,
                                              debug, fflags,
-                                             srcdir, srcdir2, makefile)
+                                             srcdir, srcdir2, makefile, jobs,
+                                             cache, jobserver, buildtrace,
+                                             ninja, builddb=builddb)
         else:
             winifort = True
             objext = '.obj'
             cc = 'cl.exe'
-            success = compile_with_ifort(srcfiles, target, cc,
-                                         objdir_temp, moddir_temp,
-                                         expedite, dryrun, double, debug,
-                                         fflags, arch,
-                                         srcdir, srcdir2, makefile)
+            with phase(buildtrace, 'compile'):
+                success = compile_with_ifort(srcfiles, target, cc,
+                                             objdir_temp, moddir_temp,
+                                             expedite, dryrun, double, debug,
+                                             fflags, arch,
+                                             srcdir, srcdir2, makefile)
     else:
         raise Exception('Unsupported compiler')
 
+    # do not leave a target that is older than the source files
+    if success != 0:
+        try:
+            os.remove(target)
+        except:
+            pass
+
+    # record the inputs of the target
+    if manifest is not None:
+        if success == 0:
+            manifest.update(request, inputs)
+        else:
+            manifest.remove()
+
+    # rebuild when the source files change
+    if watch and not winifort:
+        # imported here because pymake.watch imports pymake.pymake
+        from .watch import WatchBuild, get_watcher
+
+        def build(graph, builddb, invalidated):
+            rebuild = graph.toposort()
+            if prune:
+                rebuild = get_reachable_srcfiles(rebuild, program, defines)
+            if fc == 'gfortran':
+                compile_function = compile_with_gnu
+            else:
+                compile_function = compile_with_mac_ifort
+            return compile_function(rebuild, target, cc, objdir_temp,
+                                    moddir_temp, True, dryrun, double,
+                                    debug, fflags, srcdir, srcdir2, False,
+                                    jobs, cache, jobserver, graph=graph,
+                                    builddb=builddb, invalidated=invalidated)
+
+        watchbuild = WatchBuild(build, srcdir, srcdir2, srcdirs, objdir_temp,
+                                staging, include_subdirs, defines)
+        dirs = [srcdir]
+        if srcdir2 is not None:
+            dirs.append(srcdir2)
+        watcher = get_watcher(dirs, include_subdirs, [builddir, target])
+        maxbuilds = None
+        if watch is not True:
+            maxbuilds = watch
+        success = watchbuild.run(watcher, maxbuilds)
+    elif watch:
+        print('--watch does not work yet for ifort on Windows')
+
     # Clean it up
     if makeclean:
-        clean(srcdir_temp, objdir_temp, moddir_temp, objext, winifort)
-        
+        with phase(buildtrace, 'cleanup'):
+            clean(srcdir_temp, objdir_temp, moddir_temp, objext, winifort,
+                  staging)
+
+    # write the build trace
+    if buildtrace is not None:
+        buildtrace.write(trace)
+
     return success
 
 
@@ -948,4 +1837,6 @@ if __name__ == "__main__":
     main(args.srcdir, args.target, args.fc, args.cc, args.makeclean,
          args.expedite, args.dryrun, args.double, args.debug,
          args.subdirs, args.fflags, args.arch, args.makefile,
-         args.commonsrc)
+         args.commonsrc, args.jobs, args.cachedir, args.cachesize,
+         args.staging, args.builddir, None, args.trace, args.prune,
+         args.ninja, args.watch, args.force)
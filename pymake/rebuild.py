@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+"""
+Impact analysis.  Print the source files that must be recompiled if one
+or more source files change and the estimated cost of recompiling them.
+The cost is estimated from the compile times recorded by earlier builds
+of the target or, if no compile times have been recorded, from the size
+of the source files.
+"""
+from __future__ import print_function
+
+import os
+import argparse
+
+from .pymake import get_srcfiles, get_builddir
+from .dag import get_source_nodelist, get_dag
+from .schedule import CompileHistory, get_history_file, get_weights
+
+
+def get_durations(srcdir, target, builddir=None):
+    """
+    Return a dictionary with the compile times recorded by earlier builds
+    of target for the source files in srcdir.
+
+    """
+    if builddir is None:
+        builddir = get_builddir(target)
+    history = CompileHistory(get_history_file(os.path.join(builddir,
+                                                           'obj_temp')))
+    roots = [os.path.normpath(os.path.join(builddir, 'src_temp')),
+             os.path.normpath(srcdir)]
+    durations = {}
+    for srcfile, duration in history.durations.items():
+        srcfile = os.path.normpath(srcfile)
+        for root in roots:
+            rel = os.path.relpath(srcfile, root)
+            if not rel.startswith(os.pardir):
+                fpth = os.path.normpath(os.path.join(srcdir, rel))
+                durations[fpth] = duration
+                break
+    return durations
+
+
+def get_rebuild_set(srcdir, changed, target=None, include_subdirs=False,
+                    builddir=None):
+    """
+    Determine the source files that must be recompiled if the source files
+    in changed are modified.
+
+    Parameters
+    ----------
+    srcdir : str
+        source directory
+    changed : list of str
+        paths or names of the changed source files
+    target : str
+        target used to find the recorded compile times (optional)
+    include_subdirs : bool
+        include source files in srcdir subdirectories
+    builddir : str
+        build directory of target (default is the default build directory
+        of target)
+
+    Returns
+    -------
+    rebuild : list of tuple
+        (srcfile, estimated cost) for the source files to recompile in
+        dependency order
+    critical_path : float
+        estimated cost of the longest chain of source files to recompile
+    timed : bool
+        True if the costs are compile times in seconds and False if they
+        are estimated from the size of the source files
+
+    """
+    ffiles, cfiles = get_srcfiles(srcdir, include_subdirs)
+    srcfiles = [os.path.normpath(f) for f in ffiles + cfiles]
+    dag = get_dag(get_source_nodelist(srcfiles))
+    nodes = {}
+    for node in dag.nodelist:
+        nodes[node.name] = node
+
+    # find the changed source files by path or by name
+    start = []
+    for name in changed:
+        fpth = os.path.normpath(name)
+        if fpth not in nodes:
+            matches = [f for f in srcfiles if os.path.basename(f) == name]
+            if len(matches) == 0:
+                raise Exception('{} is not a source file in '.format(name) +
+                                '{}'.format(srcdir))
+            fpth = matches[0]
+        start.append(nodes[fpth])
+
+    durations = {}
+    if target is not None:
+        durations = get_durations(srcdir, target, builddir)
+    weights = get_weights(srcfiles, durations)
+    rebuild = [(node.name, weights[node.name])
+               for node in dag.get_rebuild_set(start)]
+
+    # longest chain of source files that are recompiled
+    names = set([name for name, cost in rebuild])
+    length, path = dag.critical_path(dict([(f, weights[f] if f in names
+                                            else 0.) for f in srcfiles]))
+    return rebuild, length, len(durations) > 0
+
+
+def parser():
+    '''
+    Construct the parser and return argument values
+    '''
+    parser = argparse.ArgumentParser(description='''Print the source files
+                                     that must be recompiled if one or more
+                                     source files change and the estimated
+                                     cost of recompiling them.''')
+    parser.add_argument('srcdir', help='Location of source directory')
+    parser.add_argument('files', nargs='+',
+                        help='Paths or names of the changed source files')
+    parser.add_argument('-t', '--target',
+                        help='''Target whose recorded compile times are used
+                        to estimate the cost.''',
+                        default=None)
+    parser.add_argument('-sd', '--subdirs',
+                        help='''Include source files in srcdir
+                        subdirectories.''',
+                        action='store_true')
+    parser.add_argument('-bd', '--builddir',
+                        help='''Build directory of the target (default is
+                        the default build directory of the target).''',
+                        default=None)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    # get the arguments
+    args = parser()
+
+    rebuild, length, timed = get_rebuild_set(args.srcdir, args.files,
+                                             args.target, args.subdirs,
+                                             args.builddir)
+    if timed:
+        fmt = '{:10.2f} s  {}'
+    else:
+        fmt = '{:10.0f} B  {}'
+    for srcfile, cost in rebuild:
+        print(fmt.format(cost, srcfile))
+    total = sum([cost for srcfile, cost in rebuild])
+    print('{} source files to recompile'.format(len(rebuild)))
+    if timed:
+        print('estimated compile time {:.2f} s '.format(total) +
+              '({:.2f} s on the critical path)'.format(length))
+    else:
+        print('no recorded compile times, the cost is the size of the ' +
+              'source files: {:.0f} bytes '.format(total) +
+              '({:.0f} bytes on the critical path)'.format(length))
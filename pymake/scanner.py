@@ -0,0 +1,698 @@
+"""
+Source scanner.  Each source file is scanned once with compiled regular
+expressions over the memory mapped bytes of the file, and the modules it
+defines and uses, the files it includes, whether it uses iso_c_binding,
+and the program units it defines are extracted in one pass.  Files are
+scanned on a pool of threads, so the dependency graph builders, get_iso_c,
+and the build database share one scan of each file.
+
+Fortran comment lines are removed and continued lines are joined before
+the statements are matched, using the fixed form rules for .f, .for,
+.fpp, and .ftn files and the free form rules for other files.  Submodules
+are recorded with the name of their ancestor module (ANCESTOR@NAME),
+which is also the name of the .smod file compilers write for them.
+
+Fortran files with cpp conditionals (#if, #ifdef, and #ifndef) can be
+scanned for a set of macros, such as the macros predefined by the
+compiler and the -D flags of a build, so that modules used in inactive
+branches are not dependencies.  Conditionals are only evaluated for the
+files the compiler runs cpp on, which are the files with an upper case
+extension or a .fpp extension or, if the macros were determined for flags
+that include -cpp or -fpp, all fortran files.  The compiler keeps the
+lines of both branches of the other files, so they are all scanned.  The
+facts for each set of macros are stored with the facts for the file.
+
+The facts for each file are also stored in the user cache directory, in
+one file for each source directory, with the inode, size, and
+modification time and the hash of the contents of the file.  A file whose
+inode, size, and modification time have not changed is not read again,
+and a file that was copied or touched but whose contents have not changed
+is hashed but not scanned again.
+
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import json
+import mmap
+import hashlib
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+from .compilers import get_cachedir
+from .utils import write_json
+
+# version of the scan results.  It must be increased when the facts
+# extracted by scan_data change so that stored results are not used.
+scanversion = 5
+
+# stored scan results for each source directory used in this process
+_shards = {}
+_lock = threading.Lock()
+
+# fortran source forms
+f_fixed_ext = ('.f', '.for', '.fpp', '.ftn')
+
+# fortran source files that are preprocessed with cpp without -cpp (the
+# case of the extension matters)
+f_cpp_ext = ('.F', '.FOR', '.FTN', '.F90', '.F95', '.F03', '.F08', '.fpp',
+             '.FPP')
+f_comment = re.compile(br'^[ \t]*![^\n]*\n', re.MULTILINE)
+f_free_continuation = re.compile(br'&[ \t]*(?:![^\n]*)?\r?\n'
+                                 br'(?:[ \t]*\r?\n)*[ \t]*&?')
+f_fixed_continuation = re.compile(br'\r?\n(?:(?:[c*!][^\n]*|[ \t]*)\r?\n)*'
+                                  br'(?: {5}[^ 0\r\n]|\t[1-9])',
+                                  re.IGNORECASE)
+
+# fortran statements
+f_module = re.compile(br'^[ \t]*module[ \t]+(?!(?:procedure|function|'
+                      br'subroutine|pure|impure|elemental|recursive|'
+                      br'integer|real|double|complex|logical|character|'
+                      br'type|class)\b)'
+                      br'([a-z]\w*)',
+                      re.IGNORECASE | re.MULTILINE)
+f_submodule = re.compile(br'^[ \t]*submodule[ \t]*\([ \t]*([a-z]\w*)[ \t]*'
+                         br'(?::[ \t]*([a-z]\w*)[ \t]*)?\)[ \t]*([a-z]\w*)',
+                         re.IGNORECASE | re.MULTILINE)
+f_use = re.compile(br'(?:^|;)[ \t]*use\b[ \t]*'
+                   br'(?:,[ \t]*(?:non_)?intrinsic[ \t]*)?'
+                   br'(?:::)?[ \t]*([a-z]\w*)',
+                   re.IGNORECASE | re.MULTILINE)
+f_include = re.compile(br'^[ \t]*include[ \t]+[\'"]([^\'"]+)[\'"]',
+                       re.IGNORECASE | re.MULTILINE)
+f_program = re.compile(br'^[ \t]*program[ \t]+([a-z]\w*)',
+                       re.IGNORECASE | re.MULTILINE)
+f_procedure = re.compile(br'^[ \t]*(?:(?:pure|impure|elemental|recursive|'
+                         br'integer|real|double[ \t]*precision|complex|'
+                         br'logical|character|type[ \t]*\([^)]*\))'
+                         br'(?:[ \t]*\*[ \t]*\d+|[ \t]*\([^)]*\))?[ \t]+)*'
+                         br'(?:subroutine|function|entry)[ \t]+([a-z]\w*)',
+                         re.IGNORECASE | re.MULTILINE)
+f_blockdata = re.compile(br'^[ \t]*block[ \t]*data\b',
+                         re.IGNORECASE | re.MULTILINE)
+f_call = re.compile(br'\bcall[ \t]+([a-z]\w*)', re.IGNORECASE)
+f_reference = re.compile(br'\b([a-z]\w*)[ \t]*\(', re.IGNORECASE)
+# names in argument lists, which can be procedures passed as arguments
+f_argument = re.compile(br'[(,][ \t]*([a-z]\w*)[ \t]*(?=[,)])',
+                        re.IGNORECASE)
+f_external = re.compile(br'^[ \t]*(?:external\b|[^!\n]*,[ \t]*external\b'
+                        br'[^:\n]*::)[ \t]*(?:::)?[ \t]*'
+                        br'([a-z]\w*(?:[ \t]*,[ \t]*[a-z]\w*)*)',
+                        re.IGNORECASE | re.MULTILINE)
+
+# c/c++ include statements
+c_include = re.compile(br'^[ \t]*#[ \t]*include[ \t]*"([^"]+)"',
+                       re.MULTILINE)
+c_sysinclude = re.compile(br'^[ \t]*#[ \t]*include[ \t]*<([^>]+)>',
+                          re.MULTILINE)
+
+# cpp directives
+cpp_conditional = re.compile(br'^[ \t]*#[ \t]*if', re.MULTILINE)
+cpp_directive = re.compile(br'^[ \t]*#[ \t]*([a-z]+)(.*)')
+cpp_token = re.compile(r'\s*(?:(0x[0-9a-f]+|\d+)[ul]*|([a-z_]\w*)|'
+                       r'(&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%()<>!~&|^]))',
+                       re.IGNORECASE)
+cpp_binary = {'||': 1, '&&': 2, '|': 3, '^': 4, '&': 5, '==': 6, '!=': 6,
+              '<': 7, '<=': 7, '>': 7, '>=': 7, '<<': 8, '>>': 8,
+              '+': 9, '-': 9, '*': 10, '/': 10, '%': 10}
+
+
+def is_c_file(srcfile):
+    """
+    Return True if srcfile is a c or c++ source file.
+
+    """
+    return srcfile.lower().endswith('.c') or srcfile.lower().endswith('.cpp')
+
+
+def is_fixed_form(srcfile):
+    """
+    Return True if srcfile is a fixed form fortran source file.
+
+    """
+    return os.path.splitext(srcfile)[1].lower() in f_fixed_ext
+
+
+def is_preprocessed(srcfile, defines):
+    """
+    Return True if the cpp conditionals in srcfile are evaluated when it is
+    compiled with the macros in defines: srcfile is a fortran source file
+    with an extension that the compiler preprocesses or defines were
+    determined for flags that include -cpp or -fpp (see
+    compilers.get_defines).
+
+    """
+    if is_c_file(srcfile):
+        return False
+    return getattr(defines, 'cpp', False) or \
+        os.path.splitext(srcfile)[1] in f_cpp_ext
+
+
+def normalize_fortran(data, fixed=False):
+    """
+    Return the contents of a fortran source file with comment lines
+    removed and continued lines joined, so that each statement is on one
+    line.
+
+    """
+    if fixed:
+        return f_fixed_continuation.sub(b' ', data)
+    if data.find(b'&') < 0:
+        return data
+    return f_free_continuation.sub(b' ', f_comment.sub(b'', data))
+
+
+def _cpp_value(expr, defines, depth=0):
+    """
+    Return the integer value of a cpp #if expression.  Names that are not
+    defined are 0.  An Exception is raised if the expression can not be
+    evaluated.
+
+    """
+    if depth > 16:
+        raise Exception('recursive macro in {}'.format(expr))
+    tokens = []
+    pos = 0
+    expr = expr.split('//')[0].split('/*')[0].rstrip()
+    while pos < len(expr):
+        m = cpp_token.match(expr, pos)
+        if m is None:
+            raise Exception('invalid expression {}'.format(expr))
+        if m.group(1) is not None:
+            tokens.append(int(m.group(1), 0))
+        else:
+            tokens.append(m.group(2) or m.group(3))
+        pos = m.end()
+    tokens.append(None)
+    index = [0]
+
+    def next_token():
+        token = tokens[index[0]]
+        index[0] += 1
+        return token
+
+    def unary():
+        token = next_token()
+        if token == 'defined':
+            token = next_token()
+            if token == '(':
+                token = next_token()
+                if next_token() != ')':
+                    raise Exception('invalid defined in {}'.format(expr))
+            return int(token in defines)
+        elif token == '!':
+            return int(not unary())
+        elif token == '-':
+            return -unary()
+        elif token == '+':
+            return unary()
+        elif token == '~':
+            return ~unary()
+        elif token == '(':
+            value = binary(1)
+            if next_token() != ')':
+                raise Exception('unbalanced parenthesis in {}'.format(expr))
+            return value
+        elif isinstance(token, int):
+            return token
+        elif token is not None and (token[0].isalpha() or token[0] == '_'):
+            value = defines.get(token)
+            if value is None:
+                return 0
+            return _cpp_value(value, defines, depth + 1)
+        raise Exception('invalid expression {}'.format(expr))
+
+    def binary(precedence):
+        left = unary()
+        while cpp_binary.get(tokens[index[0]], 0) >= precedence:
+            op = next_token()
+            right = binary(cpp_binary[op] + 1)
+            if op == '||':
+                left = int(bool(left) or bool(right))
+            elif op == '&&':
+                left = int(bool(left) and bool(right))
+            elif op == '/':
+                left = int(float(left) / right)
+            elif op == '%':
+                left = left - right * int(float(left) / right)
+            else:
+                left = {'|': lambda a, b: a | b,
+                        '^': lambda a, b: a ^ b,
+                        '&': lambda a, b: a & b,
+                        '==': lambda a, b: int(a == b),
+                        '!=': lambda a, b: int(a != b),
+                        '<': lambda a, b: int(a < b),
+                        '<=': lambda a, b: int(a <= b),
+                        '>': lambda a, b: int(a > b),
+                        '>=': lambda a, b: int(a >= b),
+                        '<<': lambda a, b: a << b,
+                        '>>': lambda a, b: a >> b,
+                        '+': lambda a, b: a + b,
+                        '-': lambda a, b: a - b,
+                        '*': lambda a, b: a * b}[op](left, right)
+        return left
+
+    value = binary(1)
+    if tokens[index[0]] is not None:
+        raise Exception('invalid expression {}'.format(expr))
+    return value
+
+
+def eval_condition(expr, defines):
+    """
+    Return True if the expression of a cpp #if or #elif directive is true
+    with the macros in defines, a dictionary of macro names and values.
+    Expressions that can not be evaluated are true.
+
+    """
+    try:
+        return _cpp_value(expr, defines) != 0
+    except:
+        return True
+
+
+def preprocess(data, defines):
+    """
+    Return the contents of a source file with the lines in the inactive
+    branches of the cpp conditionals replaced by empty lines.  The
+    conditionals are evaluated with the macros in defines, a dictionary of
+    macro names and values, and the #define and #undef directives in the
+    active lines.  Macros defined in included files are not known.
+
+    """
+    defines = dict(defines)
+    lines = []
+    # (parent branch is active, a branch has been taken) for each open
+    # conditional
+    stack = []
+    active = True
+    for line in data[:].split(b'\n'):
+        m = cpp_directive.match(line)
+        if m is None:
+            lines.append(line if active else b'')
+            continue
+        directive = m.group(1).decode('ascii', 'replace')
+        text = m.group(2).decode('ascii', 'replace').strip()
+        name = text.split('(')[0].split()[0] if text else ''
+        if directive in ('if', 'ifdef', 'ifndef'):
+            if directive == 'ifdef':
+                taken = name in defines
+            elif directive == 'ifndef':
+                taken = name not in defines
+            else:
+                taken = eval_condition(text, defines)
+            stack.append((active, taken))
+            active = active and taken
+        elif directive == 'elif' and len(stack) > 0:
+            parent, taken = stack[-1]
+            branch = not taken and eval_condition(text, defines)
+            stack[-1] = (parent, taken or branch)
+            active = parent and branch
+        elif directive == 'else' and len(stack) > 0:
+            parent, taken = stack[-1]
+            stack[-1] = (parent, True)
+            active = parent and not taken
+        elif directive == 'endif' and len(stack) > 0:
+            active = stack.pop()[0]
+        elif active and directive == 'define' and name:
+            value = text[len(name):].strip()
+            if text[len(name):].startswith('('):
+                # function-like macros are only known to be defined
+                value = '1'
+            defines[name] = value
+        elif active and directive == 'undef':
+            defines.pop(name, None)
+        elif active:
+            lines.append(line)
+            continue
+        lines.append(b'')
+    return b'\n'.join(lines)
+
+
+def get_define_key(defines):
+    """
+    Return the key used to store the facts for a set of macros.
+
+    """
+    h = hashlib.sha1()
+    for name in sorted(defines):
+        h.update('{}={}'.format(name, defines[name]).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _unique(matches, upper=False):
+    names = []
+    for m in matches:
+        name = m.decode('ascii', 'replace')
+        if upper:
+            name = name.upper()
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def scan_data(data, cfile=False, fixed=False):
+    """
+    Return the dictionary of facts for the contents of a source file.
+    data can be bytes or a memory map.  If fixed is True, fortran source
+    is fixed form.  Module, submodule, and program unit names are upper
+    case.
+
+    """
+    info = {'modules': [], 'submodules': [], 'parents': [], 'uses': [],
+            'includes': [], 'sysincludes': [], 'iso_c': False,
+            'programs': [], 'procedures': [], 'references': [],
+            'blockdata': False, 'conditional': False}
+    if cfile:
+        info['includes'] = _unique(c_include.findall(data))
+        info['sysincludes'] = _unique(c_sysinclude.findall(data))
+    else:
+        data = normalize_fortran(data, fixed)
+        info['modules'] = _unique(f_module.findall(data), True)
+        submodules = []
+        parents = []
+        for ancestor, parent, name in f_submodule.findall(data):
+            submodules.append(ancestor + b'@' + name)
+            # a submodule needs its ancestor module and, if it extends
+            # another submodule, the parent submodule
+            parents.append(ancestor)
+            if parent:
+                parents.append(ancestor + b'@' + parent)
+        info['submodules'] = _unique(submodules, True)
+        info['parents'] = _unique(parents, True)
+        info['uses'] = _unique(f_use.findall(data), True)
+        info['includes'] = _unique(f_include.findall(data) +
+                                   c_include.findall(data))
+        info['conditional'] = cpp_conditional.search(data) is not None
+        info['iso_c'] = 'ISO_C_BINDING' in info['uses']
+        info['programs'] = _unique(f_program.findall(data), True)
+        info['procedures'] = _unique(f_procedure.findall(data), True)
+        externals = []
+        for names in f_external.findall(data):
+            externals += re.split(br'[ \t]*,[ \t]*', names.strip())
+        info['references'] = _unique(f_call.findall(data) +
+                                     f_reference.findall(data) +
+                                     f_argument.findall(data) +
+                                     externals, True)
+        info['blockdata'] = f_blockdata.search(data) is not None
+    return info
+
+
+def get_stat_key(srcfile):
+    """
+    Return a key made from the inode, size, and modification time of
+    srcfile or None if the file does not exist.
+
+    """
+    try:
+        st = os.stat(srcfile)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, getattr(st, 'st_mtime_ns', st.st_mtime))
+
+
+def get_shard_file(pth):
+    """
+    Return the path of the file with the stored scan results for the
+    source directory pth.
+
+    """
+    h = hashlib.sha1(pth.encode('utf-8')).hexdigest()
+    return os.path.join(get_cachedir(), 'scans', h + '.json')
+
+
+def _get_shard(pth):
+    """
+    Return the stored scan results for the source directory pth.  Must be
+    called with _lock held.
+
+    """
+    shard = _shards.get(pth)
+    if shard is None:
+        entries = {}
+        try:
+            f = open(get_shard_file(pth), 'r')
+            data = json.load(f)
+            f.close()
+            if data.get('version') == scanversion and \
+                    data.get('directory') == pth:
+                entries = data['entries']
+        except:
+            pass
+        shard = {'entries': entries, 'dirty': False}
+        _shards[pth] = shard
+    return shard
+
+
+def _get_entry(srcfile):
+    pth, fname = os.path.split(os.path.abspath(srcfile))
+    with _lock:
+        return _get_shard(pth)['entries'].get(fname)
+
+
+def _get_scan(srcfile, key):
+    """
+    Return the facts for srcfile from a previous scan if the inode, size,
+    and modification time of the file have not changed or None.
+
+    """
+    if key is None:
+        return None
+    entry = _get_entry(srcfile)
+    if entry is not None and entry['stat'] == list(key):
+        return entry['info']
+    return None
+
+
+def _get_variant(srcfile, dkey):
+    """
+    Return the stored facts for srcfile for the set of macros with the key
+    dkey or None.
+
+    """
+    entry = _get_entry(srcfile)
+    if entry is None:
+        return None
+    return entry.get('variants', {}).get(dkey)
+
+
+def _scan_file(srcfile, key):
+    """
+    Scan srcfile without evaluating cpp conditionals and store the facts.
+
+    """
+    try:
+        f = open(srcfile, 'rb')
+    except:
+        return None
+    entry = _get_entry(srcfile)
+    variants = {}
+    try:
+        if key is not None and key[1] > 0:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+        try:
+            h = hashlib.sha1(data).hexdigest()
+            if entry is not None and entry['hash'] == h:
+                info = entry['info']
+                variants = entry.get('variants', {})
+            else:
+                info = scan_data(data, is_c_file(srcfile),
+                                 is_fixed_form(srcfile))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    finally:
+        f.close()
+    if key is not None:
+        key = list(key)
+    pth, fname = os.path.split(os.path.abspath(srcfile))
+    with _lock:
+        shard = _get_shard(pth)
+        shard['entries'][fname] = {'stat': key, 'hash': h, 'info': info,
+                                   'variants': variants}
+        shard['dirty'] = True
+    return info
+
+
+def _scan_variant(srcfile, defines):
+    """
+    Scan the active lines of srcfile with the macros in defines and store
+    the facts with the facts for srcfile.
+
+    """
+    dkey = get_define_key(defines)
+    info = _get_variant(srcfile, dkey)
+    if info is not None:
+        return info
+    try:
+        f = open(srcfile, 'rb')
+        data = f.read()
+        f.close()
+    except:
+        return None
+    info = scan_data(preprocess(data, defines), is_c_file(srcfile),
+                     is_fixed_form(srcfile))
+    pth, fname = os.path.split(os.path.abspath(srcfile))
+    with _lock:
+        shard = _get_shard(pth)
+        entry = shard['entries'].get(fname)
+        if entry is not None:
+            entry.setdefault('variants', {})[dkey] = info
+            shard['dirty'] = True
+    return info
+
+
+def scan_file(srcfile, defines=None):
+    """
+    Scan a source file and return the dictionary of facts for it: the
+    modules it defines (modules) and uses (uses), the submodules it
+    defines (submodules) and the modules and submodules they extend
+    (parents), the local (includes) and system (sysincludes) files it
+    includes, whether it uses iso_c_binding (iso_c), the programs
+    (programs) and subroutines and functions (procedures) it defines, the
+    names it calls, that are followed by a parenthesis, that are in an
+    argument list, or that are declared EXTERNAL (references), which
+    include the subroutines and functions it references, whether it
+    defines a BLOCK DATA unit (blockdata), and whether it has cpp
+    conditionals (conditional).  If defines, a dictionary of macro names
+    and values, is not None and the compiler preprocesses srcfile (see
+    is_preprocessed), the cpp conditionals are evaluated and only the
+    active lines are scanned; otherwise all of the lines are scanned.  None is
+    returned if the file can not be read.  The stored result is used if
+    the file has not changed.
+
+    """
+    key = get_stat_key(srcfile)
+    info = _get_scan(srcfile, key)
+    if info is None:
+        info = _scan_file(srcfile, key)
+        if info is None:
+            return None
+    if defines is None or not info['conditional'] or \
+            not is_preprocessed(srcfile, defines):
+        return info
+    return _scan_variant(srcfile, defines)
+
+
+def write_scans():
+    """
+    Write the scan results that changed to the user cache directory.
+
+    """
+    with _lock:
+        for pth, shard in _shards.items():
+            if not shard['dirty']:
+                continue
+            write_json(get_shard_file(pth), {'version': scanversion,
+                                              'directory': pth,
+                                              'entries': shard['entries']})
+            shard['dirty'] = False
+    return
+
+
+def scan_files(srcfiles, nthreads=None, defines=None):
+    """
+    Scan a list of source files on a pool of nthreads threads (default is
+    the number of processors) and return a dictionary with the facts for
+    each source file.  The cpp conditionals are evaluated with the macros
+    in defines as described for scan_file.  Only source files that
+    changed since they were last scanned are read and the scan results
+    that changed are written to the user cache directory.  Source files
+    that can not be read are reported and have no facts.
+
+    """
+    index = {}
+    pending = []
+    dkey = None
+    if defines is not None:
+        dkey = get_define_key(defines)
+    for srcfile in srcfiles:
+        info = _get_scan(srcfile, get_stat_key(srcfile))
+        if info is not None and dkey is not None and info['conditional'] \
+                and is_preprocessed(srcfile, defines):
+            info = _get_variant(srcfile, dkey)
+        if info is None:
+            pending.append(srcfile)
+        else:
+            index[srcfile] = info
+
+    if nthreads is None:
+        nthreads = multiprocessing.cpu_count()
+    nthreads = max(1, min(nthreads, len(pending)))
+    if nthreads > 1:
+        pool = ThreadPool(nthreads)
+        try:
+            infos = pool.map(lambda srcfile: scan_file(srcfile, defines),
+                             pending)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        infos = [scan_file(srcfile, defines) for srcfile in pending]
+    for srcfile, info in zip(pending, infos):
+        if info is None:
+            print('scan_files: could not open ' +
+                  '{}'.format(os.path.basename(srcfile)))
+            info = scan_data(b'')
+        index[srcfile] = info
+    if len(pending) > 0:
+        write_scans()
+    return index
+
+
+def get_included_files(srcfile, defines=None):
+    """
+    Return the list of local files included by srcfile.  Include files are
+    looked for in the directory of the file that includes them, and the
+    files included by fortran include files are also returned.  The cpp
+    conditionals are evaluated with the macros in defines as described
+    for scan_file.
+
+    """
+    found = []
+    stack = [srcfile]
+    while len(stack) > 0:
+        fpth = stack.pop()
+        info = scan_file(fpth, defines)
+        if info is None:
+            continue
+        pth = os.path.dirname(fpth)
+        for fname in info['includes']:
+            inc = os.path.join(pth, fname)
+            if inc == srcfile or inc in found:
+                continue
+            found.append(inc)
+            if not is_c_file(srcfile):
+                stack.append(inc)
+    return found
+
+
+def get_uses(srcfile, info=None, defines=None):
+    """
+    Return the list of modules used by a fortran source file, including
+    the modules used in the files it includes.  info is the dictionary of
+    facts for srcfile, if it has already been scanned, and the cpp
+    conditionals are evaluated with the macros in defines as described
+    for scan_file.
+
+    """
+    if info is None:
+        info = scan_file(srcfile, defines)
+        if info is None:
+            return []
+    uses = list(info['uses'])
+    if len(info['includes']) > 0:
+        for inc in get_included_files(srcfile, defines):
+            incinfo = scan_file(inc, defines)
+            if incinfo is None:
+                continue
+            for modulename in incinfo['uses']:
+                if modulename not in uses:
+                    uses.append(modulename)
+    return uses
@@ -0,0 +1,129 @@
+"""
+Critical path scheduling.  The time to compile each source file is
+recorded in a history file in the user cache directory, whatever the
+number of jobs, and is used to weight the source files the next time the
+target is built in parallel and by pymake.rebuild.  Source files
+without a recorded time are weighted by their size.  The priority of a
+source file is the length of the longest chain of compiles that starts
+with it, so a parallel build starts the long chains of module
+dependencies first and fills in the short ones later.
+
+"""
+
+from __future__ import print_function
+
+import os
+import json
+import hashlib
+
+from .compilers import get_cachedir
+from .utils import write_json
+
+
+def get_history_file(objdir_temp):
+    """
+    Return the path of the compile history file for the object directory
+    objdir_temp.
+
+    """
+    h = hashlib.sha1(os.path.abspath(objdir_temp).encode('utf-8'))
+    return os.path.join(get_cachedir(), 'history', h.hexdigest() + '.json')
+
+
+class CompileHistory(object):
+    """
+    The most recent compile time of each source file of a target.
+
+    Parameters
+    ----------
+    fpth : str
+        path of the json history file
+
+    """
+
+    def __init__(self, fpth):
+        self.fpth = fpth
+        self.durations = {}
+        if os.path.isfile(fpth):
+            try:
+                f = open(fpth, 'r')
+                self.durations = json.load(f)
+                f.close()
+            except:
+                self.durations = {}
+        return
+
+    def get(self, srcfile):
+        """
+        Return the recorded compile time of srcfile in seconds or None.
+
+        """
+        return self.durations.get(srcfile)
+
+    def update(self, srcfile, duration):
+        """
+        Record the compile time of srcfile in seconds.
+
+        """
+        self.durations[srcfile] = duration
+        return
+
+    def write(self):
+        """
+        Write the history file.
+
+        """
+        write_json(self.fpth, self.durations)
+        return
+
+
+def get_weights(srcfiles, history=None):
+    """
+    Return a dictionary with the estimated compile time of each source
+    file.  The recorded compile time is used if there is one.  Otherwise
+    the time is estimated from the size of the source file and the
+    compile rate of the source files with a recorded time, or the size
+    is used directly if no compile times have been recorded.
+
+    """
+    sizes = {}
+    for srcfile in srcfiles:
+        try:
+            sizes[srcfile] = max(os.path.getsize(srcfile), 1)
+        except:
+            sizes[srcfile] = 1
+    weights = {}
+    size = 0
+    duration = 0.
+    if history is not None:
+        for srcfile in srcfiles:
+            t = history.get(srcfile)
+            if t is not None:
+                weights[srcfile] = t
+                size += sizes[srcfile]
+                duration += t
+    rate = 1.
+    if size > 0 and duration > 0.:
+        rate = duration / size
+    for srcfile in srcfiles:
+        if srcfile not in weights:
+            weights[srcfile] = rate * sizes[srcfile]
+    return weights
+
+
+def get_priorities(srcfiles, dependents, weights):
+    """
+    Return a dictionary with the length of the longest path from each
+    source file to the end of the build, where the length of a path is the
+    sum of the weights of the source files on it.  srcfiles must be in
+    dependency order and dependents is a dictionary with the list of source
+    files that depend on each source file.
+
+    """
+    priorities = {}
+    for srcfile in reversed(srcfiles):
+        longest = 0.
+        for dependent in dependents.get(srcfile, []):
+            longest = max(longest, priorities.get(dependent, 0.))
+        priorities[srcfile] = weights.get(srcfile, 0.) + longest
+    return priorities
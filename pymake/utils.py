@@ -0,0 +1,34 @@
+"""
+Helper functions shared by the modules that write files to the user cache
+directory and the build directory.
+
+"""
+
+from __future__ import print_function
+
+import os
+import json
+
+
+def write_json(fpth, data):
+    """
+    Write data to a json file without leaving a partial file.
+
+    """
+    try:
+        pth = os.path.dirname(fpth)
+        if not os.path.isdir(pth):
+            os.makedirs(pth)
+        tmp = '{}.{}.tmp'.format(fpth, os.getpid())
+        f = open(tmp, 'w')
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.close()
+        try:
+            os.replace(tmp, fpth)
+        except AttributeError:
+            if os.path.isfile(fpth):
+                os.remove(fpth)
+            os.rename(tmp, fpth)
+    except:
+        print('could not write {}'.format(fpth))
+    return
@@ -1,7 +1,7 @@
 from __future__ import print_function
 import os
-from .pymake import get_ordered_srcfiles
-from .dag import get_f_nodelist
+from .pymake import get_srcfiles
+from .dag import get_f_nodelist, get_dag
 
 try:
     import pydotplus.graphviz as pydot
@@ -65,8 +65,8 @@ def make_plots(srcdir, outdir, include_subdir=False, level=3):
     Create plots of module dependencies.
 
     """
-    srcfiles = get_ordered_srcfiles(srcdir, include_subdir)
-    nodelist = get_f_nodelist(srcfiles)
+    srcfiles, cfiles = get_srcfiles(srcdir, include_subdir)
+    nodelist = get_dag(get_f_nodelist(srcfiles)).toposort()
     for n in nodelist:
         print(os.path.basename(n.name))
         for m in n.dependencies:
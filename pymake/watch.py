@@ -0,0 +1,461 @@
+"""
+Watch mode.  After the first build, pymake --watch keeps the dependency
+graph of the source files (a SourceGraph) and the build database in
+memory and waits for files in the source directories to change.  Changed
+files are staged again, only the changed files are scanned, and the
+target is rebuilt with --expedite.  Only the source files that were
+invalidated by the changes are hashed, and only the object files that are
+out of date are recompiled before the target is relinked.
+
+Changes are detected with inotify on linux and by polling the
+modification times and sizes of the files on other platforms or if
+inotify is not available.
+
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from .pymake import get_srcfiles, stage_file, create_openspec, \
+    fortran_exts, c_exts
+from .dag import SourceGraph
+from .builddb import BuildDatabase, dbname
+from .scanner import get_included_files
+
+# inotify events that change the files in a directory
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+in_mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+          IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+# header of an inotify event (wd, mask, cookie, len)
+in_header = struct.Struct('iIII')
+
+
+def _excluded(pth, exclude):
+    """
+    Determine if pth is one of the files or directories in exclude or is
+    in one of the directories.
+
+    """
+    pth = os.path.abspath(pth)
+    for d in exclude:
+        if pth == d or pth.startswith(d + os.sep):
+            return True
+    return False
+
+
+def _walk(dirs, recursive, exclude):
+    """
+    Yield (directory, file names) for the directories in dirs and, if
+    recursive is True, their subdirectories that are not excluded.
+
+    """
+    for srcdir in dirs:
+        for path, subdirs, files in os.walk(srcdir):
+            if not recursive:
+                subdirs[:] = []
+            subdirs[:] = [d for d in subdirs
+                          if not _excluded(os.path.join(path, d), exclude)]
+            yield path, files
+    return
+
+
+class PollingWatcher(object):
+    """
+    Detect changed files by comparing the modification times and sizes of
+    the files in a set of directories every interval seconds.
+
+    Parameters
+    ----------
+    dirs : list of str
+        directories to watch
+    recursive : bool
+        watch the subdirectories of dirs
+    exclude : list of str
+        files and directories that are not watched, such as the target and
+        the build directory
+    interval : float
+        seconds between the scans of the directories
+
+    """
+
+    def __init__(self, dirs, recursive=False, exclude=None, interval=0.5):
+        self.dirs = dirs
+        self.recursive = recursive
+        self.exclude = [os.path.abspath(d) for d in exclude or []]
+        self.interval = interval
+        self.files = self._snapshot()
+        return
+
+    def _snapshot(self):
+        files = {}
+        for path, names in _walk(self.dirs, self.recursive, self.exclude):
+            for name in names:
+                fpth = os.path.join(path, name)
+                if _excluded(fpth, self.exclude):
+                    continue
+                try:
+                    st = os.stat(fpth)
+                except:
+                    continue
+                files[fpth] = (st.st_mtime, st.st_size)
+        return files
+
+    def _changes(self):
+        files = self._snapshot()
+        changed = set([fpth for fpth in set(files) | set(self.files)
+                       if files.get(fpth) != self.files.get(fpth)])
+        self.files = files
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Wait until files change and return the sorted list of the files
+        that were changed, added, or removed.  Changes are collected until
+        the files have not changed for interval seconds so that a file
+        that is saved in several steps is only reported once.  An empty
+        list is returned if nothing changed in timeout seconds.
+
+        """
+        start = time.time()
+        changed = set()
+        while True:
+            time.sleep(self.interval)
+            found = self._changes()
+            if len(found) > 0:
+                changed |= found
+            elif len(changed) > 0:
+                break
+            elif timeout is not None and time.time() - start > timeout:
+                break
+        return sorted(changed)
+
+    def close(self):
+        return
+
+
+class InotifyWatcher(object):
+    """
+    Detect changed files with inotify (linux only).  The functions in the
+    c library are called with ctypes.  The parameters are the same as for
+    PollingWatcher; interval is the time that is waited for more events
+    after a file changes.
+
+    """
+
+    def __init__(self, dirs, recursive=False, exclude=None, interval=0.1):
+        self.recursive = recursive
+        self.exclude = [os.path.abspath(d) for d in exclude or []]
+        self.interval = interval
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or
+                                 'libc.so.6', use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int,
+                                                 ctypes.c_char_p,
+                                                 ctypes.c_uint32]
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        self.paths = {}
+        self.dirs = dirs
+        for path, names in _walk(dirs, recursive, self.exclude):
+            self._add_watch(path)
+        return
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd,
+                                          os.path.abspath(path).encode(
+                                              sys.getfilesystemencoding()),
+                                          in_mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, 'inotify watch limit reached')
+            return
+        self.paths[wd] = path
+        return
+
+    def _read(self, timeout):
+        """
+        Return the set of files changed by the events that are read in
+        timeout seconds.
+
+        """
+        changed = set()
+        r, w, x = select.select([self.fd], [], [], timeout)
+        if len(r) == 0:
+            return changed
+        data = os.read(self.fd, 65536)
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = in_header.unpack_from(data, pos)
+            pos += in_header.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so every file may have changed
+                for path, names in _walk(self.dirs, self.recursive,
+                                         self.exclude):
+                    changed |= set([os.path.join(path, n) for n in names])
+                continue
+            path = self.paths.get(wd)
+            if path is None or len(name) == 0:
+                continue
+            if not isinstance(name, str):
+                name = name.decode(sys.getfilesystemencoding())
+            fpth = os.path.join(path, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.recursive and \
+                        not _excluded(fpth, self.exclude):
+                    for pth, names in _walk([fpth], True, self.exclude):
+                        self._add_watch(pth)
+                        changed |= set([os.path.join(pth, n)
+                                        for n in names])
+                continue
+            if not _excluded(fpth, self.exclude):
+                changed.add(fpth)
+        return changed
+
+    def wait(self, timeout=None):
+        """
+        Wait until files change and return the sorted list of the files
+        that were changed, added, or removed.  See PollingWatcher.wait.
+
+        """
+        changed = self._read(timeout)
+        while len(changed) > 0:
+            found = self._read(self.interval)
+            if len(found) == 0:
+                break
+            changed |= found
+        return sorted(changed)
+
+    def close(self):
+        os.close(self.fd)
+        return
+
+
+def get_watcher(dirs, recursive=False, exclude=None):
+    """
+    Return an InotifyWatcher for dirs on linux or, if inotify is not
+    available, a PollingWatcher.
+
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(dirs, recursive, exclude)
+        except Exception as e:
+            print('inotify is not available ({}), '.format(e) +
+                  'polling for changes')
+    return PollingWatcher(dirs, recursive, exclude)
+
+
+class WatchBuild(object):
+    """
+    Source graph and build database of a target that is rebuilt when the
+    files in its source directories change.
+
+    Parameters
+    ----------
+    build : function
+        function that is called with the SourceGraph, the BuildDatabase,
+        and the set of invalidated source files to rebuild the target and
+        returns the return code of the build.  Only the invalidated files
+        need to be checked to determine if they are out of date.
+    srcdir : str
+        source directory
+    srcdir2 : str
+        common source directory or None
+    srcdirs : str or list of str
+        directories with the source files that are compiled (src_temp
+        unless the source directory is used directly)
+    objdir_temp : str
+        object directory with the build database
+    staging : str
+        how the source files were staged in src_temp (see main)
+    include_subdirs : bool
+        compile the source files in the subdirectories of srcdirs
+    defines : dict
+        macro names and values used to evaluate cpp conditionals
+
+    """
+
+    def __init__(self, build, srcdir, srcdir2, srcdirs, objdir_temp,
+                 staging='copy', include_subdirs=False, defines=None):
+        self.build = build
+        self.staging = staging
+        self.include_subdirs = include_subdirs
+        self.defines = defines
+        if not isinstance(srcdirs, (list, tuple)):
+            srcdirs = [srcdirs]
+        self.srcdirs = [os.path.normpath(d) for d in srcdirs]
+
+        # source directories and the directories they are staged in
+        self.roots = []
+        if srcdir2 is not None:
+            common = os.path.basename(os.path.normpath(srcdir2))
+            self.roots.append((srcdir2, os.path.join(srcdirs[0], common)))
+        self.roots.append((srcdir, srcdirs[0]))
+
+        ffiles, cfiles = get_srcfiles(srcdirs, include_subdirs)
+        self.graph = SourceGraph(ffiles + cfiles, defines)
+        self.builddb = BuildDatabase(os.path.join(objdir_temp, dbname))
+        return
+
+    def get_staged_file(self, fpth):
+        """
+        Return the path of the staged copy of fpth, a file in the source
+        directory or the common source directory.
+
+        """
+        if self.staging == 'none':
+            return fpth
+        for root, staged in self.roots:
+            rel = os.path.relpath(fpth, root)
+            if not rel.startswith(os.pardir):
+                return os.path.join(staged, rel)
+        return None
+
+    def is_srcfile(self, fpth):
+        """
+        Determine if the staged file fpth is a source file that is
+        compiled.
+
+        """
+        if not fpth.lower().endswith(fortran_exts + c_exts):
+            return False
+        return self.include_subdirs or \
+            os.path.normpath(os.path.dirname(fpth)) in self.srcdirs
+
+    def get_header_users(self, fpth):
+        """
+        Return the source files in the source graph that include the
+        header fpth, directly or through other headers, according to the
+        headers listed in their depfiles in the build database.
+
+        """
+        fpth = os.path.abspath(fpth)
+        srcfiles = dict([(os.path.abspath(f), f)
+                         for f in self.graph.srcfiles])
+        users = []
+        for entry in self.builddb.entries.values():
+            for header in entry.get('headers', {}):
+                if os.path.abspath(header) == fpth:
+                    srcfile = srcfiles.get(os.path.abspath(entry['srcfile']))
+                    if srcfile is not None:
+                        users.append(srcfile)
+                    break
+        return users
+
+    def sync(self, changed):
+        """
+        Stage the files in changed again and update the source graph.
+        Return the source files that were invalidated in dependency order.
+
+        """
+        invalidated = set()
+        for fpth in changed:
+            staged = self.get_staged_file(fpth)
+            if staged is None:
+                continue
+            exists = os.path.isfile(fpth)
+            if staged != fpth:
+                # a symbolic link points to the changed file
+                if not exists or self.staging != 'symlink' or \
+                        not os.path.islink(staged):
+                    if os.path.lexists(staged):
+                        os.remove(staged)
+                    if exists:
+                        stage_file(fpth, staged, self.staging)
+                if exists and self.staging != 'none' and \
+                        os.path.basename(staged) in ('openspec.inc',
+                                                     'FILESPEC.INC'):
+                    create_openspec(os.path.dirname(staged),
+                                    recursive=False)
+
+            if self.is_srcfile(staged):
+                if exists:
+                    invalidated |= set(self.graph.add_file(staged))
+                else:
+                    invalidated |= set(self.graph.remove_file(staged))
+                continue
+
+            # the files that include a changed file are scanned again
+            # because the modules they use may have changed
+            inc = os.path.normpath(staged)
+            for srcfile in self.graph.srcfiles:
+                if inc in [os.path.normpath(f) for f in
+                           get_included_files(srcfile, self.defines)]:
+                    invalidated |= set(self.graph.update_file(srcfile))
+
+            # c/c++ source files that include the changed file through
+            # other headers are listed in the build database
+            invalidated |= set(self.get_header_users(inc))
+        return self.graph.order(invalidated & set(self.graph.srcfiles))
+
+    def rebuild(self, changed):
+        """
+        Stage the changed files, update the source graph, and rebuild the
+        target.  Return the return code of the build.
+
+        """
+        start = time.time()
+        print('\n{} file(s) changed: '.format(len(changed)) +
+              ', '.join([os.path.basename(f) for f in changed]))
+        try:
+            invalidated = self.sync(changed)
+        except Exception as e:
+            print('could not update the source graph: {}'.format(e))
+            return 1
+        print('{} source file(s) invalidated'.format(len(invalidated)))
+        try:
+            returncode = self.build(self.graph, self.builddb,
+                                    set(invalidated))
+        except Exception as e:
+            print('build failed: {}'.format(e))
+            returncode = 1
+        if returncode == 0:
+            print('rebuilt in {:.2f} s'.format(time.time() - start))
+        else:
+            print('build failed after {:.2f} s'.format(time.time() - start))
+        return returncode
+
+    def run(self, watcher, maxbuilds=None):
+        """
+        Rebuild the target each time watcher reports changed files until
+        the loop is interrupted (Ctrl-C) or, if maxbuilds is not None,
+        until the target has been rebuilt maxbuilds times.  Return the
+        return code of the last build.
+
+        """
+        returncode = 0
+        nbuilds = 0
+        print('\nwatching for changes (press Ctrl-C to stop)...')
+        try:
+            while maxbuilds is None or nbuilds < maxbuilds:
+                changed = watcher.wait()
+                if len(changed) == 0:
+                    continue
+                returncode = self.rebuild(changed)
+                nbuilds += 1
+        except KeyboardInterrupt:
+            print('\nstopped watching')
+        finally:
+            watcher.close()
+        return returncode